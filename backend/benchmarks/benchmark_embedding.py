@@ -0,0 +1,175 @@
+"""
+Benchmark for the query-time embedding backends.
+
+Every backend runs in a fresh interpreter (so the peak RSS is its own) and is
+measured on the same query set:
+    - load time and peak RSS (ru_maxrss) after loading and after encoding
+    - latency of a single query (p50 / p95) and of a batch
+    - cosine agreement of its embeddings with the first backend (the reference)
+
+Backends are given as NAME=SPEC, where SPEC is "sentence-transformers" or the
+ONNX file to run (e.g. onnx/model.onnx, onnx/model_quint8_avx2.onnx). The ONNX
+files are read from --onnx-path or downloaded from the Hugging Face hub.
+--quantize writes an int8 (dynamic quantization) copy of onnx/model.onnx in
+--onnx-path and adds it as the backend "onnx-int8-local".
+
+Run from the backend directory:
+    python -m benchmarks.benchmark_embedding --queries 500 --output embedding.json
+    python -m benchmarks.benchmark_embedding --onnx-path ./minilm-onnx --quantize
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+DEFAULT_BACKENDS = [
+    "torch=sentence-transformers",
+    "onnx=onnx/model.onnx",
+    "onnx-int8=onnx/model_quint8_avx2.onnx",
+]
+
+_MEASURE = """
+import json, resource, sys, time
+import numpy as np
+
+spec, model_name, onnx_path, threads, queries_file, output_file, batch_size = sys.argv[1:]
+queries = json.load(open(queries_file, encoding="utf-8"))
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+rss_start = rss_mb()
+t0 = time.perf_counter()
+if spec == "sentence-transformers":
+    from utils.embedding.sentence_transformer_provider import SentenceTransformerProvider
+    provider = SentenceTransformerProvider(model_name)
+else:
+    from utils.embedding.onnx_provider import OnnxEmbeddingProvider
+    provider = OnnxEmbeddingProvider(model_name, model_file=spec, model_dir=onnx_path or None,
+                                     num_threads=int(threads))
+provider.load()
+provider.encode(queries[:1])
+load_s = time.perf_counter() - t0
+rss_loaded = rss_mb()
+
+single = []
+for q in queries:
+    t = time.perf_counter()
+    provider.encode([q])
+    single.append(time.perf_counter() - t)
+
+batch_size = int(batch_size)
+t = time.perf_counter()
+embs = np.vstack([provider.encode(queries[i:i + batch_size]) for i in range(0, len(queries), batch_size)])
+batch_s = time.perf_counter() - t
+np.save(output_file, embs)
+
+print(json.dumps({
+    "load_s": load_s,
+    "single_p50_ms": float(np.percentile(single, 50)) * 1000,
+    "single_p95_ms": float(np.percentile(single, 95)) * 1000,
+    "batch_queries_per_s": len(queries) / batch_s,
+    "rss_start_mb": rss_start,
+    "rss_loaded_mb": rss_loaded,
+    "rss_peak_mb": rss_mb(),
+}))
+"""
+
+
+def synthetic_queries(n: int, seed: int) -> list[str]:
+    rng = np.random.default_rng(seed)
+    words = ("how can i reset change my password account order refund delivery shipping invoice "
+             "cancel subscription payment card address email support hours store return policy "
+             "warranty product damaged late tracking number discount code login app").split()
+    return [" ".join(rng.choice(words, size=rng.integers(3, 16))) + "?" for _ in range(n)]
+
+
+def quantize(onnx_path: str) -> str:
+    """Dynamic int8 quantization of onnx/model.onnx, returns the new file (relative to onnx_path)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    target = "onnx/model_int8_dynamic.onnx"
+    quantize_dynamic(os.path.join(onnx_path, "onnx/model.onnx"), os.path.join(onnx_path, target),
+                     weight_type=QuantType.QUInt8)
+    return target
+
+
+def run_backend(spec: str, args, queries_file: str, output_file: str) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-c", _MEASURE, spec, args.model, args.onnx_path or "", str(args.threads),
+         queries_file, output_file, str(args.batch_size)],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def cosine_agreement(reference: np.ndarray, embs: np.ndarray) -> dict:
+    ref = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    other = embs / np.linalg.norm(embs, axis=1, keepdims=True)
+    cosine = (ref * other).sum(axis=1)
+    # same nearest neighbour among the queries (a proxy for unchanged retrieval)
+    ref_nn = np.argsort(-(ref @ ref.T), axis=1)[:, 1]
+    other_nn = np.argsort(-(other @ other.T), axis=1)[:, 1]
+    return {
+        "cosine_mean": float(cosine.mean()),
+        "cosine_min": float(cosine.min()),
+        "nearest_neighbour_agreement": float((ref_nn == other_nn).mean()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--backend", action="append", metavar="NAME=SPEC",
+                        help="backend to measure (repeatable), the first one is the reference")
+    parser.add_argument("--onnx-path", help="directory with the ONNX files and tokenizer.json")
+    parser.add_argument("--quantize", action="store_true", help="quantize onnx/model.onnx in --onnx-path")
+    parser.add_argument("--threads", type=int, default=0, help="onnxruntime intra-op threads (0 = default)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    backends = [b.split("=", 1) for b in (args.backend or DEFAULT_BACKENDS)]
+    if args.quantize:
+        if not args.onnx_path:
+            parser.error("--quantize needs --onnx-path")
+        backends.append(["onnx-int8-local", quantize(args.onnx_path)])
+
+    results = {"python": sys.version.split()[0], "model": args.model, "queries": args.queries, "backends": {}}
+    reference = None
+    with tempfile.TemporaryDirectory() as tmp:
+        queries_file = os.path.join(tmp, "queries.json")
+        with open(queries_file, "w", encoding="utf-8") as f:
+            json.dump(synthetic_queries(args.queries, args.seed), f)
+
+        for name, spec in backends:
+            output_file = os.path.join(tmp, f"{len(results['backends'])}.npy")
+            result = {"spec": spec, **run_backend(spec, args, queries_file, output_file)}
+            if "error" not in result:
+                embs = np.load(output_file)
+                if reference is None:
+                    reference = embs
+                result["agreement"] = cosine_agreement(reference, embs)
+            results["backends"][name] = result
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
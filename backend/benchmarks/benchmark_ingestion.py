@@ -0,0 +1,305 @@
+"""
+Memory and throughput benchmark of the ingestion path (upload -> faqs table).
+
+For every size a synthetic FAQ CSV is written and ingested in a fresh interpreter
+(so the peak RSS belongs to that size alone), stage by stage:
+    - parse   reading the file and parsing it (services/bulk_import.py)
+    - embed   embedding questions and answers (IndexingService._texts_to_embeddings)
+    - insert  IndexingService.index_batch with the embeddings of the embed stage
+              (binary COPY, incremental index maintenance, answer chunks)
+    - index   REINDEX of the faqs table, i.e. building the vector indexes over all rows
+Reported per stage: seconds, rows/s, the tracemalloc peak during the stage (Python
+and numpy allocations, including what earlier stages still hold) and the process
+RSS after it as well as the peak RSS so far.
+
+Backends:
+    postgres  the configured server (POSTGRES_* variables, needs pgvector and the
+              right to create databases); the tables are created in the database
+              gen_ai_bench_ingestion, which is dropped afterwards
+    null      no database: the rows are encoded into the COPY stream and discarded,
+              there is no index stage
+Embedders:
+    hash      a deterministic stand-in (hashed words, EMBEDDING_DIMENSION wide), so
+              the numbers show the cost of ingestion itself
+    model     the configured embedding model (EMBEDDING_BACKEND)
+
+Run from the backend directory:
+    python -m benchmarks.benchmark_ingestion --rows 1000,10000,100000 --output ingestion.json
+    python -m benchmarks.benchmark_ingestion --rows 1000000 --backend null --no-tracemalloc
+"""
+import argparse
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+SRC_DIR = BACKEND_DIR / "src"
+
+BENCH_DATABASE = "gen_ai_bench_ingestion"
+
+_WORDS = ("how can i reset change my password account order refund delivery shipping invoice "
+          "cancel subscription payment card address email support hours store return policy "
+          "warranty product damaged late tracking number discount code login app").split()
+
+
+def write_csv(path: str, rows: int, seed: int) -> None:
+    """Synthetic FAQs: questions of 4-14 words, answers of 1-6 sentences."""
+    rng = np.random.default_rng(seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["question", "answer"])
+        for i in range(rows):
+            question = " ".join(rng.choice(_WORDS, size=rng.integers(4, 15))).capitalize()
+            sentences = [" ".join(rng.choice(_WORDS, size=rng.integers(6, 20))).capitalize() + "."
+                         for _ in range(rng.integers(1, 7))]
+            writer.writerow([f"{question} ({i})?", " ".join(sentences)])
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _NullCopy:
+    def __init__(self, sink: dict):
+        self.sink = sink
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def write(self, data) -> None:
+        self.sink["bytes"] += len(data)
+
+
+class _NullCursor:
+    """Takes a COPY stream (see services/pg_copy.py) and only counts its bytes."""
+
+    def __init__(self):
+        self.sink = {"bytes": 0}
+
+    def copy(self, statement: str) -> _NullCopy:
+        return _NullCopy(self.sink)
+
+
+def _hash_provider(model_name: str, dimension: int):
+    from utils.embedding.base import EmbeddingProvider
+
+    class HashEmbeddingProvider(EmbeddingProvider):
+        """Every word switches on one (hashed) dimension, the vectors are normalized."""
+
+        def load(self) -> None:
+            pass
+
+        def encode(self, texts):
+            embs = np.zeros((len(texts), dimension), dtype=np.float32)
+            for i, text in enumerate(texts):
+                for word in text.lower().split():
+                    embs[i, zlib.crc32(word.encode()) % dimension] += 1.0
+            norms = np.linalg.norm(embs, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            return embs / norms
+
+    return HashEmbeddingProvider(model_name)
+
+
+class StageTimer:
+    def __init__(self, rows: int, trace: bool):
+        self.rows = rows
+        self.trace = trace
+        self.stages = {}
+
+    def run(self, name: str, fn):
+        if self.trace:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - start
+        self.stages[name] = {
+            "seconds": seconds,
+            "rows_per_s": self.rows / seconds if seconds else None,
+            "tracemalloc_peak_mb": tracemalloc.get_traced_memory()[1] / 2 ** 20 if self.trace else None,
+            "rss_mb": rss_mb(),
+            "rss_peak_mb": peak_rss_mb(),
+        }
+        return result
+
+
+def _reset_database(config, create: bool) -> None:
+    import psycopg
+
+    with psycopg.connect(host=config.POSTGRES_HOST, port=config.POSTGRES_PORT, dbname=config.POSTGRES_DB,
+                         user=config.POSTGRES_USER, password=config.POSTGRES_PASSWORD, autocommit=True) as conn:
+        conn.execute(f"DROP DATABASE IF EXISTS {BENCH_DATABASE}")
+        if create:
+            conn.execute(f"CREATE DATABASE {BENCH_DATABASE}")
+
+
+def run_size(csv_path: str, rows: int, backend: str, embedder: str, trace: bool) -> dict:
+    """Ingest one CSV in this process (called in a fresh interpreter per size)."""
+    sys.path.insert(0, str(SRC_DIR))
+    from config import config
+    from services.bulk_import import read_faqs
+    from utils.embedding.factory import register_embedding_provider
+
+    if embedder == "hash":
+        register_embedding_provider(config.EMBEDDING_MODEL_NAME,
+                                    _hash_provider(config.EMBEDDING_MODEL_NAME, config.EMBEDDING_DIMENSION))
+
+    from services.indexing_service import IndexingService
+    from services.pg_copy import copy_rows
+
+    indexing_service = None
+    if backend == "postgres":
+        import psycopg
+
+        db_config = {
+            "host": config.POSTGRES_HOST,
+            "port": config.POSTGRES_PORT,
+            "database": BENCH_DATABASE,
+            "user": config.POSTGRES_USER,
+            "password": config.POSTGRES_PASSWORD,
+        }
+        _reset_database(config, create=True)
+        indexing_service = IndexingService(db_config)
+        # the schema is created before the measurements start
+        indexing_service._ensure_connection()
+
+    if trace:
+        tracemalloc.start()
+    rss_start = rss_mb()
+    timer = StageTimer(rows, trace)
+
+    def parse():
+        with open(csv_path, "rb") as f:
+            content = f.read()
+        return read_faqs(content, "csv")
+
+    batch = timer.run("parse", parse)
+    # without a database the service is only used for embedding (it connects lazily)
+    embedder_service = indexing_service or IndexingService()
+
+    def embed():
+        batch.question_embeddings = embedder_service._texts_to_embeddings(batch.questions)
+        batch.answer_embeddings = embedder_service._texts_to_embeddings(batch.answers)
+        batch.embedding_model = embedder_service.model_name
+
+    timer.run("embed", embed)
+
+    result = {"rows": len(batch), "csv_mb": os.path.getsize(csv_path) / 2 ** 20, "rss_start_mb": rss_start}
+    if indexing_service is not None:
+        timer.run("insert", lambda: indexing_service.index_batch(os.path.basename(csv_path),
+                                                                 os.path.getsize(csv_path), batch))
+
+        def reindex():
+            # a partitioned table can only be reindexed outside a transaction block
+            with psycopg.connect(indexing_service.conninfo(), autocommit=True) as conn:
+                conn.execute("REINDEX TABLE faqs")
+                if indexing_service.chunker is not None:
+                    conn.execute("REINDEX TABLE faq_chunks")
+                conn.execute("ANALYZE faqs")
+
+        timer.run("index", reindex)
+        with indexing_service.connection() as conn:
+            # with partitioning the rows and indexes belong to the partitions
+            size = conn.execute("""
+                SELECT COALESCE(SUM(pg_total_relation_size(relid)), pg_total_relation_size('faqs'))
+                FROM pg_partition_tree('faqs')
+            """)
+            result["table_mb"] = float(size.fetchone()[0]) / 2 ** 20
+        indexing_service.close()
+        _reset_database(config, create=False)
+    else:
+        def insert():
+            cur = _NullCursor()
+            count = len(batch)
+            copy_rows(
+                cur, "faqs",
+                ["id", "document_id", "question_text", "answer_text",
+                 "question_embedding", "answer_embedding", "embedding_model"],
+                ["int4", "int4", "text", "text", "vector", "vector", "text"],
+                [range(1, count + 1), [1] * count, batch.questions, batch.answers,
+                 batch.question_embeddings, batch.answer_embeddings, [batch.embedding_model] * count],
+                count,
+            )
+            return cur.sink["bytes"]
+
+        result["copy_mb"] = timer.run("insert", insert) / 2 ** 20
+
+    result["stages"] = timer.stages
+    return result
+
+
+def measure(rows: int, args, work_dir: str) -> dict:
+    csv_path = os.path.join(work_dir, f"faqs_{rows}.csv")
+    write_csv(csv_path, rows, args.seed)
+    command = [sys.executable, "-m", "benchmarks.benchmark_ingestion", "--single", csv_path, "--rows", str(rows),
+               "--backend", args.backend, "--embedder", args.embedder]
+    if not args.tracemalloc:
+        command.append("--no-tracemalloc")
+    proc = subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True,
+                          env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"})
+    os.remove(csv_path)
+    if proc.returncode != 0:
+        # the exception line, not a CONTEXT line of a database error after it
+        lines = [line for line in proc.stderr.strip().splitlines() if not line.startswith("CONTEXT:")]
+        return {"rows": rows, "error": lines[-1] if lines else "failed"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="1000,10000,100000",
+                        help="comma-separated sizes, e.g. 1000,10000,100000,1000000")
+    parser.add_argument("--backend", choices=("postgres", "null"), default="postgres")
+    parser.add_argument("--embedder", choices=("hash", "model"), default="hash")
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false",
+                        help="skip tracemalloc (it slows allocation-heavy stages down)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="write the results as JSON to this file")
+    parser.add_argument("--single", help=argparse.SUPPRESS)  # internal: ingest this CSV in this process
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_size(args.single, int(args.rows), args.backend, args.embedder, args.tracemalloc)))
+        return
+
+    sizes = [int(n) for n in args.rows.split(",")]
+    with tempfile.TemporaryDirectory() as work_dir:
+        runs = []
+        for rows in sizes:
+            print(f"Ingesting {rows} rows ...", file=sys.stderr)
+            runs.append(measure(rows, args, work_dir))
+
+    results = {
+        "python": sys.version.split()[0],
+        "backend": args.backend,
+        "embedder": args.embedder,
+        "tracemalloc": args.tracemalloc,
+        "runs": runs,
+    }
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
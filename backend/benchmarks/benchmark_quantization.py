@@ -0,0 +1,139 @@
+"""
+Benchmark for the embedding storage modes (float / halfvec / binary).
+
+For every mode a separate table is filled with the same synthetic, clustered
+embeddings, the mode's index is built and a set of queries is run through the
+same SQL the RetrievalService uses. Reported per mode:
+    - table and index size
+    - recall@k against the exact (brute-force) top-k
+    - query latency (p50 / p95)
+
+Needs a Postgres with pgvector >= 0.7 (halfvec / binary_quantize) configured
+through the usual POSTGRES_* variables. Run from the backend directory:
+    python -m benchmarks.benchmark_quantization --rows 50000 --queries 200
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import psycopg
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from config import config  # noqa: E402
+from services.embedding_storage import STORAGE_MODES, EmbeddingStorage  # noqa: E402
+
+
+def synthetic_embeddings(rows: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignment = rng.integers(0, clusters, size=rows)
+    embs = centers[assignment] + 0.5 * rng.standard_normal((rows, dim)).astype(np.float32)
+    embs /= np.linalg.norm(embs, axis=1, keepdims=True)
+    return embs
+
+
+def exact_top_k(embs: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    # cosine distance on normalized vectors = 1 - dot product
+    scores = queries @ embs.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def _vector_literal(v: np.ndarray) -> str:
+    return "[" + ",".join(f"{x:.7g}" for x in v) + "]"
+
+
+def run_mode(conn: psycopg.Connection, mode: str, embs: np.ndarray, queries: np.ndarray,
+             truth: np.ndarray, k: int, rescore: int, probes: int) -> dict:
+    dim = embs.shape[1]
+    table = f"bench_faqs_{mode}"
+    storage = EmbeddingStorage(mode=mode, dimension=dim, rescore_candidates=rescore)
+
+    cur = conn.cursor()
+    cur.execute(f"DROP TABLE IF EXISTS {table}")
+    cur.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, answer_embedding vector({dim}) NOT NULL)")
+    with cur.copy(f"COPY {table} (id, answer_embedding) FROM STDIN") as copy:
+        for i, v in enumerate(embs):
+            copy.write_row((i, _vector_literal(v)))
+    conn.commit()
+
+    start = time.perf_counter()
+    for statement in storage.index_statements(table, "answer_embedding", f"{table}_idx"):
+        cur.execute(statement)
+    conn.commit()
+    build_s = time.perf_counter() - start
+    cur.execute(f"ANALYZE {table}")
+    cur.execute(f"SET ivfflat.probes = {int(probes)}")
+
+    sql = storage.nearest_sql(table=table, column="answer_embedding", select="id")
+    latencies = []
+    hits = 0
+    for q, expected in zip(queries, truth):
+        start = time.perf_counter()
+        cur.execute(sql, {"query": _vector_literal(q), "k": k})
+        found = [row[0] for row in cur.fetchall()]
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(found) & set(expected.tolist()))
+
+    cur.execute(
+        "SELECT pg_relation_size(%s), pg_indexes_size(%s), pg_total_relation_size(%s)",
+        (table, table, table)
+    )
+    table_bytes, index_bytes, total_bytes = cur.fetchone()
+    cur.execute(f"DROP TABLE {table}")
+    conn.commit()
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "mode": mode,
+        "table_bytes": table_bytes,
+        "index_bytes": index_bytes,
+        "total_bytes": total_bytes,
+        "index_build_s": build_s,
+        f"recall@{k}": hits / (len(queries) * k),
+        "latency_ms_p50": float(np.percentile(latencies_ms, 50)),
+        "latency_ms_p95": float(np.percentile(latencies_ms, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=config.EMBEDDING_DIMENSION)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--rescore", type=int, default=config.RESCORE_CANDIDATES)
+    parser.add_argument("--probes", type=int, default=10, help="ivfflat.probes for the float mode")
+    parser.add_argument("--modes", nargs="+", default=list(STORAGE_MODES), choices=STORAGE_MODES)
+    parser.add_argument("--output", type=Path, help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    embs = synthetic_embeddings(args.rows, args.dim, args.clusters, seed=42)
+    queries = synthetic_embeddings(args.queries, args.dim, args.clusters, seed=42)[: args.queries]
+    queries = queries + 0.1 * np.random.default_rng(7).standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = exact_top_k(embs, queries, args.k)
+
+    conn_str = (
+        f"host={config.POSTGRES_HOST} port={config.POSTGRES_PORT} dbname={config.POSTGRES_DB} "
+        f"user={config.POSTGRES_USER} password={config.POSTGRES_PASSWORD}"
+    )
+    results = []
+    with psycopg.connect(conn_str) as conn:
+        conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        for mode in args.modes:
+            print(f"Benchmarking '{mode}' storage with {args.rows} rows...", file=sys.stderr)
+            results.append(run_mode(conn, mode, embs, queries, truth, args.k, args.rescore, args.probes))
+
+    text = json.dumps({"rows": args.rows, "queries": args.queries, "dim": args.dim, "results": results}, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Startup benchmark for the backend.
+
+Measures (each in a fresh interpreter, so nothing is cached in-process):
+    - import time of the app module
+    - time until create_app() returns (no database / model needed)
+    - time-to-ready: create_app() + preload() + init_worker() + warm_up(),
+      i.e. what a gunicorn worker does before it accepts requests
+      (needs the database and the embedding model to be meaningful)
+and prints the slowest imports from `python -X importtime` as a startup profile.
+
+Run from the backend directory:
+    python -m benchmarks.benchmark_startup --runs 5 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+_MEASURE = """
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+flask_app = app.create_app()
+t2 = time.perf_counter()
+result = {"import_s": t1 - t0, "create_app_s": t2 - t1}
+if {ready}:
+    services = app.get_services(flask_app)
+    services.preload()
+    services.init_worker()
+    services.warm_up()
+    result["time_to_ready_s"] = time.perf_counter() - t0
+print(json.dumps(result))
+"""
+
+
+def _run(code: str, *extra_args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *extra_args, "-c", code],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+
+
+def measure(runs: int, ready: bool) -> dict:
+    samples = []
+    for _ in range(runs):
+        proc = _run(_MEASURE.replace("{ready}", str(ready)))
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+        samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    summary = {}
+    for key in samples[0]:
+        values = [s[key] for s in samples]
+        summary[key] = {
+            "median": statistics.median(values),
+            "min": min(values),
+            "max": max(values),
+        }
+    return summary
+
+
+def import_profile(top: int) -> list[dict]:
+    """Slowest modules (cumulative microseconds) from `-X importtime`."""
+    proc = _run("import app", "-X", "importtime")
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:   self [us] | cumulative | imported package"
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append({"module": name.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    entries.sort(key=lambda e: e["cumulative_us"], reverse=True)
+    return entries[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ready", action="store_true", help="also measure time-to-ready (needs DB and model)")
+    parser.add_argument("--top", type=int, default=15, help="number of imports in the startup profile")
+    parser.add_argument("--output", type=Path, help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "startup": measure(args.runs, args.ready),
+        "import_profile": import_profile(args.top),
+    }
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
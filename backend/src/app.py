@@ -1,43 +1,191 @@
-import csv
-import io
+import glob
+import hmac
+import math
+import os
+import random
 import time
 import logging
 
-from flask import Flask, Response, jsonify, request
+import click
+from flask import Blueprint, Flask, Response, current_app, jsonify, request
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from pipeline import RAGPipeline
 
+from services.bulk_import import FORMATS, detect_format, read_faqs
 from services.generation_service import GenerationService
-from services.indexing_service import IndexingService
+from services.indexing_service import EmbeddingDimensionError, IndexingService
 from services.query_rewriting_service import QueryRewritingService
+from services.reembedding_service import ReembeddingService
 from services.retrieval_service import RetrievalService
-
-app = Flask(__name__)
-CORS(app, resources={
-    r"/api/*": {
-        "origins": ["http://localhost:3000", "http://127.0.0.1:3000"],
-        "methods": ["GET", "POST", "OPTIONS", "DELETE"],
-        "allow_headers": ["Content-Type", "Authorization"]
-    }
-})
-indexing_service = IndexingService()
-
-query_rewriting_service = QueryRewritingService()
-
-retrieval_service = RetrievalService()
-
-generation_service = GenerationService()
+from utils.embedding.factory import preload_embedding_provider
+from utils.llm.admission import AdmissionRejected, request_lane
+from utils.llm.factory import get_admission_controller, get_endpoint_stats
+from utils.metrics import metrics
+from utils.prefetch import TokenBucketLimiter
+from utils.profiling import ProfileStore, RequestProfile, current_profile, profile_stream
+from config import config
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 logging.getLogger("sentence_transformers").setLevel(logging.WARNING)
 
+api = Blueprint("api", __name__)
+
 
-@app.route("/api/upload", methods=["POST"])
+class AppServices:
+    """
+    Holds the service instances of one app (one per process).
+    Creating them is cheap: no database connection is opened and no model
+    is loaded until the first request (or preload() / warm_up()) needs it.
+    """
+
+    def __init__(self):
+        self.indexing_service = IndexingService()
+        self.query_rewriting_service = QueryRewritingService()
+        self.retrieval_service = RetrievalService()
+        self.generation_service = GenerationService()
+
+        # share the service instances with the pipeline (one pool / model per process)
+        self.rag_pipeline = RAGPipeline(
+            indexing_service=self.indexing_service,
+            query_rewriting_service=self.query_rewriting_service,
+            retrieval_service=self.retrieval_service,
+            generation_service=self.generation_service,
+        )
+        # captured request profiles of this worker (see _start_profile)
+        self.profiles = ProfileStore(config.PROFILE_BUFFER_SIZE)
+        # per-client rate limit of /api/prefetch
+        self.prefetch_limiter = TokenBucketLimiter(config.PREFETCH_RATE, config.PREFETCH_BURST)
+
+    def preload(self):
+        """
+        Load the embedding model and tokenizer before workers are forked
+        (gunicorn master, see gunicorn.conf.py), so the weights are shared
+        between the workers through copy-on-write.
+        Connections opened in the master are closed again because they
+        must not be shared with forked workers.
+        """
+        try:
+            preload_embedding_provider(self.indexing_service.model_name)
+        except Exception as e:
+            logger.warning(f"Could not preload embedding model, workers will load it lazily: {e}")
+        self.indexing_service.close()
+
+    def init_worker(self):
+        """Per-worker initialization after fork: open a fresh connection pool."""
+        self.indexing_service.reset_after_fork()
+        try:
+            self.indexing_service._ensure_connection()
+        except Exception as e:
+            logger.warning(f"Could not open database pool, retrying on first request: {e}")
+
+    def warm_up(self):
+        """Run a synthetic query so the worker is warm before it accepts traffic."""
+        if not config.WARMUP_ENABLED:
+            return
+        start = time.perf_counter()
+        try:
+            self.retrieval_service.warm_up(config.WARMUP_QUERY, self.indexing_service)
+            logger.info(f"Warm-up finished in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            logger.warning(f"Warm-up failed: {e}")
+        if config.LLM_WARMUP:
+            # make sure the models are resident before the first request
+            self.generation_service.llm_provider.preload()
+            self.query_rewriting_service.llm.preload()
+
+
+def create_app() -> Flask:
+    """App factory (used by `python app.py`, `flask --app app run` and gunicorn)."""
+    app = Flask(__name__)
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": ["http://localhost:3000", "http://127.0.0.1:3000"],
+            "methods": ["GET", "POST", "OPTIONS", "DELETE"],
+            "allow_headers": ["Content-Type", "Authorization"]
+        }
+    })
+    if config.TRUSTED_PROXIES:
+        # the client address is taken from X-Forwarded-For as set by the proxies
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=config.TRUSTED_PROXIES)
+    app.extensions["rag_services"] = AppServices()
+    app.register_blueprint(api)
+
+    @app.cli.command("migrate-partitions")
+    def migrate_partitions():
+        """Convert the faqs table into a table partitioned by document."""
+        result = get_services(app).indexing_service.migrate_to_partitioned()
+        print(result["message"])
+
+    @app.cli.command("rechunk")
+    def rechunk():
+        """Re-create the answer chunks of all documents with the current ANSWER_CHUNKING strategy."""
+        print(get_services(app).indexing_service.rechunk_documents()["message"])
+
+    @app.cli.command("snapshot-export")
+    @click.argument("document_ids", nargs=-1, type=int)
+    @click.option("--output", type=click.Path(file_okay=False), required=True, help="Directory for the snapshots.")
+    def snapshot_export(document_ids, output):
+        """Export documents (default: all) as snapshots with their embeddings."""
+        indexing_service = get_services(app).indexing_service
+        if not document_ids:
+            with indexing_service.connection() as conn:
+                document_ids = [row[0] for row in conn.execute("SELECT id FROM documents ORDER BY id")]
+        for document_id in document_ids:
+            result = indexing_service.export_snapshot(document_id, os.path.join(output, f"document_{document_id}"))
+            print(result["message"])
+
+    @app.cli.command("snapshot-import")
+    @click.argument("paths", nargs=-1, type=click.Path(exists=True), required=True)
+    @click.option("--verify", is_flag=True, help="Check the checksum of the embeddings before importing.")
+    def snapshot_import(paths, verify):
+        """Import snapshots (files or directories of snapshots) as new documents."""
+        indexing_service = get_services(app).indexing_service
+        for path in paths:
+            sidecars = sorted(glob.glob(os.path.join(path, "*.json"))) if os.path.isdir(path) else [path]
+            for sidecar in sidecars:
+                print(indexing_service.import_snapshot(sidecar, verify=verify)["message"])
+
+    @app.cli.command("reembed")
+    @click.argument("model_name")
+    @click.option("--dimension", type=int, required=True, help="Embedding dimension of the new model.")
+    @click.option("--batch-size", type=int, default=None, help="Rows per batch (REEMBED_BATCH_SIZE).")
+    @click.option("--pause", type=float, default=None, help="Seconds between batches (REEMBED_PAUSE).")
+    def reembed(model_name, dimension, batch_size, pause):
+        """Re-embed all FAQs with another model while the current embeddings keep serving."""
+        service = ReembeddingService(get_services(app).indexing_service, batch_size=batch_size, pause=pause)
+        print(service.migrate(model_name, dimension)["message"])
+
+    @app.cli.command("reembed-status")
+    def reembed_status():
+        """Show the active embedding model and the progress of a running re-embedding."""
+        print(ReembeddingService(get_services(app).indexing_service).status())
+
+    @app.cli.command("reembed-cancel")
+    def reembed_cancel():
+        """Abort a re-embedding and drop its columns."""
+        print(ReembeddingService(get_services(app).indexing_service).cancel()["message"])
+
+    return app
+
+
+def get_services(app: Flask = None) -> AppServices:
+    """Returns the services of the given (or the current) app."""
+    return (app or current_app).extensions["rag_services"]
+
+
+@api.route("/api/upload", methods=["POST"])
 def upload():
     """
     Upload and index documents using (optionally) chunking strategies.
+
+    The answers are split into chunks according to ANSWER_CHUNKING (see services/chunking.py).
+    Accepts CSV, NDJSON and Parquet files (detected from the file name or content, or
+    given as the form field 'format'). NDJSON and Parquet rows may carry precomputed
+    question_embedding / answer_embedding columns (see services/bulk_import.py), the
+    form field 'embeddingModel' names the model they come from.
     """
     try:
         if 'file' not in request.files:
@@ -53,37 +201,82 @@ def upload():
         file_size = len(file_content)
         filename = file.filename
 
-        stream = io.StringIO(file_content.decode("UTF-8"), newline=None)
-        csv_input = csv.DictReader(stream)
-        
-        faq_entries = []
-        for row in csv_input:
-            q = row.get("question")
-            a = row.get("answer")
-            if q and a:
-                faq_entries.append({
-                    "question": q,
-                    "answer": a
-                })
-
-        if not faq_entries:
-            return jsonify({"status": "error", "message": "CSV is empty or incorrectly formatted"}), 400
+        fmt = request.form.get("format") or detect_format(filename, file_content)
+        if fmt not in FORMATS:
+            return jsonify({"status": "error", "message": f"Unknown format '{fmt}'"}), 400
+        try:
+            batch = read_faqs(file_content, fmt)
+        except (ValueError, UnicodeDecodeError) as e:
+            return jsonify({"status": "error", "message": f"Could not read {fmt} file: {e}"}), 400
+        if request.form.get("embeddingModel"):
+            batch.embedding_model = request.form["embeddingModel"]
+
+        if not len(batch):
+            return jsonify({"status": "error", "message": f"{fmt.upper()} is empty or incorrectly formatted"}), 400
 
         # call indexing service
-        result = indexing_service.index_documents(
+        services = get_services()
+        result = services.indexing_service.index_batch(
             filename=filename,
             file_size=file_size,
-            faq_entries=faq_entries
+            batch=batch
         )
+        # prefetched searches did not see the new FAQs
+        services.retrieval_service.prefetched.clear()
 
         return jsonify(result), 200
 
+    except EmbeddingDimensionError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
-rag_pipeline = RAGPipeline()
+def _document_scope(document_id, document_ids, scope):
+    """The retrieval scope of a request body as (scope, None), or (None, error message)."""
+    if scope == "all":
+        return None, None
+    if document_ids:
+        if len(document_ids) > config.RETRIEVAL_MAX_DOCUMENTS:
+            return None, f"At most {config.RETRIEVAL_MAX_DOCUMENTS} documentIds are allowed, use scope 'all' instead"
+        return document_ids, None
+    if document_id is not None:
+        return document_id, None
+    return None, "documentId, documentIds or scope 'all' is required"
+
 
-@app.route('/api/query', methods=["POST"])
+def _is_admin() -> bool:
+    # without a configured token nobody is admin (profiles expose other users' queries)
+    if config.PROFILE_ADMIN_TOKEN is None:
+        return False
+    return hmac.compare_digest(request.headers.get("X-Admin-Token", ""), config.PROFILE_ADMIN_TOKEN)
+
+
+def _start_profile(query: str):
+    """
+    A RequestProfile if this request is profiled: asked for with the header X-Profile: 1
+    or picked at random (PROFILE_SAMPLE_RATE). None otherwise.
+    """
+    if not config.PROFILING_ENABLED:
+        return None
+    if request.headers.get("X-Profile") == "1" and _is_admin():
+        reason = "header"
+    elif config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE:
+        reason = "sampled"
+    else:
+        return None
+    profile = RequestProfile(request.path, query, reason)
+    profile.start_sampling(config.PROFILE_SAMPLE_INTERVAL)
+    return profile
+
+
+def _keep_profile(profile: RequestProfile, store: ProfileStore):
+    # requested profiles are always kept, sampled ones only if the request was slow
+    if profile.reason == "header" or profile.total_seconds >= config.PROFILE_SLOW_SECONDS:
+        store.add(profile)
+        logger.info(f"Captured profile {profile.id} of '{profile.query}' ({profile.total_seconds:.2f}s)")
+
+
+@api.route('/api/query', methods=["POST"])
 def chat():
     """
     Main RAG endpoint.
@@ -99,7 +292,11 @@ def chat():
         data = request.get_json()
         query = data.get("query")   # the user's original question/query
         document_id = data.get("documentId")    # the id of the document to restrict the retrieval to
+        document_ids = data.get("documentIds")  # or several documents
+        scope = data.get("scope")   # or "all" to search every document
         chat_history = data.get("chatHistory", [])  # chat history for conversational context (last 5 messages)
+        early_exit = data.get("earlyExit")  # optional override of EARLY_EXIT_ENABLED
+        conversation_id = data.get("conversationId")  # lets follow-ups reuse the work of previous turns
 
         if not query:
             return jsonify({
@@ -107,32 +304,173 @@ def chat():
                 "message": "Query is required"
             }), 400
 
-        logger.info(f"Received query: {query}")
-        response_generator = rag_pipeline.run_rag_pipeline(
-            user_query=query,
-            document_id=document_id,
-            chat_history=chat_history
-        )
+        if early_exit is not None and not isinstance(early_exit, bool):
+            return jsonify({
+                "status": "error",
+                "message": "earlyExit must be a boolean"
+            }), 400
+
+        document_scope, error = _document_scope(document_id, document_ids, scope)
+        if error:
+            return jsonify({"status": "error", "message": error}), 400
 
-        return Response(response_generator, mimetype="application/json")
+        logger.info(f"Received query: {query}")
+        # evaluation runs mark their requests so they never crowd out users
+        lane = "evaluation" if request.headers.get("X-Request-Priority") == "evaluation" else None
+        token = request_lane.set(lane)
+        profile = _start_profile(query)
+        profile_token = current_profile.set(profile)
+        try:
+            response_generator = get_services().rag_pipeline.run_rag_pipeline(
+                user_query=query,
+                document_id=document_scope,
+                chat_history=chat_history,
+                early_exit=early_exit,
+                conversation_id=str(conversation_id) if conversation_id else None
+            )
+        except BaseException as e:
+            if profile is not None:
+                profile.finish(e)
+                _keep_profile(profile, get_services().profiles)
+            raise
+        finally:
+            current_profile.reset(profile_token)
+            request_lane.reset(token)
+
+        if profile is None:
+            return Response(response_generator, mimetype="application/json")
+        # the answer is generated while it is streamed (after the app context has
+        # ended), the profile ends with the stream
+        store = get_services().profiles
+        response = Response(profile_stream(profile, response_generator, lambda p: _keep_profile(p, store)),
+                            mimetype="application/json")
+        response.headers["X-Profile-Id"] = profile.id
+        return response
+    except AdmissionRejected as e:
+        logger.warning(f"Rejected /api/query: {e}")
+        response = jsonify({"status": "error", "message": str(e)})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, e.status_code
     except Exception as e:
         logger.error(f"Error in /api/query: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route("/api/documents", methods=["GET"])
+@api.route("/api/prefetch", methods=["POST"])
+def prefetch():
+    """
+    Called (debounced) while the user types: embeds the partial query and runs its
+    searches, so the final /api/query with the same text skips them.
+    Body: query, documentId / documentIds / scope (as for /api/query) and optionally
+    suggestions (number of matching FAQ questions to return).
+    Rate limited per client address and worker (PREFETCH_RATE / PREFETCH_BURST), 429
+    with Retry-After. Behind a proxy set TRUSTED_PROXIES, so the address is the client's.
+    """
+    if not config.PREFETCH_ENABLED:
+        return jsonify({"status": "error", "message": "Prefetching is disabled"}), 404
+
+    services = get_services()
+    retry_after = services.prefetch_limiter.acquire(request.remote_addr)
+    if retry_after:
+        metrics.increment("prefetch.rejected")
+        response = jsonify({"status": "error", "message": "Too many prefetch requests"})
+        response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+        return response, 429
+
+    try:
+        data = request.get_json(silent=True) or {}
+        query = (data.get("query") or "").strip()
+        document_scope, error = _document_scope(data.get("documentId"), data.get("documentIds"), data.get("scope"))
+        if error:
+            return jsonify({"status": "error", "message": error}), 400
+        # too short to say much, or too long to be typed
+        if not config.PREFETCH_MIN_CHARS <= len(query) <= config.PREFETCH_MAX_CHARS:
+            return jsonify({"status": "skipped", "suggestions": []}), 200
+
+        suggestions = max(0, min(int(data.get("suggestions") or 0), config.PREFETCH_MAX_SUGGESTIONS))
+        matches = services.rag_pipeline.prefetch(query, document_scope, suggestions=suggestions)
+        metrics.increment("prefetch.requests")
+        return jsonify({
+            "status": "success",
+            "suggestions": [
+                {"faqId": m.faq_id, "question": m.question, "similarity": round(m.similarity, 4)}
+                for m in matches if m.similarity >= config.PREFETCH_SUGGESTION_MIN_SIMILARITY
+            ],
+        }), 200
+    except Exception as e:
+        logger.error(f"Error in /api/prefetch: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@api.route("/api/metrics", methods=["GET"])
+def get_metrics():
+    """
+    In-process metrics of this worker (counters, LLM timings per call type and endpoint).
+    """
+    services = get_services()
+    result = metrics.snapshot()
+    result["llm"] = {
+        "answer": services.generation_service.llm_provider.metrics.snapshot(),
+        "rewrite": services.query_rewriting_service.llm.metrics.snapshot(),
+        "endpoints": get_endpoint_stats(),
+    }
+    result["sessions"] = services.rag_pipeline.sessions.stats()
+    if services.indexing_service.read_router:
+        result["replicas"] = services.indexing_service.read_router.stats()
+    controller = get_admission_controller()
+    if controller:
+        result["llm"]["admission"] = controller.stats()
+    return jsonify(result), 200
+
+
+@api.route("/api/admin/profiles", methods=["GET"])
+def list_profiles():
+    """
+    Captured request profiles of this worker, newest first (summaries; the full
+    profile with stages, EXPLAIN plans and stack samples is at /api/admin/profiles/<id>).
+    """
+    if not config.PROFILING_ENABLED:
+        return jsonify({"status": "error", "message": "Profiling is disabled"}), 404
+    if config.PROFILE_ADMIN_TOKEN is None:
+        return jsonify({"status": "error", "message": "Set PROFILE_ADMIN_TOKEN to read profiles"}), 403
+    if not _is_admin():
+        return jsonify({"status": "error", "message": "Invalid admin token"}), 403
+    return jsonify({"profiles": [p.summary() for p in get_services().profiles.list()]}), 200
+
+
+@api.route("/api/admin/profiles/<profile_id>", methods=["GET"])
+def get_profile(profile_id):
+    if not config.PROFILING_ENABLED:
+        return jsonify({"status": "error", "message": "Profiling is disabled"}), 404
+    if config.PROFILE_ADMIN_TOKEN is None:
+        return jsonify({"status": "error", "message": "Set PROFILE_ADMIN_TOKEN to read profiles"}), 403
+    if not _is_admin():
+        return jsonify({"status": "error", "message": "Invalid admin token"}), 403
+    profile = get_services().profiles.get(profile_id)
+    if profile is None:
+        return jsonify({"status": "error", "message": f"Profile {profile_id} not found"}), 404
+    return jsonify(profile.to_dict()), 200
+
+
+@api.route("/api/documents", methods=["GET"])
 def list_documents():
     """
-    List all indexed documents.
-    Returns documents with id, name, uploadedAt, and size.
+    List the indexed documents, newest first.
+    Returns one page of documents with id, name, uploadedAt, size and faqCount, plus
+    the nextCursor to pass as ?cursor= for the next page (null on the last page).
+    Query parameters: limit (page size), cursor.
     """
     try:
-        documents = indexing_service.get_all_documents()
-        return jsonify({"documents": documents}), 200
+        limit = request.args.get("limit", type=int)
+        cursor = request.args.get("cursor")
+        if cursor is not None and not cursor.isdigit():
+            return jsonify({"status": "error", "message": "Invalid cursor"}), 400
+        page = get_services().indexing_service.get_all_documents(limit=limit, cursor=cursor)
+        return jsonify(page), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
-@app.route("/api/documents", methods=["DELETE"])
+@api.route("/api/documents", methods=["DELETE"])
 def delete_document():
     """
     Delete a document by ID.
@@ -148,8 +486,11 @@ def delete_document():
                 "message": "Document id is required"
             }), 400
 
-        result = indexing_service.delete_document(doc_id)
-        
+        services = get_services()
+        result = services.indexing_service.delete_document(doc_id)
+        # prefetched searches may still contain FAQs of the document
+        services.retrieval_service.prefetched.clear()
+
         if result["status"] == "error":
             return jsonify(result), 404
         
@@ -159,7 +500,7 @@ def delete_document():
 
 
 # NOTE: only for testing streaming responses (delete when llm streaming is implemented)
-@app.route("/api/chat", methods=["POST"])
+@api.route("/api/chat", methods=["POST"])
 def chat_test():
     """
     Streaming test endpoint.
@@ -190,4 +531,4 @@ If you still don't receive the email after trying these steps, please contact ou
 
 
 if __name__ == "__main__":
-    app.run(debug=True, port=5001)
+    create_app().run(debug=True, port=5001)
@@ -6,13 +6,141 @@ load_dotenv()
 class Config:
     LLM_BASE_URL = os.getenv("LLM_BASE_URL", "http://localhost:11434")
     LLM_MODEL = os.getenv("LLM_MODEL", "llama3")
+    # smaller/faster model for the query rewriting calls
+    LLM_REWRITE_MODEL = os.getenv("LLM_REWRITE_MODEL", LLM_MODEL)
+    # comma separated list of ollama hosts, requests are balanced over them
+    LLM_ENDPOINTS = [url.strip() for url in os.getenv("LLM_ENDPOINTS", LLM_BASE_URL).split(",") if url.strip()]
+    LLM_HEALTH_CHECK_INTERVAL = float(os.getenv("LLM_HEALTH_CHECK_INTERVAL", "10"))
+    # how long ollama keeps the model loaded after a request ("-1" = forever)
+    LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")
+    # context window (unset = ollama default). Calls with a different num_ctx
+    # for the same model force ollama to reload it, so keep them equal per model.
+    LLM_NUM_CTX = int(os.getenv("LLM_NUM_CTX")) if os.getenv("LLM_NUM_CTX") else None
+    LLM_REWRITE_NUM_CTX = int(os.getenv("LLM_REWRITE_NUM_CTX")) if os.getenv("LLM_REWRITE_NUM_CTX") else LLM_NUM_CTX
+    # max. number of generated tokens per call type (unset = no limit)
+    LLM_ANSWER_NUM_PREDICT = int(os.getenv("LLM_ANSWER_NUM_PREDICT")) if os.getenv("LLM_ANSWER_NUM_PREDICT") else None
+    LLM_REWRITE_NUM_PREDICT = int(os.getenv("LLM_REWRITE_NUM_PREDICT", "64"))
+    LLM_WARMUP = os.getenv("LLM_WARMUP", "true").lower() == "true"
+    # admission control: max. concurrent LLM calls per worker (0 = unlimited),
+    # max. waiting calls per lane and how long a call may wait for a slot
+    LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "4"))
+    LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "16"))
+    LLM_MAX_QUEUE_EVALUATION = int(os.getenv("LLM_MAX_QUEUE_EVALUATION", "4"))
+    LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "15"))
 
     POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
     POSTGRES_PORT = int(os.getenv("POSTGRES_PORT", "5433"))
     POSTGRES_DB = os.getenv("POSTGRES_DB", "gen_ai")
     POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
     POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
+    POSTGRES_POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1"))
+    POSTGRES_POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "5"))
+    POSTGRES_POOL_TIMEOUT = float(os.getenv("POSTGRES_POOL_TIMEOUT", "10"))
+    # read replicas (host or host:port, comma-separated) for similarity searches and
+    # listings; writes always go to the primary. A replica is skipped while its
+    # replication lag exceeds POSTGRES_REPLICA_MAX_LAG seconds.
+    POSTGRES_REPLICA_HOSTS = [h.strip() for h in os.getenv("POSTGRES_REPLICA_HOSTS", "").split(",") if h.strip()]
+    POSTGRES_REPLICA_MAX_LAG = float(os.getenv("POSTGRES_REPLICA_MAX_LAG", "5"))
+    POSTGRES_REPLICA_CHECK_INTERVAL = float(os.getenv("POSTGRES_REPLICA_CHECK_INTERVAL", "2"))
 
     EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+    EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "384"))
+    # sentence-transformers (PyTorch) or onnx (onnxruntime, no torch in the worker)
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+    # ONNX export to use (e.g. onnx/model_quint8_avx2.onnx for the int8 version), read
+    # from EMBEDDING_ONNX_PATH or downloaded from the Hugging Face hub if that is unset
+    EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model.onnx")
+    EMBEDDING_ONNX_PATH = os.getenv("EMBEDDING_ONNX_PATH") or None
+    EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))
+    # how often a process checks whether a re-embedding switched the active model
+    EMBEDDING_MODEL_CHECK_INTERVAL = float(os.getenv("EMBEDDING_MODEL_CHECK_INTERVAL", "10"))
+    # re-embedding worker: rows per batch and pause between batches (seconds)
+    REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE", "256"))
+    REEMBED_PAUSE = float(os.getenv("REEMBED_PAUSE", "0.5"))
+    # directory of the persistent embedding cache shared with the evaluation (unset = no cache)
+    EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR") or None
+    # float | halfvec | binary (see services/embedding_storage.py)
+    EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "float")
+    # number of compact-index candidates that are rescored with the exact float distance
+    RESCORE_CANDIDATES = int(os.getenv("RESCORE_CANDIDATES", "40"))
+    # store the FAQs of every document in its own partition of the faqs table
+    FAQ_PARTITIONING = os.getenv("FAQ_PARTITIONING", "false").lower() == "true"
+
+    # page size of GET /api/documents (default and upper bound of ?limit=)
+    DOCUMENTS_PAGE_SIZE = int(os.getenv("DOCUMENTS_PAGE_SIZE", "50"))
+    DOCUMENTS_MAX_PAGE_SIZE = int(os.getenv("DOCUMENTS_MAX_PAGE_SIZE", "200"))
+
+    # share one pipeline execution between identical concurrent queries
+    REQUEST_COALESCING = os.getenv("REQUEST_COALESCING", "true").lower() == "true"
+
+    # number of retrieved FAQs when the caller does not pass k, and the minimum
+    # cosine similarity of a FAQ to be used as context (0 = no cutoff)
+    RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+    RETRIEVAL_MIN_SIMILARITY = float(os.getenv("RETRIEVAL_MIN_SIMILARITY", "0.2"))
+    # split long answers into chunks at upload: none | sentence-window | fixed-token
+    # (see services/chunking.py); after changing it run `flask --app app rechunk`
+    ANSWER_CHUNKING = os.getenv("ANSWER_CHUNKING", "none")
+    CHUNK_SENTENCES = int(os.getenv("CHUNK_SENTENCES", "2"))
+    CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "100"))
+    CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "20"))
+    # a retrieved chunk is expanded by this many chunks before and after it
+    CHUNK_NEIGHBORS = int(os.getenv("CHUNK_NEIGHBORS", "1"))
+    # max. number of documentIds in one query (larger scopes use scope "all")
+    RETRIEVAL_MAX_DOCUMENTS = int(os.getenv("RETRIEVAL_MAX_DOCUMENTS", "100"))
+
+    # conversation sessions (requests with a conversationId): max. number per worker,
+    # seconds a session is kept after its last turn, and the cosine similarity of a
+    # follow-up's rewritten query to the previous one above which the previous
+    # retrieval results are reused
+    SESSION_MAX_CONVERSATIONS = int(os.getenv("SESSION_MAX_CONVERSATIONS", "1000"))
+    SESSION_TTL = int(os.getenv("SESSION_TTL", "1800"))
+    SESSION_REUSE_SIMILARITY = float(os.getenv("SESSION_REUSE_SIMILARITY", "0.9"))
+
+    # answer with the stored FAQ answer (no LLM call) if the query matches a FAQ
+    # question with at least this cosine similarity
+    EARLY_EXIT_ENABLED = os.getenv("EARLY_EXIT_ENABLED", "false").lower() == "true"
+    EARLY_EXIT_THRESHOLD = float(os.getenv("EARLY_EXIT_THRESHOLD", "0.95"))
+
+    # /api/prefetch: embeds the query while the user types and runs its searches, so
+    # the final /api/query with the same text skips them (within PREFETCH_TTL seconds;
+    # uploads and deletes clear the prefetched results of the worker that handles them)
+    PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+    # per client address: PREFETCH_RATE calls per second on average, bursts of
+    # PREFETCH_BURST. Every worker process counts on its own, so with N workers a
+    # client can get up to N times the rate through.
+    PREFETCH_RATE = float(os.getenv("PREFETCH_RATE", "2"))
+    PREFETCH_BURST = int(os.getenv("PREFETCH_BURST", "4"))
+    PREFETCH_MIN_CHARS = int(os.getenv("PREFETCH_MIN_CHARS", "3"))
+    PREFETCH_MAX_CHARS = int(os.getenv("PREFETCH_MAX_CHARS", "500"))
+    PREFETCH_TTL = float(os.getenv("PREFETCH_TTL", "60"))
+    PREFETCH_CACHE_SIZE = int(os.getenv("PREFETCH_CACHE_SIZE", "2000"))
+    # suggested FAQ questions (at most, and their min. similarity to the partial query)
+    PREFETCH_MAX_SUGGESTIONS = int(os.getenv("PREFETCH_MAX_SUGGESTIONS", "5"))
+    PREFETCH_SUGGESTION_MIN_SIMILARITY = float(os.getenv("PREFETCH_SUGGESTION_MIN_SIMILARITY", "0.5"))
+    # use the prefetched results of a query without chat history as they are, without
+    # rewriting it first (off: the query is rewritten and only a rewritten query with
+    # the same text as the prefetched one skips the embedding and the searches)
+    PREFETCH_SKIP_REWRITE = os.getenv("PREFETCH_SKIP_REWRITE", "false").lower() == "true"
+
+    # number of reverse proxies in front of the app that set X-Forwarded-For; the
+    # client address (e.g. for the prefetch rate limit) is then taken from that header
+    TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", "0"))
+
+    # Worker start-up (see gunicorn.conf.py)
+    WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    WARMUP_QUERY = os.getenv("WARMUP_QUERY", "How do I reset my password?")
+
+    # Request profiling of /api/query (stage timings, stack samples, EXPLAIN ANALYZE of
+    # the retrieval SQL): requests with the header X-Profile: 1 and a random
+    # PROFILE_SAMPLE_RATE share of all requests. Sampled requests are only kept if
+    # they take PROFILE_SLOW_SECONDS or longer. The last PROFILE_BUFFER_SIZE profiles
+    # are served by /api/admin/profiles. The endpoint and the X-Profile header require
+    # the header X-Admin-Token, both are refused while PROFILE_ADMIN_TOKEN is unset.
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", "2"))
+    PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "50"))
+    PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+    PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN") or None
 
 config = Config()
\ No newline at end of file
@@ -0,0 +1,47 @@
+"""
+Production server configuration.
+
+Run from backend/src:
+    gunicorn -c gunicorn.conf.py
+
+The app (and the embedding model) is loaded once in the master process and the
+workers are forked from it, so they share the model memory through copy-on-write.
+Every worker opens its own database connection pool and runs a warm-up query
+before it starts accepting requests.
+"""
+import multiprocessing
+import os
+
+wsgi_app = "app:create_app()"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5001")
+workers = int(os.getenv("GUNICORN_WORKERS", min(multiprocessing.cpu_count(), 4)))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+# answers are streamed from the LLM, which can take a while
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+preload_app = True
+accesslog = "-"
+
+
+def _services(server):
+    from app import get_services
+    # with preload_app the wsgi app is created once in the master and inherited
+    return get_services(server.app.wsgi())
+
+
+def when_ready(server):
+    # called in the master after the app was loaded and before workers are forked
+    _services(server).preload()
+    server.log.info("Master preload finished")
+
+
+def post_fork(server, worker):
+    _services(server).init_worker()
+
+
+def post_worker_init(worker):
+    # the worker only starts accepting requests after this hook returns
+    from app import get_services
+    get_services(worker.wsgi).warm_up()
+    worker.log.info(f"Worker {worker.pid} ready")
@@ -1,8 +1,17 @@
 import logging
+from typing import Optional
+
+import numpy as np
+from config import config
 from services.generation_service import GenerationService
 from services.indexing_service import IndexingService
 from services.query_rewriting_service import QueryRewritingService
-from services.retrieval_service import RetrievalService
+from services.prompt.prompts_library import RAGPrompts
+from services.retrieval_service import RetrievalService, scope_document_ids
+from utils.metrics import metrics
+from utils.profiling import current_profile, stage
+from utils.session_store import ConversationState, SessionStore
+from utils.singleflight import SingleFlight
 
 
 # Configure logging
@@ -15,12 +24,22 @@ class RAGPipeline:
     Orchestrates the complete RAG pipeline
     """
 
-    def __init__(self):
-        """Initialize all services"""
-        self.indexing_service = IndexingService()
-        self.query_rewriting_service = QueryRewritingService()
-        self.retrieval_service = RetrievalService()
-        self.generation_service = GenerationService()
+    def __init__(
+        self,
+        indexing_service: Optional[IndexingService] = None,
+        query_rewriting_service: Optional[QueryRewritingService] = None,
+        retrieval_service: Optional[RetrievalService] = None,
+        generation_service: Optional[GenerationService] = None,
+    ):
+        """Initialize all services (shared instances can be passed in)"""
+        self.indexing_service = indexing_service or IndexingService()
+        self.query_rewriting_service = query_rewriting_service or QueryRewritingService()
+        self.retrieval_service = retrieval_service or RetrievalService()
+        self.generation_service = generation_service or GenerationService()
+        # concurrent identical queries share one execution
+        self.single_flight = SingleFlight()
+        # what the previous turns of a conversation computed (see _rewrite / _retrieve)
+        self.sessions = SessionStore(config.SESSION_MAX_CONVERSATIONS, config.SESSION_TTL)
 
     def index_document(self, documents):
         """Index documents into the vector database."""
@@ -28,20 +47,189 @@ class RAGPipeline:
         faq_entries = [faq for doc in documents for faq in doc.get('faqs', [])]
         return self.indexing_service.index_documents(documents, file_size=file_size, faq_entries=faq_entries)
 
-    def run_rag_pipeline(self, user_query, document_id, chat_history, k=3):
-        # Step 1 (Kevin): Query Rewriting
-        rewriting_result = self.query_rewriting_service.rewrite_query(user_query, chat_history)
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def run_rag_pipeline(self, user_query, document_id, chat_history, k=3, early_exit=None, conversation_id=None):
+        """
+        Runs the pipeline and returns a generator over the answer tokens.
+
+        Requests without chat history that ask the same (normalized) question about
+        the same document while an identical request is still running are coalesced:
+        they do not run the pipeline again but receive the tokens of the running one.
+        Requests with a conversation_id are only coalesced within their conversation.
+
+        document_id is a single document, a list of documents or None (all documents).
+        early_exit overrides EARLY_EXIT_ENABLED for this request (see _early_exit).
+        conversation_id identifies the conversation, so follow-ups can reuse the rewrites
+        and retrieval results of its previous turns (see _rewrite / _retrieve).
+        """
+        if early_exit is None:
+            early_exit = config.EARLY_EXIT_ENABLED
+        session = self.sessions.get(conversation_id) if conversation_id else None
+        # a profiled request runs on its own, in the request's thread (see utils/profiling.py)
+        if not config.REQUEST_COALESCING or chat_history or current_profile.get() is not None:
+            return self._run_rag_pipeline(user_query, document_id, chat_history, k, early_exit, session)
+
+        document_ids = scope_document_ids(document_id)
+        # only the leader's session is updated, so requests of different conversations
+        # are not coalesced (a joiner's follow-ups could not reuse this turn otherwise)
+        key = (self._normalize_query(user_query), document_ids and tuple(document_ids), k, early_exit,
+               conversation_id if session is not None else None)
+        stream, joined = self.single_flight.run(
+            key,
+            lambda: self._run_rag_pipeline(user_query, document_id, chat_history, k, early_exit, session)
+        )
+        if joined:
+            metrics.increment("pipeline.coalesced")
+            logger.info(f"Joined in-flight execution for query '{user_query}'")
+        return stream
+
+    def prefetch(self, partial_query, document_id, k=3, suggestions=0):
+        """
+        Runs the query embedding and the searches of a query that is still being typed
+        (see RetrievalService.prefetch), with the k run_rag_pipeline uses. A query that
+        is rewritten to the same text skips the embedding and the searches; with
+        PREFETCH_SKIP_REWRITE a query without chat history also skips the rewriting
+        (see _prefetched).
+        Returns up to `suggestions` FAQs whose questions match the partial query.
+        """
+        return self.retrieval_service.prefetch(partial_query, document_id, self.indexing_service,
+                                               k=k, questions=suggestions)
+
+    def _early_exit(self, query, document_id):
+        """
+        Returns the stored answer as a stream if the query is (nearly) the same
+        question as a FAQ of the document, so no LLM call is needed. None otherwise.
+        """
+        with stage("early_exit"):
+            match = self.retrieval_service.find_matching_faq(query, document_id, self.indexing_service)
+        if match is None or match.similarity < config.EARLY_EXIT_THRESHOLD:
+            metrics.increment("pipeline.early_exit.miss")
+            return None
+
+        metrics.increment("pipeline.early_exit.hit")
+        logger.info(f"Early exit for query '{query}': FAQ #{match.faq_id} (similarity {match.similarity:.3f})")
+        return iter([match.answer])
+
+    def _prefetched(self, user_query, document_id, k, session: Optional[ConversationState]):
+        """
+        The retrieval results prefetched for the query while it was typed (see prefetch),
+        None if there are none. Only used with PREFETCH_SKIP_REWRITE and for queries
+        without chat history, which then are searched as they were typed.
+        """
+        chunks = self.retrieval_service.prefetched_results(user_query, document_id, self.indexing_service, k=k)
+        if chunks is None:
+            return None
+        metrics.increment("pipeline.prefetch_used")
+        logger.info(f"Using the prefetched results of query '{user_query}'")
+        if session is not None:
+            # the embedding was prefetched as well
+            query_embedding = self.retrieval_service.embed_query(user_query, self.indexing_service)
+            self._remember_retrieval(session, query_embedding, document_id, k, chunks)
+        return chunks
+
+    def _remember_retrieval(self, session: ConversationState, query_embedding, document_id, k, chunks):
+        """Keeps the retrieval of this turn, so the next one can reuse it (see _retrieve)."""
+        document_ids = scope_document_ids(document_id)
+        session.query_embedding = query_embedding
+        session.model_name = self.indexing_service.model_name
+        session.retrieval_key = (document_ids and tuple(document_ids), k)
+        session.results = chunks
+
+    def _rewrite(self, user_query, chat_history, session: Optional[ConversationState]):
+        """
+        Rewrites the query, unless the conversation already rewrote the same query with
+        the same history (e.g. a question that is sent again).
+        """
+        key = None
+        if session is not None:
+            history = tuple((m.get("role"), m.get("content")) for m in (chat_history or [])[-5:])
+            key = (self._normalize_query(user_query), history)
+            if key in session.rewrites:
+                metrics.increment("pipeline.session.rewrite_reused")
+                return session.rewrites[key]
+
+        with stage("rewrite"):
+            rewriting_result = self.query_rewriting_service.rewrite_query(user_query, chat_history)
         optimized_query = rewriting_result.get("cleaned_query", user_query)
+        if key is not None:
+            session.remember_rewrite(key, optimized_query)
+        return optimized_query
+
+    def _retrieve(self, optimized_query, document_id, k, session: Optional[ConversationState]):
+        """
+        Retrieves the context of the query. Within a conversation the results of the
+        previous turn are reused if the follow-up is about the same thing (same scope
+        and k, cosine similarity of the rewritten queries >= SESSION_REUSE_SIMILARITY),
+        so only the query is embedded and the vector search is skipped.
+        """
+        if session is None:
+            return self.retrieval_service.retrieve_documents(optimized_query, document_id, self.indexing_service, k=k)
+
+        query_embedding = self.retrieval_service.embed_query(optimized_query, self.indexing_service)
+        document_ids = scope_document_ids(document_id)
+        retrieval_key = (document_ids and tuple(document_ids), k)
 
-        logger.info(f"Original query: '{user_query}' optimized to: '{optimized_query}'")
+        if (session.query_embedding is not None
+                and session.model_name == self.indexing_service.model_name
+                and session.retrieval_key == retrieval_key):
+            previous = session.query_embedding
+            similarity = float(np.dot(previous, query_embedding)
+                               / (np.linalg.norm(previous) * np.linalg.norm(query_embedding) or 1.0))
+            if similarity >= config.SESSION_REUSE_SIMILARITY:
+                metrics.increment("pipeline.session.retrieval_reused")
+                logger.info(f"Reusing FAQs {session.faq_ids} of the previous turn (similarity {similarity:.3f})")
+                return session.results
 
-        # Step 2 (Paula): Retrieval
         chunks = self.retrieval_service.retrieve_documents(
             optimized_query,
             document_id,
-            self.indexing_service
+            self.indexing_service,
+            k=k,
+            query_embedding=query_embedding
         )
-        logger.info(f"Retrieved {len(chunks)} chunks for query '{optimized_query}'")
+        self._remember_retrieval(session, query_embedding, document_id, k, chunks)
+        return chunks
+
+    def _run_rag_pipeline(self, user_query, document_id, chat_history, k=3, early_exit=False, session=None):
+        metrics.increment("pipeline.executions")
+
+        # Without history the user's question can be compared with the FAQ
+        # questions right away, which also saves the rewriting call
+        if early_exit and not chat_history:
+            answer = self._early_exit(user_query, document_id)
+            if answer is not None:
+                return answer
+
+        # the query was prefetched while it was typed: no rewriting, embedding or search
+        chunks = None
+        if config.PREFETCH_SKIP_REWRITE and not chat_history:
+            chunks = self._prefetched(user_query, document_id, k, session)
+
+        if chunks is None:
+            # Step 1 (Kevin): Query Rewriting
+            optimized_query = self._rewrite(user_query, chat_history, session)
+
+            logger.info(f"Original query: '{user_query}' optimized to: '{optimized_query}'")
+
+            # follow-up questions are only self-contained after rewriting
+            if early_exit and chat_history:
+                answer = self._early_exit(optimized_query, document_id)
+                if answer is not None:
+                    return answer
+
+            # Step 2 (Paula): Retrieval
+            with stage("retrieval"):
+                chunks = self._retrieve(optimized_query, document_id, k, session)
+            logger.info(f"Retrieved {len(chunks)} chunks for query '{optimized_query}'")
+
+        # nothing in the knowledge base is similar enough, the LLM would only
+        # produce the out-of-scope answer anyway
+        if not chunks:
+            metrics.increment("pipeline.empty_context")
+            return iter([RAGPrompts.NO_CONTEXT_ANSWER])
 
         # Step 3: Generation
         logger.info(f"Starting response generation with {k} chunks.")
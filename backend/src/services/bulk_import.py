@@ -0,0 +1,164 @@
+"""
+Readers for the FAQ upload formats.
+
+csv      - columns question, answer
+ndjson   - one JSON object per line: {"question": ..., "answer": ...}
+parquet  - columns question, answer (also Arrow IPC files via the same reader)
+
+NDJSON and Parquet rows can carry precomputed embeddings (question_embedding,
+answer_embedding: lists of floats), together with the name of the model that
+produced them: the "embedding_model" field of the first NDJSON row or the
+"embedding_model" key of the Parquet schema metadata. Embeddings of another model
+than the active one are ignored and computed again.
+
+Parquet embedding columns are read from the Arrow buffers as one float32 matrix,
+without per-row Python objects. pyarrow is only needed for Parquet files.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+FORMATS = ("csv", "ndjson", "parquet")
+_EXTENSIONS = {".csv": "csv", ".jsonl": "ndjson", ".ndjson": "ndjson", ".parquet": "parquet",
+               ".arrow": "parquet", ".feather": "parquet"}
+
+
+@dataclass
+class FaqBatch:
+    questions: List[str]
+    answers: List[str]
+    question_embeddings: Optional[np.ndarray] = None
+    answer_embeddings: Optional[np.ndarray] = None
+    embedding_model: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    @property
+    def has_embeddings(self) -> bool:
+        return self.question_embeddings is not None and self.answer_embeddings is not None
+
+
+def detect_format(filename: str, content: bytes) -> str:
+    """The format of an uploaded file, from its extension or (without one) its content."""
+    name = (filename or "").lower()
+    for extension, fmt in _EXTENSIONS.items():
+        if name.endswith(extension):
+            return fmt
+    if content.startswith(b"PAR1") or content.startswith(b"ARROW1"):
+        return "parquet"
+    if content.lstrip().startswith(b"{"):
+        return "ndjson"
+    return "csv"
+
+
+def read_faqs(content: bytes, fmt: str) -> FaqBatch:
+    """Parse an uploaded file, rows without question or answer are skipped."""
+    if fmt == "csv":
+        return _read_csv(content)
+    if fmt == "ndjson":
+        return _read_ndjson(content)
+    if fmt == "parquet":
+        return _read_parquet(content)
+    raise ValueError(f"Unknown format '{fmt}', expected one of {FORMATS}")
+
+
+def _read_csv(content: bytes) -> FaqBatch:
+    stream = io.StringIO(content.decode("UTF-8"), newline=None)
+    questions, answers = [], []
+    for row in csv.DictReader(stream):
+        q = row.get("question")
+        a = row.get("answer")
+        if q and a:
+            questions.append(q)
+            answers.append(a)
+    return FaqBatch(questions, answers)
+
+
+def _read_ndjson(content: bytes) -> FaqBatch:
+    questions, answers, q_embs, a_embs = [], [], [], []
+    embedding_model = None
+    for number, line in enumerate(content.decode("UTF-8").splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON in line {number}: {e}") from e
+        if not isinstance(row, dict):
+            raise ValueError(f"Line {number} is not a JSON object")
+        if not row.get("question") or not row.get("answer"):
+            continue
+        if not questions:
+            embedding_model = row.get("embedding_model")
+        questions.append(row["question"])
+        answers.append(row["answer"])
+        q_embs.append(row.get("question_embedding"))
+        a_embs.append(row.get("answer_embedding"))
+
+    batch = FaqBatch(questions, answers, embedding_model=embedding_model)
+    if questions and all(e is not None for e in q_embs) and all(e is not None for e in a_embs):
+        batch.question_embeddings = _matrix(q_embs, "question_embedding")
+        batch.answer_embeddings = _matrix(a_embs, "answer_embedding")
+    return batch
+
+
+def _matrix(rows: list, column: str) -> np.ndarray:
+    try:
+        return np.array(rows, dtype=np.float32).reshape(len(rows), -1)
+    except ValueError as e:
+        raise ValueError(f"All {column} values must have the same length") from e
+
+
+def _read_parquet(content: bytes) -> FaqBatch:
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ValueError("Parquet uploads need the pyarrow package") from e
+
+    if content.startswith(b"ARROW1"):
+        table = pa.ipc.open_file(pa.BufferReader(content)).read_all()
+    else:
+        table = pq.read_table(pa.BufferReader(content))
+    missing = {"question", "answer"} - set(table.column_names)
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(sorted(missing))}")
+
+    # same rule as for CSV: rows need a question and an answer
+    keep = pc.and_(pc.fill_null(pc.not_equal(table["question"], ""), False),
+                   pc.fill_null(pc.not_equal(table["answer"], ""), False))
+    if not pc.all(keep).as_py():
+        table = table.filter(keep)
+
+    metadata = table.schema.metadata or {}
+    model = metadata.get(b"embedding_model")
+    batch = FaqBatch(
+        questions=table["question"].to_pylist(),
+        answers=table["answer"].to_pylist(),
+        embedding_model=model.decode("utf-8") if model else None,
+    )
+    if len(batch) and "question_embedding" in table.column_names and "answer_embedding" in table.column_names:
+        batch.question_embeddings = _arrow_matrix(table["question_embedding"], "question_embedding")
+        batch.answer_embeddings = _arrow_matrix(table["answer_embedding"], "answer_embedding")
+    return batch
+
+
+def _arrow_matrix(column, name: str) -> np.ndarray:
+    """A (fixed size) list<float> column as a float32 matrix, straight from the value buffer."""
+    import pyarrow.compute as pc
+
+    array = column.combine_chunks()
+    if array.null_count:
+        raise ValueError(f"{name} contains empty values")
+    lengths = pc.list_value_length(array)
+    dim = pc.min(lengths).as_py()
+    if dim != pc.max(lengths).as_py():
+        raise ValueError(f"All {name} values must have the same length")
+    values = array.flatten().to_numpy(zero_copy_only=False)
+    return values.astype(np.float32, copy=False).reshape(len(array), dim)
@@ -0,0 +1,84 @@
+"""
+Chunking strategies for long FAQ answers.
+
+none            - every answer is retrieved as a whole (default)
+sentence-window - windows of CHUNK_SENTENCES consecutive sentences
+fixed-token     - windows of CHUNK_TOKENS tokens, consecutive windows share CHUNK_OVERLAP tokens
+
+A chunk is stored as its character span in the answer (see the faq_chunks table in
+indexing_service.py), so retrieval can expand a matching chunk to its neighbors by
+taking the span from the first to the last neighbor out of the parent answer.
+Tokens are whitespace-separated words, which keeps the chunker independent of the
+embedding model (all-MiniLM-L6-v2 reads up to 256 word pieces, ~150-200 words).
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, Union
+
+from config import config
+
+CHUNKING_STRATEGIES = ("none", "sentence-window", "fixed-token")
+
+# a sentence ends with . ! or ? followed by whitespace, or at a blank line
+_SENTENCE = re.compile(r"\S.*?(?:[.!?]+(?=\s|$)|(?=\n\s*\n)|$)", re.S)
+_TOKEN = re.compile(r"\S+")
+
+Span = Tuple[int, int]
+
+
+@dataclass(frozen=True)
+class SentenceWindowChunker:
+    sentences_per_chunk: int = 2
+
+    def __post_init__(self):
+        if self.sentences_per_chunk < 1:
+            raise ValueError("sentences_per_chunk must be at least 1")
+
+    def split(self, text: str) -> List[Span]:
+        """Character spans (start, end) of the chunks of the text, in order."""
+        sentences = [m.span() for m in _SENTENCE.finditer(text)]
+        n = self.sentences_per_chunk
+        return [(sentences[i][0], sentences[min(i + n, len(sentences)) - 1][1])
+                for i in range(0, len(sentences), n)]
+
+
+@dataclass(frozen=True)
+class FixedTokenChunker:
+    tokens_per_chunk: int = 100
+    overlap: int = 20
+
+    def __post_init__(self):
+        if not 0 <= self.overlap < self.tokens_per_chunk:
+            raise ValueError("overlap must be at least 0 and smaller than tokens_per_chunk")
+
+    def split(self, text: str) -> List[Span]:
+        """Character spans (start, end) of the chunks of the text, in order."""
+        tokens = [m.span() for m in _TOKEN.finditer(text)]
+        step = self.tokens_per_chunk - self.overlap
+        spans = []
+        for i in range(0, len(tokens), step):
+            window = tokens[i:i + self.tokens_per_chunk]
+            spans.append((window[0][0], window[-1][1]))
+            if i + self.tokens_per_chunk >= len(tokens):
+                break
+        return spans
+
+
+Chunker = Union[SentenceWindowChunker, FixedTokenChunker]
+
+
+def create_chunker(strategy: Optional[str] = None) -> Optional[Chunker]:
+    """The chunker of a strategy (default ANSWER_CHUNKING), None for 'none'."""
+    strategy = strategy or config.ANSWER_CHUNKING
+    if strategy not in CHUNKING_STRATEGIES:
+        raise ValueError(f"Unknown chunking strategy '{strategy}', expected one of {CHUNKING_STRATEGIES}")
+    if strategy == "sentence-window":
+        return SentenceWindowChunker(config.CHUNK_SENTENCES)
+    if strategy == "fixed-token":
+        return FixedTokenChunker(config.CHUNK_TOKENS, config.CHUNK_OVERLAP)
+    return None
+
+
+def chunk_spans(chunker: Chunker, text: str) -> List[Span]:
+    """The chunk spans of an answer; at least one (the whole answer) for every answer."""
+    return chunker.split(text) or [(0, len(text))]
@@ -0,0 +1,121 @@
+"""
+Storage modes for the FAQ embeddings.
+
+float   - the vector(dim) columns are indexed directly (ivfflat, default)
+halfvec - the vector columns are indexed as halfvec(dim) (half-precision, 2x smaller index)
+binary  - the vector columns are indexed as binary-quantized bit(dim) (32x smaller index)
+
+In the compact modes the float32 vectors stay in the table and are only used to
+rescore a small candidate set: the ANN search runs on the compact index and the
+top candidates are re-ordered by their exact cosine distance.
+
+Every mode has its own index names (<name>, <name>_half, <name>_bin). When the mode
+is changed, the indexes of the other modes are dropped at start-up (see
+drop_statements), so inserts do not keep maintaining indexes no query uses.
+
+Based on https://github.com/pgvector/pgvector#half-precision-indexing and
+https://github.com/pgvector/pgvector#binary-quantization
+"""
+from dataclasses import dataclass
+from typing import List
+
+from config import config
+
+STORAGE_MODES = ("float", "halfvec", "binary")
+
+
+@dataclass(frozen=True)
+class EmbeddingStorage:
+    mode: str = "float"
+    dimension: int = 384
+    rescore_candidates: int = 40
+
+    def __post_init__(self):
+        if self.mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown embedding storage mode '{self.mode}', expected one of {STORAGE_MODES}")
+
+    @classmethod
+    def from_config(cls) -> "EmbeddingStorage":
+        return cls(
+            mode=config.EMBEDDING_STORAGE,
+            dimension=config.EMBEDDING_DIMENSION,
+            rescore_candidates=config.RESCORE_CANDIDATES,
+        )
+
+    @property
+    def is_compact(self) -> bool:
+        return self.mode != "float"
+
+    def index_statements(self, table: str, column: str, index_name: str, incremental: bool = False) -> List[str]:
+        """
+        CREATE INDEX statement(s) for one embedding column.
+
+        incremental: the index is created before the rows are inserted (e.g. on a
+        partitioned table, where every new partition inherits it). IVFFlat needs the
+        data to train its lists, so HNSW is used for the float mode in that case.
+        """
+        if self.mode == "halfvec":
+            return [f"""
+                CREATE INDEX IF NOT EXISTS {index_name}_half
+                ON {table} USING hnsw (({column}::halfvec({self.dimension})) halfvec_cosine_ops);
+            """]
+        if self.mode == "binary":
+            return [f"""
+                CREATE INDEX IF NOT EXISTS {index_name}_bin
+                ON {table} USING hnsw ((binary_quantize({column})::bit({self.dimension})) bit_hamming_ops);
+            """]
+        if incremental:
+            return [f"""
+                CREATE INDEX IF NOT EXISTS {index_name}
+                ON {table} USING hnsw ({column} vector_cosine_ops);
+            """]
+        return [f"""
+            CREATE INDEX IF NOT EXISTS {index_name}
+            ON {table} USING ivfflat ({column} vector_cosine_ops)
+            WITH (lists = 100);
+        """]
+
+    def drop_statements(self, index_name: str) -> List[str]:
+        """DROP INDEX statements for the index of one column in the other storage modes."""
+        return [f"DROP INDEX IF EXISTS {self._mode_index_name(mode, index_name)};"
+                for mode in STORAGE_MODES if mode != self.mode]
+
+    @staticmethod
+    def _mode_index_name(mode: str, index_name: str) -> str:
+        return {"float": index_name, "halfvec": f"{index_name}_half", "binary": f"{index_name}_bin"}[mode]
+
+    def coarse_distance(self, column: str) -> str:
+        """Distance expression that can be served by the index of the current mode."""
+        if self.mode == "halfvec":
+            return f"{column}::halfvec({self.dimension}) <=> %(query)s::halfvec({self.dimension})"
+        if self.mode == "binary":
+            return f"binary_quantize({column})::bit({self.dimension}) <~> binary_quantize(%(query)s::vector)"
+        return f"{column} <=> %(query)s::vector"
+
+    def nearest_sql(self, table: str, column: str, select: str, where: str = "TRUE") -> str:
+        """
+        Top-k query on `column` returning `select` plus the exact cosine `distance`.
+
+        Parameters: %(query)s (vector literal), %(k)s and whatever `where` uses.
+        """
+        exact = f"{column} <=> %(query)s::vector"
+        if not self.is_compact:
+            return f"""
+                SELECT {select}, {exact} AS distance
+                FROM {table}
+                WHERE {where}
+                ORDER BY {exact}
+                LIMIT %(k)s
+            """
+        # coarse search on the compact index, then exact rescoring of the candidates
+        return f"""
+            SELECT {select}, distance FROM (
+                SELECT {select}, {exact} AS distance
+                FROM {table}
+                WHERE {where}
+                ORDER BY {self.coarse_distance(column)}
+                LIMIT GREATEST(%(k)s, {int(self.rescore_candidates)})
+            ) AS candidates
+            ORDER BY distance
+            LIMIT %(k)s
+        """
@@ -1,7 +1,7 @@
-import os
 import logging
-from utils.llm.ollama_provider import OllamaProvider
+from utils.llm.factory import create_llm_provider
 from .prompt.prompts_library import RAGPrompts
+from .retrieval_service import RetrievalResult
 from config import config
 
 # Configure logging
@@ -9,9 +9,14 @@ logger = logging.getLogger(__name__)
 
 class GenerationService:
     def __init__(self):
-        ollama_url = os.getenv("LLM_BASE_URL", "http://localhost:11434")
-        ollama_model_name = os.getenv("LLM_MODEL", "llama3")
-        self.llm_provider = OllamaProvider(model_name=config.LLM_MODEL, base_url=config.LLM_BASE_URL)
+        self.llm_provider = create_llm_provider(
+            model_name=config.LLM_MODEL,
+            options={
+                "num_ctx": config.LLM_NUM_CTX,
+                "num_predict": config.LLM_ANSWER_NUM_PREDICT,
+            },
+            lane="answer",
+        )
 
     def _trim_chunks_to_fit_context(self, chunks: list[str], max_chars=20000)  -> list[str]:
         # 20000 = 8000 tokens (llama3 context window 819) * 2,5 chars per token (4 chars per token usual estimate)
@@ -34,14 +39,13 @@ class GenerationService:
     def generate_response_stream(self, query: str, retrieved_chunks: list, k: int):
         """
         Returns a generator that yields the response tokens one by one.
+
+        retrieved_chunks are RetrievalResult records (their answers are used as context) or plain strings.
         """
-        # Clean the chunks if necessary
-        clean_chunks = []
-        for chunk in retrieved_chunks:
-            if isinstance(chunk, tuple) or isinstance(chunk, list):
-                clean_chunks.append(chunk[0]) # Extract the string from the tuple/list
-            else:
-                clean_chunks.append(str(chunk)) # Ensure it's a string
+        clean_chunks = [
+            chunk.answer if isinstance(chunk, RetrievalResult) else str(chunk)
+            for chunk in retrieved_chunks
+        ]
 
         if k > 0:
             clean_chunks = clean_chunks[:k]
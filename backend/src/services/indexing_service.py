@@ -1,11 +1,26 @@
+import json
 import os
-from typing import Dict, List, Optional
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import replace
+from typing import Dict, Iterator, List, Optional
 import logging
 
 import numpy as np
 import psycopg
+import psycopg.sql
+from psycopg_pool import ConnectionPool
 from dotenv import load_dotenv
 from config import config
+from utils.embedding.factory import get_embedding_provider
+from utils.metrics import metrics
+from .bulk_import import FaqBatch
+from .chunking import chunk_spans, create_chunker
+from .embedding_storage import EmbeddingStorage
+from .pg_copy import copy_rows
+from .read_router import ReadReplica, ReadRouter
+from .snapshot import read_snapshot, write_snapshot
 
 # load_dotenv()
 
@@ -13,6 +28,16 @@ from config import config
 logger = logging.getLogger(__name__)
 
 
+class EmbeddingDimensionError(ValueError):
+    """Raised when precomputed embeddings do not have the dimension of the active model."""
+
+
+def _vectors(values: List[bytes], dimension: int) -> np.ndarray:
+    """Vectors fetched in pgvector's binary format (int16 dim, int16 unused, >f4 values) as a matrix."""
+    layout = np.dtype([("dim", ">i2"), ("unused", ">i2"), ("values", ">f4", (dimension,))])
+    return np.frombuffer(b"".join(values), dtype=layout)["values"].astype(np.float32)
+
+
 class IndexingService:
     """Service for indexing FAQ documents into the vector database."""
 
@@ -27,22 +52,136 @@ class IndexingService:
                 "password": config.POSTGRES_PASSWORD,
             }
         self.db_config = db_config
-        self.conn: Optional[psycopg.Connection] = None
-        self._ensure_connection()
+        # the pool is created lazily on first use, so constructing the service
+        # (e.g. at app start-up or test collection) never touches the database
+        self.pool: Optional[ConnectionPool] = None
+        self._schema_ready = False
+        # set from the actual table once the schema has been checked
+        self.partitioned = config.FAQ_PARTITIONING
+        # pgvector >= 0.8 can keep scanning the index until enough rows pass a filter
+        self.iterative_scan = False
+        self._lock = threading.Lock()
+        # the model (and dimension) that produced the stored embeddings; taken from
+        # the active row of embedding_models, which can change by a re-embedding
         self.model_name = config.EMBEDDING_MODEL_NAME
+        self.storage = EmbeddingStorage.from_config()
+        self._model_checked_at = 0.0
+        # splits long answers into separately retrieved chunks (None = whole answers)
+        self.chunker = create_chunker()
+        # read replicas for searches and listings (None = everything on the primary)
+        self.read_router = self._create_read_router(config.POSTGRES_REPLICA_HOSTS)
+
+    def _create_read_router(self, hosts: List[str]) -> Optional[ReadRouter]:
+        if not hosts:
+            return None
+        pool_kwargs = {
+            "min_size": config.POSTGRES_POOL_MIN_SIZE,
+            "max_size": config.POSTGRES_POOL_MAX_SIZE,
+            "timeout": config.POSTGRES_POOL_TIMEOUT,
+            "kwargs": {"connect_timeout": 5},
+        }
+        replicas = []
+        for entry in hosts:
+            host, _, port = entry.partition(":")
+            # replicas share database name and credentials with the primary
+            replica_config = {**self.db_config, "host": host, "port": port or self.db_config["port"]}
+            replicas.append(ReadReplica(entry, self.conninfo(replica_config), pool_kwargs))
+        return ReadRouter(replicas, config.POSTGRES_REPLICA_MAX_LAG, config.POSTGRES_REPLICA_CHECK_INTERVAL)
 
     def _ensure_connection(self):
-        """Ensure database connection exists and tables are created."""
-        if self.conn is None:
-            d = self.db_config
-            conn_str = f"host={d['host']} port={d['port']} dbname={d['database']} user={d['user']} password={d['password']}"
-            self.conn = psycopg.connect(conn_str, connect_timeout=5)
-            self._create_tables()
-
-    def _create_tables(self):
+        """Ensure the connection pool exists and tables are created."""
+        if self.pool is not None:
+            return
+        with self._lock:
+            if self.pool is not None:
+                return
+            pool = ConnectionPool(
+                self.conninfo(),
+                min_size=config.POSTGRES_POOL_MIN_SIZE,
+                max_size=config.POSTGRES_POOL_MAX_SIZE,
+                timeout=config.POSTGRES_POOL_TIMEOUT,
+                kwargs={"connect_timeout": 5},
+                name="indexing",
+            )
+            if not self._schema_ready:
+                try:
+                    with pool.connection() as conn:
+                        self._create_tables(conn)
+                except Exception:
+                    pool.close()
+                    raise
+                self._schema_ready = True
+            self.pool = pool
+
+    def conninfo(self, db_config: Optional[Dict] = None) -> str:
+        d = db_config or self.db_config
+        return f"host={d['host']} port={d['port']} dbname={d['database']} user={d['user']} password={d['password']}"
+
+    @contextmanager
+    def connection(self) -> Iterator[psycopg.Connection]:
+        """
+        Borrow a connection from the pool.
+        The transaction is committed on success and rolled back on error.
+        """
+        self._ensure_connection()
+        with self.pool.connection() as conn:
+            yield conn
+
+    @contextmanager
+    def read_connection(self) -> Iterator[psycopg.Connection]:
+        """
+        Borrow a connection for a read-only query: from a read replica that is not
+        lagging behind (see services/read_router.py), otherwise from the primary.
+        """
+        # the schema (and the active model) are always set up through the primary
+        self._ensure_connection()
+        replica = self.read_router.choose() if self.read_router else None
+        conn = None
+        if replica is not None:
+            try:
+                conn = replica.getconn()
+            except Exception as e:
+                replica.mark_unavailable(e)
+        if conn is None:
+            metrics.increment("db.reads.primary")
+            with self.pool.connection() as conn:
+                yield conn
+            return
+
+        metrics.increment("db.reads.replica")
+        try:
+            yield conn
+            conn.commit()
+        except psycopg.OperationalError as e:
+            replica.mark_unavailable(e)
+            raise
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            replica.putconn(conn)
+
+    def reset_after_fork(self):
+        """
+        Drop the pool inherited from the parent process without closing it.
+
+        The pool's sockets and worker threads belong to the parent, so a forked
+        worker must build its own pool (on the next _ensure_connection call).
+        The schema has already been created by the parent and is not re-run.
+        """
+        self.pool = None
+        if self.read_router:
+            self.read_router.reset_after_fork()
+
+    def _create_tables(self, conn: psycopg.Connection):
         """Create necessary tables and indexes if they don't exist."""
-        cur = self.conn.cursor()
+        cur = conn.cursor()
+        # serialize the DDL when several workers start at the same time
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('gen_ai_schema'));")
         cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+        cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        version = tuple(int(part) for part in cur.fetchone()[0].split(".")[:2])
+        self.iterative_scan = version >= (0, 8)
         
         # Documents table - tracks uploaded files
         cur.execute("""
@@ -50,54 +189,263 @@ class IndexingService:
               id SERIAL PRIMARY KEY,
               name TEXT NOT NULL,
               size_bytes INTEGER NOT NULL DEFAULT 0,
+              faq_count INTEGER NOT NULL DEFAULT 0,
               created_at TIMESTAMPTZ DEFAULT now()
             );
         """)
+        # databases created before the FAQ counts were kept on the documents
+        cur.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'documents' AND column_name = 'faq_count'
+        """)
+        backfill_faq_count = cur.fetchone() is None
+        if backfill_faq_count:
+            cur.execute("ALTER TABLE documents ADD COLUMN faq_count INTEGER NOT NULL DEFAULT 0;")
+
+        # Embedding models - exactly one is active (the one the stored embeddings
+        # come from), a re-embedding adds a 'migrating' one (see reembedding_service.py)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_models (
+              name TEXT PRIMARY KEY,
+              dimension INTEGER NOT NULL,
+              status TEXT NOT NULL CHECK (status IN ('active', 'migrating', 'retired')),
+              created_at TIMESTAMPTZ DEFAULT now(),
+              activated_at TIMESTAMPTZ
+            );
+        """)
+        cur.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS embedding_models_active_idx
+            ON embedding_models (status) WHERE status = 'active';
+        """)
+        cur.execute("""
+            INSERT INTO embedding_models (name, dimension, status, activated_at)
+            SELECT %s, %s, 'active', now()
+            WHERE NOT EXISTS (SELECT 1 FROM embedding_models WHERE status = 'active')
+        """, (config.EMBEDDING_MODEL_NAME, config.EMBEDDING_DIMENSION))
+        self._load_active_model(cur)
+        if self.model_name != config.EMBEDDING_MODEL_NAME:
+            logger.warning(f"EMBEDDING_MODEL_NAME is '{config.EMBEDDING_MODEL_NAME}' but the stored embeddings come from "
+                           f"'{self.model_name}', which is used. Run `flask --app app reembed {config.EMBEDDING_MODEL_NAME} "
+                           f"--dimension <dim>` to migrate.")
         
         # FAQs table - with foreign key to documents
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS faqs (
+        # (optionally list-partitioned by document, one partition per uploaded file)
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('faqs')")
+        row = cur.fetchone()
+        if row is None:
+            self.partitioned = config.FAQ_PARTITIONING
+            cur.execute(self._faqs_table_ddl("faqs", self.partitioned))
+        else:
+            self.partitioned = row[0] == "p"
+            if config.FAQ_PARTITIONING and not self.partitioned:
+                logger.warning("FAQ_PARTITIONING is enabled but the existing faqs table is not partitioned. "
+                               "Run `flask --app app migrate-partitions` to convert it.")
+            # tables created before the model was recorded per row (constant
+            # default: existing rows are not rewritten)
+            cur.execute("""
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'faqs' AND column_name = 'embedding_model'
+            """)
+            if cur.fetchone() is None:
+                cur.execute(psycopg.sql.SQL("ALTER TABLE faqs ADD COLUMN embedding_model TEXT NOT NULL DEFAULT {}")
+                            .format(psycopg.sql.Literal(self.model_name)))
+                cur.execute("ALTER TABLE faqs ALTER COLUMN embedding_model DROP DEFAULT")
+        self._create_faq_indexes(cur, "faqs")
+
+        # Answer chunks - character spans of the answers (see services/chunking.py),
+        # removed together with their document. Rows are added while documents are
+        # uploaded, so the vector index has to be built incrementally (HNSW).
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS faq_chunks (
+              id SERIAL PRIMARY KEY,
+              document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+              faq_id INTEGER NOT NULL,
+              chunk_index INTEGER NOT NULL,
+              start_char INTEGER NOT NULL,
+              end_char INTEGER NOT NULL,
+              embedding vector({self.storage.dimension}) NOT NULL,
+              embedding_model TEXT NOT NULL,
+              UNIQUE (faq_id, chunk_index)
+            );
+        """)
+        for statement in self.storage.drop_statements("faq_chunks_emb_idx"):
+            cur.execute(statement)
+        for statement in self.storage.index_statements("faq_chunks", "embedding", "faq_chunks_emb_idx",
+                                                       incremental=True):
+            cur.execute(statement)
+        cur.execute("CREATE INDEX IF NOT EXISTS faq_chunks_document_id_idx ON faq_chunks (document_id);")
+        if backfill_faq_count:
+            # one-time count, afterwards faq_count is maintained on insert
+            cur.execute("""
+                UPDATE documents d
+                SET faq_count = c.n
+                FROM (SELECT document_id, COUNT(*) AS n FROM faqs GROUP BY document_id) c
+                WHERE c.document_id = d.id
+            """)
+        conn.commit()
+
+    def _load_active_model(self, cur: psycopg.Cursor):
+        cur.execute("SELECT name, dimension FROM embedding_models WHERE status = 'active'")
+        name, dimension = cur.fetchone()
+        if name != self.model_name or dimension != self.storage.dimension:
+            logger.info(f"Using embedding model '{name}' ({dimension} dimensions)")
+        self.model_name = name
+        self.storage = replace(self.storage, dimension=dimension)
+        self._model_checked_at = time.monotonic()
+
+    def refresh_embedding_model(self, force: bool = False):
+        """
+        Re-read the active embedding model (at most every EMBEDDING_MODEL_CHECK_INTERVAL
+        seconds), so every process switches to the new model after a re-embedding.
+        """
+        if not force and time.monotonic() - self._model_checked_at < config.EMBEDDING_MODEL_CHECK_INTERVAL:
+            return
+        with self.connection() as conn:
+            self._load_active_model(conn.cursor())
+
+    def _faqs_table_ddl(self, table: str, partitioned: bool) -> str:
+        if partitioned:
+            # the partition key has to be part of the primary key
+            return """
+                CREATE TABLE IF NOT EXISTS {table} (
+                  id SERIAL,
+                  document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+                  question_text TEXT NOT NULL,
+                  answer_text TEXT NOT NULL,
+                  question_embedding vector({dim}) NOT NULL,
+                  answer_embedding vector({dim}) NOT NULL,
+                  embedding_model TEXT NOT NULL,
+                  created_at TIMESTAMPTZ DEFAULT now(),
+                  PRIMARY KEY (document_id, id)
+                ) PARTITION BY LIST (document_id);
+            """.format(table=table, dim=self.storage.dimension)
+        return """
+            CREATE TABLE IF NOT EXISTS {table} (
               id SERIAL PRIMARY KEY,
               document_id INTEGER REFERENCES documents(id) ON DELETE CASCADE,
               question_text TEXT NOT NULL,
               answer_text TEXT NOT NULL,
-              question_embedding vector(384) NOT NULL,
-              answer_embedding vector(384) NOT NULL,
+              question_embedding vector({dim}) NOT NULL,
+              answer_embedding vector({dim}) NOT NULL,
+              embedding_model TEXT NOT NULL,
               created_at TIMESTAMPTZ DEFAULT now()
             );
-        """)
-        cur.execute("""
-            CREATE INDEX IF NOT EXISTS faqs_qemb_idx 
-            ON faqs USING ivfflat (question_embedding vector_cosine_ops) 
-            WITH (lists = 100);
-        """)
-        cur.execute("""
-            CREATE INDEX IF NOT EXISTS faqs_aemb_idx 
-            ON faqs USING ivfflat (answer_embedding vector_cosine_ops) 
-            WITH (lists = 100);
-        """)
+        """.format(table=table, dim=self.storage.dimension)
+
+    def _create_faq_indexes(self, cur: psycopg.Cursor, table: str):
+        # Vector indexes depending on the storage mode (float / halfvec / binary).
+        # On a partitioned table they are created per partition automatically.
+        for column, index_name in (("question_embedding", f"{table}_qemb_idx"), ("answer_embedding", f"{table}_aemb_idx")):
+            # indexes of a previous EMBEDDING_STORAGE mode are no longer used
+            for statement in self.storage.drop_statements(index_name):
+                cur.execute(statement)
+            for statement in self.storage.index_statements(table, column, index_name, incremental=self.partitioned):
+                cur.execute(statement)
+        if not self.partitioned:
+            # partitions are pruned by document_id, no extra index needed there
+            cur.execute(f"""
+                CREATE INDEX IF NOT EXISTS {table}_document_id_idx 
+                ON {table} (document_id);
+            """)
+        else:
+            # the primary key (document_id, id) cannot serve ORDER BY id across documents;
+            # batches paged by id (re-embedding, evaluation) merge these per-partition indexes
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_id_idx ON {table} (id);")
+
+    @staticmethod
+    def _partition_name(document_id: int) -> str:
+        return f"faqs_doc_{int(document_id)}"
+
+    def _create_document(self, cur: psycopg.Cursor, filename: str, file_size: int, faq_count: int) -> int:
+        """Insert the document row (and its faqs partition) and return its id."""
         cur.execute("""
-            CREATE INDEX IF NOT EXISTS faqs_document_id_idx 
-            ON faqs (document_id);
-        """)
-        self.conn.commit()
+            INSERT INTO documents (name, size_bytes, faq_count)
+            VALUES (%s, %s, %s)
+            RETURNING id
+        """, (filename, file_size, faq_count))
+        document_id = cur.fetchone()[0]
+        if self.partitioned:
+            # partition indexes are inherited from the parent table
+            cur.execute(f"""
+                CREATE TABLE {self._partition_name(document_id)}
+                PARTITION OF faqs FOR VALUES IN ({int(document_id)})
+            """)
+        return document_id
+
+    def _drop_document_partitions(self, cur: psycopg.Cursor, document_id: Optional[int] = None):
+        """Drop the faqs partition of one document (or of all documents)."""
+        if document_id is not None:
+            cur.execute(f"DROP TABLE IF EXISTS {self._partition_name(document_id)}")
+            return
+        cur.execute("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = 'faqs'::regclass")
+        for (partition,) in cur.fetchall():
+            cur.execute(f"DROP TABLE IF EXISTS {partition}")
+
+    def migrate_to_partitioned(self) -> Dict[str, any]:
+        """
+        Convert an existing (regular) faqs table into a table partitioned by document.
+        Rows are copied document by document, the old table is dropped afterwards.
+        """
+        with self.connection() as conn:
+            cur = conn.cursor()
+            if self.partitioned:
+                return {"status": "success", "message": "faqs table is already partitioned"}
+
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('gen_ai_schema'));")
+            cur.execute("ALTER TABLE faqs RENAME TO faqs_unpartitioned")
+            # free the index names for the new table
+            cur.execute("""
+                SELECT indexname FROM pg_indexes
+                WHERE tablename = 'faqs_unpartitioned' AND indexname <> 'faqs_pkey'
+            """)
+            for (index,) in cur.fetchall():
+                cur.execute(f"DROP INDEX IF EXISTS {index}")
+            cur.execute("ALTER INDEX IF EXISTS faqs_pkey RENAME TO faqs_unpartitioned_pkey")
+
+            self.partitioned = True
+            try:
+                cur.execute(self._faqs_table_ddl("faqs", partitioned=True))
+                self._create_faq_indexes(cur, "faqs")
+            except Exception:
+                self.partitioned = False
+                raise
 
-    def _texts_to_embeddings(self, texts: List[str], model_name: str = "all-MiniLM-L6-v2") -> np.ndarray:
-        """Convert texts to embeddings using SentenceTransformer."""
-        self.model_name = model_name
+            cur.execute("SELECT id FROM documents ORDER BY id")
+            document_ids = [row[0] for row in cur.fetchall()]
+            for document_id in document_ids:
+                cur.execute(f"""
+                    CREATE TABLE {self._partition_name(document_id)}
+                    PARTITION OF faqs FOR VALUES IN ({int(document_id)})
+                """)
+            # orphaned FAQs (without document) cannot be partitioned and are dropped
+            cur.execute("""
+                INSERT INTO faqs (id, document_id, question_text, answer_text,
+                                  question_embedding, answer_embedding, embedding_model, created_at)
+                SELECT id, document_id, question_text, answer_text,
+                       question_embedding, answer_embedding, embedding_model, created_at
+                FROM faqs_unpartitioned
+                WHERE document_id IS NOT NULL
+            """)
+            moved = cur.rowcount
+            cur.execute("SELECT setval(pg_get_serial_sequence('faqs', 'id'), COALESCE(MAX(id), 1)) FROM faqs")
+            cur.execute("DROP TABLE faqs_unpartitioned")
+            conn.commit()
+
+        return {
+            "status": "success",
+            "message": f"Moved {moved} FAQ(s) into {len(document_ids)} document partition(s)"
+        }
+
+    def _texts_to_embeddings(self, texts: List[str], model_name: Optional[str] = None) -> np.ndarray:
+        """Convert texts to embeddings using the shared embedding provider."""
+        model_name = model_name or self.model_name
         try:
-            from sentence_transformers import SentenceTransformer
-            model = SentenceTransformer(model_name)
-            embs = model.encode(
-                texts,
-                convert_to_numpy=True,
-                show_progress_bar=False
-            ).astype(np.float32)
+            embs = get_embedding_provider(model_name).encode(texts)
         except Exception as e:
             logger.error(f"Could not load SentenceTransformer model. Using random embeddings. Error: {e}")
             # Fallback: deterministic random vectors
             rng = np.random.RandomState(42)
-            dim = 384
+            dim = self.storage.dimension
             embs = rng.randn(len(texts), dim).astype(np.float32)
             norms = np.linalg.norm(embs, axis=1, keepdims=True)
             norms[norms == 0] = 1.0
@@ -121,82 +469,313 @@ class IndexingService:
         Returns:
             Dict with status and count of indexed FAQs
         """
-        self._ensure_connection()
-
         if not faq_entries: 
             return {"status": "success", "indexed_count": 0, "message": "Keine FAQs zum Indizieren"}
 
-        # Flatten all FAQs from all documents
-        try:
-            cur = self.conn.cursor()
-            
-            # 1. create document entry
+        document_id = self._insert_faqs(
+            filename,
+            file_size,
+            [f["question"] for f in faq_entries],
+            [f["answer"] for f in faq_entries]
+        )
+
+        return {
+            "status": "success",
+            "indexed_count": len(faq_entries),
+            "document_id": document_id,
+            "message": f"Erfolgreich {len(faq_entries)} FAQs aus '{filename}' indiziert"
+        }
+
+    def _insert_faqs(self, filename: str, file_size: int, questions: List[str], answers: List[str],
+                     question_embeddings: Optional[np.ndarray] = None,
+                     answer_embeddings: Optional[np.ndarray] = None,
+                     embedding_model: Optional[str] = None,
+                     chunks: Optional[Dict[str, any]] = None) -> int:
+        """
+        Embed the FAQs of a new document and insert them, returns the document id.
+
+        The embeddings must come from the active model. Reading it FOR SHARE keeps a
+        re-embedding from switching models before this transaction commits; if the
+        model changed since the embeddings were computed they are computed again.
+        Precomputed embeddings are used if they come from the active model (without
+        a model name they are assumed to) and have its dimension. So are precomputed
+        chunks (see export_snapshot), otherwise the answers are chunked here.
+        """
+        for _ in range(2):
+            model_name = self.model_name
+            precomputed = (question_embeddings is not None and answer_embeddings is not None
+                           and embedding_model in (None, model_name))
+            if precomputed:
+                for embs in (question_embeddings, answer_embeddings):
+                    if embs.shape != (len(questions), self.storage.dimension):
+                        raise EmbeddingDimensionError(f"Precomputed embeddings must have {self.storage.dimension} "
+                                                      f"dimensions (model '{model_name}'), got {embs.shape[-1]}")
+                q_embs, a_embs = question_embeddings, answer_embeddings
+            else:
+                if question_embeddings is not None:
+                    logger.info(f"Ignoring precomputed embeddings of '{embedding_model}', the active model is "
+                                f"'{model_name}'")
+                # compute embeddings (before borrowing a pooled connection)
+                q_embs = self._texts_to_embeddings(questions, model_name)
+                a_embs = self._texts_to_embeddings(answers, model_name)
+
+            with self.connection() as conn:
+                cur = conn.cursor()
+                cur.execute("SELECT name, dimension FROM embedding_models WHERE status = 'active' FOR SHARE")
+                if cur.fetchone()[0] != model_name:
+                    conn.rollback()
+                    self.refresh_embedding_model(force=True)
+                    continue
+
+                document_id = self._create_document(cur, filename, file_size, len(questions))
+
+                # ids are taken up front, so the rows can be written with one binary
+                # COPY (embeddings go in as raw float32 buffers) and chunks refer to them
+                cur.execute("SELECT nextval(pg_get_serial_sequence('faqs', 'id')) FROM generate_series(1, %s)",
+                            (len(questions),))
+                faq_ids = [row[0] for row in cur.fetchall()]
+                copy_rows(
+                    cur, "faqs",
+                    ["id", "document_id", "question_text", "answer_text",
+                     "question_embedding", "answer_embedding", "embedding_model"],
+                    ["int4", "int4", "text", "text", "vector", "vector", "text"],
+                    [faq_ids, [document_id] * len(questions), questions, answers,
+                     q_embs, a_embs, [model_name] * len(questions)],
+                    len(questions),
+                )
+                if self.chunker is not None and precomputed and chunks is not None:
+                    count = len(chunks["faq"])
+                    copy_rows(
+                        cur, "faq_chunks",
+                        ["document_id", "faq_id", "chunk_index", "start_char", "end_char",
+                         "embedding", "embedding_model"],
+                        ["int4", "int4", "int4", "int4", "int4", "vector", "text"],
+                        [[document_id] * count, [faq_ids[i] for i in chunks["faq"]], chunks["chunk_index"],
+                         chunks["start"], chunks["end"], chunks["embeddings"], [model_name] * count],
+                        count,
+                    )
+                elif self.chunker is not None:
+                    self._insert_chunks(cur, document_id, list(zip(faq_ids, answers, a_embs)), model_name)
+                conn.commit()
+                return document_id
+
+        raise RuntimeError("The embedding model changed while indexing, please retry")
+
+    def index_batch(self, filename: str, file_size: int, batch: FaqBatch) -> Dict[str, any]:
+        """
+        Index the FAQs of an uploaded file of any format (see services/bulk_import.py),
+        with their precomputed embeddings if the file has them.
+        """
+        if not len(batch):
+            return {"status": "success", "indexed_count": 0, "message": "Keine FAQs zum Indizieren"}
+
+        document_id = self._insert_faqs(
+            filename,
+            file_size,
+            batch.questions,
+            batch.answers,
+            batch.question_embeddings,
+            batch.answer_embeddings,
+            batch.embedding_model,
+        )
+        return {
+            "status": "success",
+            "indexed_count": len(batch),
+            "document_id": document_id,
+            "message": f"Erfolgreich {len(batch)} FAQs aus '{filename}' indiziert"
+        }
+
+    def _insert_chunks(self, cur: psycopg.Cursor, document_id: int, faqs: List[tuple], model_name: str) -> int:
+        """
+        Chunk the answers of (faq_id, answer, answer_embedding) and insert the chunks.
+        An answer that stays in one piece reuses its answer embedding.
+        """
+        rows, texts, whole_rows = [], [], []
+        for faq_id, answer, answer_emb in faqs:
+            spans = chunk_spans(self.chunker, answer)
+            for index, (start, end) in enumerate(spans):
+                whole = len(spans) == 1 and not answer[:start].strip() and not answer[end:].strip()
+                whole_rows.append(answer_emb if whole else None)
+                rows.append((faq_id, index, start, end))
+                if not whole:
+                    texts.append(answer[start:end])
+
+        if not rows:
+            return 0
+
+        computed = iter(self._texts_to_embeddings(texts, model_name) if texts else [])
+        embs = np.array([next(computed) if emb is None else emb for emb in whole_rows], dtype=np.float32)
+        columns = list(zip(*rows))
+        return copy_rows(
+            cur, "faq_chunks",
+            ["document_id", "faq_id", "chunk_index", "start_char", "end_char", "embedding", "embedding_model"],
+            ["int4", "int4", "int4", "int4", "int4", "vector", "text"],
+            [[document_id] * len(rows), *columns, embs, [model_name] * len(rows)],
+            len(rows),
+        )
+
+    def rechunk_documents(self) -> Dict[str, any]:
+        """
+        Replace the chunks of all documents by the ones of the current ANSWER_CHUNKING
+        strategy (one transaction per document). With 'none' the chunks are removed.
+        """
+        with self.connection() as conn:
+            cur = conn.cursor()
+            if self.chunker is None:
+                cur.execute("TRUNCATE faq_chunks")
+                conn.commit()
+                return {"status": "success", "message": "Removed all answer chunks (ANSWER_CHUNKING=none)"}
+            cur.execute("SELECT id FROM documents ORDER BY id")
+            document_ids = [row[0] for row in cur.fetchall()]
+
+        total = 0
+        for document_id in document_ids:
+            self.refresh_embedding_model()
+            with self.connection() as conn:
+                cur = conn.cursor()
+                # the active model can only change after this transaction (see _insert_faqs)
+                cur.execute("SELECT name FROM embedding_models WHERE status = 'active' FOR SHARE")
+                model_name = cur.fetchone()[0]
+                cur.execute("SELECT id, answer_text, answer_embedding::text FROM faqs WHERE document_id = %s",
+                            (document_id,))
+                faqs = [(faq_id, answer, np.array(json.loads(emb), dtype=np.float32))
+                        for faq_id, answer, emb in cur.fetchall()]
+                cur.execute("DELETE FROM faq_chunks WHERE document_id = %s", (document_id,))
+                total += self._insert_chunks(cur, document_id, faqs, model_name)
+                conn.commit()
+
+        return {
+            "status": "success",
+            "message": f"Created {total} chunk(s) for {len(document_ids)} document(s)"
+        }
+
+    def export_snapshot(self, document_id: int, path: str) -> Dict[str, any]:
+        """
+        Write a document's FAQs, chunks and embeddings to a snapshot (see services/snapshot.py).
+        """
+        with self.read_connection() as conn:
+            # one consistent view of the document, its FAQs and chunks
+            conn.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cur = conn.cursor(binary=True)
+            cur.execute("SELECT name, size_bytes FROM documents WHERE id = %s", (int(document_id),))
+            document = cur.fetchone()
+            if document is None:
+                return {"status": "error", "message": f"Document with id {document_id} not found"}
+            cur.execute("SELECT name, dimension FROM embedding_models WHERE status = 'active'")
+            model_name, dimension = cur.fetchone()
             cur.execute("""
-                INSERT INTO documents (name, size_bytes)
-                VALUES (%s, %s)
-                RETURNING id
-            """, (filename, file_size))
-            document_id = cur.fetchone()[0]
-
-            # 2. compute embeddings    
-            q_texts = [f["question"] for f in faq_entries]
-            a_texts = [f["answer"] for f in faq_entries]
-
-            q_embs = self._texts_to_embeddings(q_texts)
-            a_embs = self._texts_to_embeddings(a_texts)
-
-            # 3. insert FAQs with document_id
-            insert_data = [
-                (document_id, faq["question"], faq["answer"], q_emb.tolist(), a_emb.tolist())
-                for faq, q_emb, a_emb in zip(faq_entries, q_embs, a_embs)
-            ]
-            
-            cur.executemany("""
-                INSERT INTO faqs (document_id, question_text, answer_text, question_embedding, answer_embedding)
-                VALUES (%s, %s, %s, %s, %s)
-            """, insert_data)
-
-            self.conn.commit()
-
-            return {
-                "status": "success",
-                "indexed_count": len(faq_entries),
-                "document_id": document_id,
-                "message": f"Erfolgreich {len(faq_entries)} FAQs aus '{filename}' indiziert"
+                SELECT id, question_text, answer_text, question_embedding, answer_embedding
+                FROM faqs WHERE document_id = %s ORDER BY id
+            """, (int(document_id),))
+            faqs = cur.fetchall()
+            cur.execute("""
+                SELECT faq_id, chunk_index, start_char, end_char, embedding
+                FROM faq_chunks WHERE document_id = %s ORDER BY faq_id, chunk_index
+            """, (int(document_id),))
+            chunks = cur.fetchall()
+
+        faq_ids, questions, answers, q_embs, a_embs = (list(c) for c in zip(*faqs)) if faqs else ([],) * 5
+        positions = {faq_id: i for i, faq_id in enumerate(faq_ids)}
+        parts = {"questions": _vectors(q_embs, dimension), "answers": _vectors(a_embs, dimension)}
+        chunk_metadata = None
+        if chunks:
+            faq_col, index_col, start_col, end_col, embs = zip(*chunks)
+            parts["chunks"] = _vectors(embs, dimension)
+            chunk_metadata = {
+                # chunks are only reused by an import with the same chunker settings
+                "chunker": repr(self.chunker),
+                "faq": [positions[f] for f in faq_col],
+                "chunk_index": list(index_col),
+                "start": list(start_col),
+                "end": list(end_col),
             }
-            
-        except Exception as e:
-            if self.conn:
-                self.conn.rollback()
-            raise e
+
+        sidecar = write_snapshot(path, {
+            "embedding_model": model_name,
+            "dimension": dimension,
+            "document": {"name": document[0], "size_bytes": document[1]},
+            "faqs": {"question": questions, "answer": answers},
+            "chunks": chunk_metadata,
+        }, parts)
+        return {
+            "status": "success",
+            "message": f"Exported {len(faqs)} FAQ(s) and {len(chunks)} chunk(s) of '{document[0]}' to {sidecar}",
+            "path": sidecar,
+        }
+
+    def import_snapshot(self, path: str, verify: bool = False) -> Dict[str, any]:
+        """
+        Index a snapshot as a new document. Its embeddings are inserted as they are if
+        they come from the active model (otherwise they are computed again), its chunks
+        if they were made with the current chunker settings.
+        """
+        snapshot = read_snapshot(path, verify=verify)
+        metadata = snapshot.metadata
+        faqs = metadata["faqs"]
+        if not faqs["question"]:
+            return {"status": "success", "indexed_count": 0, "message": "No FAQs to import"}
+
+        chunks = metadata.get("chunks")
+        if chunks is not None and chunks.get("chunker") == repr(self.chunker):
+            chunks = {**chunks, "embeddings": snapshot.rows("chunks")}
+        else:
+            chunks = None
+        document_id = self._insert_faqs(
+            metadata["document"]["name"],
+            metadata["document"]["size_bytes"],
+            faqs["question"],
+            faqs["answer"],
+            snapshot.rows("questions"),
+            snapshot.rows("answers"),
+            metadata["embedding_model"],
+            chunks,
+        )
+        return {
+            "status": "success",
+            "indexed_count": len(faqs["question"]),
+            "document_id": document_id,
+            "message": f"Imported {len(faqs['question'])} FAQs of '{metadata['document']['name']}' "
+                       f"as document {document_id}"
+        }
 
     def get_stats(self) -> Dict[str, any]:
-        """Get database statistics."""
-        self._ensure_connection()
-        cur = self.conn.cursor()
-        cur.execute("SELECT COUNT(*) FROM faqs")
-        total = cur.fetchone()[0]
-        return {"total_faqs": total}
+        """Get database statistics (from the per-document counts, no scan of faqs)."""
+        with self.read_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT COUNT(*), COALESCE(SUM(faq_count), 0) FROM documents")
+            doc_count, total = cur.fetchone()
+        return {"total_documents": doc_count, "total_faqs": int(total)}
 
-    def get_all_documents(self) -> List[Dict]:
+    def get_all_documents(self, limit: Optional[int] = None, cursor: Optional[str] = None) -> Dict[str, any]:
         """
-        Get all uploaded documents (files) from the database.
-        
+        Get uploaded documents (files), newest first, one page at a time.
+
+        Args:
+            limit: Page size (default DOCUMENTS_PAGE_SIZE)
+            cursor: nextCursor of the previous page (None = first page)
+
         Returns:
-            List of documents with id, name, uploadedAt, and size
+            Dict with the documents (id, name, uploadedAt, size, faqCount) and the
+            nextCursor (None on the last page)
         """
-        self._ensure_connection()
-        cur = self.conn.cursor()
-        cur.execute("""
-            SELECT id, name, size_bytes, created_at 
-            FROM documents 
-            ORDER BY created_at DESC
-        """)
-        rows = cur.fetchall()
-        
+        limit = max(1, min(int(limit or config.DOCUMENTS_PAGE_SIZE), config.DOCUMENTS_MAX_PAGE_SIZE))
+        with self.read_connection() as conn:
+            cur = conn.cursor()
+            # keyset pagination on the primary key, ids grow with the upload time
+            cur.execute("""
+                SELECT id, name, size_bytes, faq_count, created_at
+                FROM documents
+                WHERE %(cursor)s::int IS NULL OR id < %(cursor)s::int
+                ORDER BY id DESC
+                LIMIT %(limit)s
+            """, {"cursor": int(cursor) if cursor else None, "limit": limit + 1})
+            rows = cur.fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         documents = []
         for row in rows:
-            doc_id, name, size_bytes, created_at = row
+            doc_id, name, size_bytes, faq_count, created_at = row
             # Format size
             if size_bytes < 1024:
                 size_str = f"{size_bytes} B"
@@ -207,10 +786,14 @@ class IndexingService:
                 "id": str(doc_id),
                 "name": name,
                 "uploadedAt": created_at.isoformat() if created_at else "",
-                "size": size_str
+                "size": size_str,
+                "faqCount": faq_count
             })
         
-        return documents
+        return {
+            "documents": documents,
+            "nextCursor": str(rows[-1][0]) if has_more else None
+        }
 
     def delete_document(self, doc_id: str) -> Dict[str, any]:
         """
@@ -222,28 +805,23 @@ class IndexingService:
         Returns:
             Dict with status and message
         """
-        self._ensure_connection()
-        cur = self.conn.cursor()
-        
-        # Check if document exists
-        cur.execute("SELECT id, name FROM documents WHERE id = %s", (int(doc_id),))
-        doc = cur.fetchone()
-        if doc is None:
-            return {
-                "status": "error",
-                "message": f"Document with id {doc_id} not found"
-            }
-        
-        doc_name = doc[1]
-        
-        # Count FAQs that will be deleted
-        cur.execute("SELECT COUNT(*) FROM faqs WHERE document_id = %s", (int(doc_id),))
-        faq_count = cur.fetchone()[0]
-        
-        # Delete the document (FAQs will be cascade deleted)
-        cur.execute("DELETE FROM documents WHERE id = %s", (int(doc_id),))
-        self.conn.commit()
+        with self.connection() as conn:
+            cur = conn.cursor()
+            
+            # Delete the document (FAQs will be cascade deleted, a partition is simply dropped)
+            if self.partitioned:
+                self._drop_document_partitions(cur, int(doc_id))
+            cur.execute("DELETE FROM documents WHERE id = %s RETURNING name, faq_count", (int(doc_id),))
+            doc = cur.fetchone()
+            if doc is None:
+                conn.rollback()
+                return {
+                    "status": "error",
+                    "message": f"Document with id {doc_id} not found"
+                }
+            conn.commit()
         
+        doc_name, faq_count = doc
         return {
             "status": "success",
             "message": f"Document '{doc_name}' with {faq_count} FAQ(s) deleted successfully",
@@ -257,26 +835,25 @@ class IndexingService:
         Returns:
             Dict with status and count of deleted documents
         """
-        self._ensure_connection()
-        cur = self.conn.cursor()
-        
-        # Get counts before deletion
-        cur.execute("SELECT COUNT(*) FROM documents")
-        doc_count = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM faqs")
-        faq_count = cur.fetchone()[0]
-        
-        # Delete all (FAQs will cascade)
-        cur.execute("DELETE FROM documents")
-        # Also delete any orphaned FAQs (from old schema)
-        cur.execute("DELETE FROM faqs")
-        self.conn.commit()
+        with self.connection() as conn:
+            cur = conn.cursor()
+            
+            # Get counts before deletion (from the documents only)
+            cur.execute("SELECT COUNT(*), COALESCE(SUM(faq_count), 0) FROM documents")
+            doc_count, faq_count = cur.fetchone()
+            
+            if self.partitioned:
+                self._drop_document_partitions(cur)
+            # TRUNCATE instead of DELETE: no row-by-row delete of the FAQs
+            # (also removes orphaned FAQs from the old schema)
+            cur.execute("TRUNCATE faqs, faq_chunks, documents")
+            conn.commit()
         
         return {
             "status": "success",
             "message": f"Deleted {doc_count} document(s) with {faq_count} FAQ(s) from database",
             "deleted_documents": doc_count,
-            "deleted_faqs": faq_count
+            "deleted_faqs": int(faq_count)
         }
 
     def index_from_csv(self, csv_content: str, filename: str = "uploaded.csv") -> Dict[str, any]:
@@ -297,8 +874,6 @@ class IndexingService:
         import csv
         import io
         
-        self._ensure_connection()
-        
         # Parse CSV
         reader = csv.DictReader(io.StringIO(csv_content))
         all_faqs = []
@@ -314,33 +889,12 @@ class IndexingService:
         # Calculate file size
         size_bytes = len(csv_content.encode('utf-8'))
         
-        # Create document entry
-        cur = self.conn.cursor()
-        cur.execute("""
-            INSERT INTO documents (name, size_bytes)
-            VALUES (%s, %s)
-            RETURNING id
-        """, (filename, size_bytes))
-        document_id = cur.fetchone()[0]
-        
-        # Compute embeddings
-        q_texts = [f["question_text"] for f in all_faqs]
-        a_texts = [f["answer_text"] for f in all_faqs]
-        
-        q_embs = self._texts_to_embeddings(q_texts)
-        a_embs = self._texts_to_embeddings(a_texts)
-        
-        # Insert FAQs with document_id using executemany for better performance
-        insert_data = [
-            (document_id, faq["question_text"], faq["answer_text"], q_emb.tolist(), a_emb.tolist())
-            for faq, q_emb, a_emb in zip(all_faqs, q_embs, a_embs)
-        ]
-        cur.executemany("""
-            INSERT INTO faqs (document_id, question_text, answer_text, question_embedding, answer_embedding)
-            VALUES (%s, %s, %s, %s, %s)
-        """, insert_data)
-        
-        self.conn.commit()
+        document_id = self._insert_faqs(
+            filename,
+            size_bytes,
+            [f["question_text"] for f in all_faqs],
+            [f["answer_text"] for f in all_faqs]
+        )
         
         return {
             "status": "success",
@@ -350,10 +904,12 @@ class IndexingService:
         }
 
     def close(self):
-        """Close database connection."""
-        if self.conn:
-            self.conn.close()
-            self.conn = None
+        """Close the connection pools."""
+        if self.pool:
+            self.pool.close()
+            self.pool = None
+        if self.read_router:
+            self.read_router.close()
 
     def __enter__(self):
         """Context manager entry."""
@@ -361,4 +917,4 @@ class IndexingService:
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Context manager exit."""
-        self.close()
\ No newline at end of file
+        self.close()
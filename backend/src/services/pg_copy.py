@@ -0,0 +1,69 @@
+"""
+Bulk inserts with COPY ... FROM STDIN (FORMAT BINARY).
+
+The rows are encoded directly in PostgreSQL's binary COPY format, so embedding
+matrices go into the stream as raw float32 bytes (pgvector's binary format:
+int16 dimension, int16 unused, big-endian float32 values) instead of being
+converted to Python lists and vector literals row by row.
+
+Column types: "int4", "text" and "vector" (a 2D float array, one row per tuple).
+
+Based on https://www.postgresql.org/docs/current/sql-copy.html#id-1.9.3.55.9.4
+and https://github.com/pgvector/pgvector-python (vector binary format)
+"""
+import struct
+from typing import Sequence
+
+import numpy as np
+import psycopg
+
+_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_TRAILER = struct.pack(">h", -1)
+_NULL = struct.pack(">i", -1)
+_INT4 = struct.Struct(">ii")
+_LENGTH = struct.Struct(">i")
+
+# rows per write to the COPY stream (bounds the size of the encoded buffer)
+BATCH_ROWS = 1000
+
+
+def _column_encoder(kind: str, values):
+    if kind == "int4":
+        return lambda i: _NULL if values[i] is None else _INT4.pack(4, int(values[i]))
+    if kind == "text":
+        def encode_text(i):
+            if values[i] is None:
+                return _NULL
+            data = values[i].encode("utf-8")
+            return _LENGTH.pack(len(data)) + data
+        return encode_text
+    if kind == "vector":
+        # one conversion of the whole matrix, the rows are byte slices of it
+        matrix = np.ascontiguousarray(values, dtype=">f4")
+        dim = matrix.shape[1]
+        prefix = struct.pack(">ihh", 4 + 4 * dim, dim, 0)
+        return lambda i: prefix + matrix[i].tobytes()
+    raise ValueError(f"Unsupported column type '{kind}'")
+
+
+def copy_rows(cur: psycopg.Cursor, table: str, columns: Sequence[str], types: Sequence[str],
+              values: Sequence, count: int) -> int:
+    """
+    Insert `count` rows with a binary COPY.
+
+    values holds one sequence per column (a list, or a numpy matrix for vectors).
+    Returns the number of inserted rows.
+    """
+    encoders = [_column_encoder(kind, column) for kind, column in zip(types, values)]
+    field_count = struct.pack(">h", len(columns))
+    with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN (FORMAT BINARY)") as copy:
+        copy.write(_HEADER)
+        for start in range(0, count, BATCH_ROWS):
+            buffer = bytearray()
+            for i in range(start, min(start + BATCH_ROWS, count)):
+                buffer += field_count
+                for encode in encoders:
+                    buffer += encode(i)
+            copy.write(buffer)
+        copy.write(_TRAILER)
+    return count
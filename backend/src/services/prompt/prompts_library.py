@@ -24,6 +24,11 @@ class RAGPrompts:
         "Context: <context></context>\n"
         "ANSWER: I am a helpful assistant focused on providing information related to our system. How can I assist you today?"
     )
+    # returned without an LLM call when no FAQ passes the retrieval similarity cutoff
+    NO_CONTEXT_ANSWER = (
+        "Unfortunately, I can't help you with that. I am a helpful assistant with a main focus on "
+        "answering questions related to this system. I'm happy to help you with any question about our system!"
+    )
     USER_PROMPT_TEMPLATE = (
         "CONTEXT: \n"
         "<context>\n"
@@ -32,6 +37,31 @@ class RAGPrompts:
         "USER QUERY: \n{query_str} \n"
         "ANSWER: ")
 
+    # Static part of the query rewriting prompt. It is sent as the system prompt so that
+    # it is byte-identical on every call and its evaluation can be cached by ollama.
+    SYSTEM_PROMPT_QUERY_REWRITING = (
+        "You are a query rewriting component in a customer-support RAG system. "
+        "Your task is to rewrite user input into a concise, standalone, "
+        "FAQ-style search query suitable for retrieving help-center articles. "
+        "Do NOT answer the question.\n\n"
+        "Rewrite the user input into a concise, standalone FAQ-style search query.\n\n"
+        "Guidelines:\n"
+        "- Assume the user is a customer asking for help\n"
+        "- Resolve references using the conversation context\n"
+        "- Preserve the user's underlying problem or intent\n"
+        "- Remove politeness, filler, and emotional language\n"
+        "- Use neutral FAQ wording (e.g. \"How do I...\", \"What is...\", \"Why does...\")\n"
+        "- Do NOT include answers or explanations\n"
+        "- Output ONLY the rewritten query"
+    )
+    USER_PROMPT_QUERY_REWRITING_TEMPLATE = (
+        "Conversation history:\n"
+        "{history_str}\n\n"
+        "User query:\n"
+        "{query_str}\n\n"
+        "Rewritten query:"
+    )
+
     @staticmethod
     def format_main_prompt(query: str, context_chunks: list[str]) -> str:
         """
@@ -1,15 +1,20 @@
 from typing import Dict, List, Optional
-import os
 
-from utils.llm.ollama_provider import OllamaProvider
+from utils.llm.factory import create_llm_provider
+from .prompt.prompts_library import RAGPrompts
+from config import config
 
 
 class QueryRewritingService:
     def __init__(self):
-        ollama_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-        self.llm = OllamaProvider(
-            model_name="llama3",
-            base_url=ollama_url
+        self.llm = create_llm_provider(
+            model_name=config.LLM_REWRITE_MODEL,
+            # the rewritten query is short, no need to allow long generations
+            options={
+                "num_ctx": config.LLM_REWRITE_NUM_CTX,
+                "num_predict": config.LLM_REWRITE_NUM_PREDICT,
+            },
+            lane="rewrite",
         )
 
     def rewrite_query(
@@ -21,12 +26,7 @@ class QueryRewritingService:
         prompt = self._build_prompt(query, chat_history)
 
         rewritten = self.llm.generate(
-            system_prompt=(
-                "You are a query rewriting component in a customer-support RAG system. "
-                "Your task is to rewrite user input into a concise, standalone, "
-                "FAQ-style search query suitable for retrieving help-center articles. "
-                "Do NOT answer the question."
-            ),
+            system_prompt=RAGPrompts.SYSTEM_PROMPT_QUERY_REWRITING,
             user_prompt=prompt
         )
 
@@ -48,23 +48,9 @@ class QueryRewritingService:
                 if "role" in m and "content" in m
             )
 
-        return f"""
-Rewrite the user input into a concise, standalone FAQ-style search query.
-
-Guidelines:
-- Assume the user is a customer asking for help
-- Resolve references using the conversation context
-- Preserve the user's underlying problem or intent
-- Remove politeness, filler, and emotional language
-- Use neutral FAQ wording (e.g. "How do I...", "What is...", "Why does...")
-- Do NOT include answers or explanations
-- Output ONLY the rewritten query
-
-Conversation history:
-{history if history else "None"}
-
-User query:
-{query}
-
-Rewritten query:
-""".strip()
+        # only the variable part goes into the user prompt,
+        # the instructions are in the (static) system prompt
+        return RAGPrompts.USER_PROMPT_QUERY_REWRITING_TEMPLATE.format(
+            history_str=history if history else "None",
+            query_str=query
+        ).strip()
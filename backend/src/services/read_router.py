@@ -0,0 +1,127 @@
+"""
+Routing of read-only queries to read replicas.
+
+Writes (uploads, deletes, migrations) always go to the primary. Similarity searches
+and listings go to a read replica whose replication lag is at most max_lag seconds;
+replicas are used round-robin. The lag of a replica is measured at most every
+check_interval seconds, a replica that lags behind or cannot be reached is skipped
+until the next check. Without a usable replica the reads go to the primary.
+"""
+import itertools
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from psycopg_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# seconds since the last replayed transaction, 0 if the replica has replayed
+# everything it received (an idle primary produces no new transactions)
+LAG_SQL = """
+    SELECT CASE
+      WHEN NOT pg_is_in_recovery() THEN 0
+      WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+      ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+# how long a lag check waits for a connection (not the pool timeout, the check
+# runs in a request and an unreachable replica must not stall it for long)
+CHECK_TIMEOUT = 2.0
+
+
+class ReadReplica:
+    """One replica with its own connection pool (created on first use)."""
+
+    def __init__(self, name: str, conninfo: str, pool_kwargs: dict):
+        self.name = name
+        self.conninfo = conninfo
+        self.pool_kwargs = pool_kwargs
+        self.pool: Optional[ConnectionPool] = None
+        self.lag: Optional[float] = None
+        self.available = False
+        self.checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def _ensure_pool(self) -> ConnectionPool:
+        if self.pool is None:
+            with self._lock:
+                if self.pool is None:
+                    self.pool = ConnectionPool(self.conninfo, name=f"replica-{self.name}", open=True,
+                                               **self.pool_kwargs)
+        return self.pool
+
+    def getconn(self):
+        return self._ensure_pool().getconn()
+
+    def putconn(self, conn) -> None:
+        self.pool.putconn(conn)
+
+    def check(self, max_lag: float) -> None:
+        """Measure the replication lag and decide whether the replica serves reads."""
+        try:
+            with self._ensure_pool().connection(timeout=CHECK_TIMEOUT) as conn:
+                self.lag = float(conn.execute(LAG_SQL).fetchone()[0])
+            self.available = self.lag <= max_lag
+            if not self.available:
+                logger.warning(f"Read replica {self.name} lags {self.lag:.1f}s behind, reading from the primary")
+        except Exception as e:
+            self.lag, self.available = None, False
+            logger.warning(f"Read replica {self.name} is not reachable: {e}")
+            # stop the pool's reconnect attempts, the next check opens a new one
+            self.close()
+        self.checked_at = time.monotonic()
+
+    def mark_unavailable(self, error: Exception) -> None:
+        logger.warning(f"Read replica {self.name} failed, reading from the primary until the next check: {error}")
+        self.available = False
+        self.checked_at = time.monotonic()
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def stats(self) -> dict:
+        return {"name": self.name, "available": self.available, "lag_seconds": self.lag}
+
+
+class ReadRouter:
+    def __init__(self, replicas: List[ReadReplica], max_lag: float, check_interval: float):
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._next = itertools.count()
+        self._check_lock = threading.Lock()
+
+    def choose(self) -> Optional[ReadReplica]:
+        """The replica for the next read, None if the primary has to serve it."""
+        now = time.monotonic()
+        stale = [r for r in self.replicas if now - r.checked_at >= self.check_interval]
+        # only one thread runs the checks, the others use the last known state
+        if stale and self._check_lock.acquire(blocking=False):
+            try:
+                for replica in stale:
+                    replica.check(self.max_lag)
+            finally:
+                self._check_lock.release()
+
+        available = [r for r in self.replicas if r.available]
+        if not available:
+            return None
+        return available[next(self._next) % len(available)]
+
+    def reset_after_fork(self) -> None:
+        """Forget the pools inherited from the parent process (see IndexingService)."""
+        for replica in self.replicas:
+            replica.pool = None
+            replica.available = False
+            replica.checked_at = float("-inf")
+
+    def close(self) -> None:
+        for replica in self.replicas:
+            replica.close()
+
+    def stats(self) -> List[dict]:
+        return [r.stats() for r in self.replicas]
@@ -0,0 +1,258 @@
+import logging
+import threading
+import time
+from dataclasses import replace
+from typing import Dict, Optional
+
+import psycopg
+from config import config
+from utils.embedding.factory import get_embedding_provider
+from utils.metrics import metrics
+from .indexing_service import IndexingService
+
+logger = logging.getLogger(__name__)
+
+# embedding columns that are re-embedded, next to them the migration adds *_next columns
+COLUMNS = (("question_embedding", "question_text", "faqs_qemb"), ("answer_embedding", "answer_text", "faqs_aemb"))
+# the answer chunks (their text is cut out of the answer of the parent FAQ)
+CHUNK_COLUMN = ("embedding", "faq_chunks_emb")
+
+
+class ReembeddingService:
+    """
+    Online migration of all FAQ embeddings to another embedding model.
+
+    1. start():  registers the model as 'migrating' and adds the columns
+                 question_embedding_next, answer_embedding_next and embedding_model_next
+                 (faq_chunks: embedding_next and embedding_model_next)
+    2. run():    fills them in small batches with pauses in between, every batch is
+                 its own short transaction, so the current columns keep serving
+    3. build_indexes(): builds the vector indexes of the new columns
+    4. switch(): replaces the current columns by the new ones and activates the
+                 model in one transaction. The other processes pick up the new
+                 model within EMBEDDING_MODEL_CHECK_INTERVAL seconds.
+
+    A migration that was interrupted continues where it stopped (rows that already
+    have embeddings of the new model are skipped).
+    """
+
+    def __init__(self, indexing_service: IndexingService, batch_size: Optional[int] = None,
+                 pause: Optional[float] = None):
+        self.indexing_service = indexing_service
+        self.batch_size = batch_size or config.REEMBED_BATCH_SIZE
+        self.pause = config.REEMBED_PAUSE if pause is None else pause
+
+    def status(self) -> Dict[str, any]:
+        with self.indexing_service.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT name, dimension, status FROM embedding_models WHERE status <> 'retired'")
+            models = {status: {"name": name, "dimension": dimension} for name, dimension, status in cur.fetchall()}
+            result = {"active": models.get("active"), "migrating": models.get("migrating")}
+            if result["migrating"]:
+                cur.execute("""
+                    SELECT COUNT(*), COUNT(*) FILTER (WHERE embedding_model_next = %s) FROM faqs
+                """, (result["migrating"]["name"],))
+                total, done = cur.fetchone()
+                cur.execute("""
+                    SELECT COUNT(*), COUNT(*) FILTER (WHERE embedding_model_next = %s) FROM faq_chunks
+                """, (result["migrating"]["name"],))
+                chunks_total, chunks_done = cur.fetchone()
+                result["progress"] = {"total": total, "done": done, "chunks_total": chunks_total,
+                                      "chunks_done": chunks_done}
+        return result
+
+    def _migrating_model(self, cur: psycopg.Cursor) -> Optional[tuple]:
+        cur.execute("SELECT name, dimension FROM embedding_models WHERE status = 'migrating'")
+        return cur.fetchone()
+
+    def start(self, model_name: str, dimension: int) -> Dict[str, any]:
+        with self.indexing_service.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('gen_ai_schema'));")
+            migrating = self._migrating_model(cur)
+            if migrating is not None:
+                if migrating != (model_name, dimension):
+                    return {"status": "error",
+                            "message": f"A migration to '{migrating[0]}' is in progress, cancel it first"}
+                return {"status": "success", "message": f"Continuing the migration to '{model_name}'"}
+            if model_name == self.indexing_service.model_name:
+                return {"status": "error", "message": f"'{model_name}' is already the active model"}
+
+            cur.execute("""
+                INSERT INTO embedding_models (name, dimension, status)
+                VALUES (%s, %s, 'migrating')
+                ON CONFLICT (name) DO UPDATE SET dimension = EXCLUDED.dimension, status = 'migrating'
+            """, (model_name, dimension))
+            for column, _, _ in COLUMNS:
+                cur.execute(f"ALTER TABLE faqs ADD COLUMN IF NOT EXISTS {column}_next vector({int(dimension)})")
+            cur.execute("ALTER TABLE faqs ADD COLUMN IF NOT EXISTS embedding_model_next TEXT")
+            cur.execute(f"ALTER TABLE faq_chunks ADD COLUMN IF NOT EXISTS embedding_next vector({int(dimension)})")
+            cur.execute("ALTER TABLE faq_chunks ADD COLUMN IF NOT EXISTS embedding_model_next TEXT")
+            conn.commit()
+        return {"status": "success", "message": f"Started the migration to '{model_name}'"}
+
+    def cancel(self) -> Dict[str, any]:
+        with self.indexing_service.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('gen_ai_schema'));")
+            cur.execute("DELETE FROM embedding_models WHERE status = 'migrating'")
+            for column, _, _ in COLUMNS:
+                cur.execute(f"ALTER TABLE faqs DROP COLUMN IF EXISTS {column}_next")
+            cur.execute("ALTER TABLE faqs DROP COLUMN IF EXISTS embedding_model_next")
+            cur.execute("ALTER TABLE faq_chunks DROP COLUMN IF EXISTS embedding_next")
+            cur.execute("ALTER TABLE faq_chunks DROP COLUMN IF EXISTS embedding_model_next")
+            conn.commit()
+        return {"status": "success", "message": "Migration cancelled"}
+
+    def _fill_batch(self, cur: psycopg.Cursor, model_name: str, after_id: int) -> int:
+        """Re-embed the next batch of rows with an id > after_id, returns the last id (0 = done)."""
+        cur.execute("""
+            SELECT id, question_text, answer_text FROM faqs
+            WHERE id > %s AND embedding_model_next IS DISTINCT FROM %s
+            ORDER BY id
+            LIMIT %s
+        """, (after_id, model_name, self.batch_size))
+        rows = cur.fetchall()
+        if not rows:
+            return 0
+
+        provider = get_embedding_provider(model_name)
+        q_embs = provider.encode([row[1] for row in rows])
+        a_embs = provider.encode([row[2] for row in rows])
+        cur.executemany("""
+            UPDATE faqs
+            SET question_embedding_next = %s, answer_embedding_next = %s, embedding_model_next = %s
+            WHERE id = %s
+        """, [(q.tolist(), a.tolist(), model_name, row[0]) for row, q, a in zip(rows, q_embs, a_embs)])
+        metrics.increment("reembedding.rows", len(rows))
+        return rows[-1][0]
+
+    def _fill_chunk_batch(self, cur: psycopg.Cursor, model_name: str, after_id: int) -> int:
+        """As _fill_batch for the answer chunks."""
+        cur.execute("""
+            SELECT c.id, substr(f.answer_text, c.start_char + 1, c.end_char - c.start_char)
+            FROM faq_chunks c
+            JOIN faqs f ON f.document_id = c.document_id AND f.id = c.faq_id
+            WHERE c.id > %s AND c.embedding_model_next IS DISTINCT FROM %s
+            ORDER BY c.id
+            LIMIT %s
+        """, (after_id, model_name, self.batch_size))
+        rows = cur.fetchall()
+        if not rows:
+            return 0
+
+        embs = get_embedding_provider(model_name).encode([row[1] for row in rows])
+        cur.executemany("""
+            UPDATE faq_chunks SET embedding_next = %s, embedding_model_next = %s WHERE id = %s
+        """, [(emb.tolist(), model_name, row[0]) for row, emb in zip(rows, embs)])
+        metrics.increment("reembedding.chunks", len(rows))
+        return rows[-1][0]
+
+    def run(self, stop: Optional[threading.Event] = None) -> int:
+        """Fill the new columns batch by batch, returns the number of batches."""
+        with self.indexing_service.connection() as conn:
+            migrating = self._migrating_model(conn.cursor())
+        if migrating is None:
+            raise RuntimeError("No migration in progress, call start() first")
+        model_name = migrating[0]
+
+        batches = 0
+        for fill in (self._fill_batch, self._fill_chunk_batch):
+            last_id = 0
+            while stop is None or not stop.is_set():
+                with self.indexing_service.connection() as conn:
+                    last_id = fill(conn.cursor(), model_name, last_id)
+                    conn.commit()
+                if not last_id:
+                    break
+                batches += 1
+                if batches % 10 == 0:
+                    logger.info(f"Re-embedding with '{model_name}': {batches} batches done (last id {last_id})")
+                # throttle, so the migration does not compete with the live traffic
+                time.sleep(self.pause)
+        return batches
+
+    def build_indexes(self):
+        """Build the vector indexes of the new columns (concurrently if the table is not partitioned)."""
+        with self.indexing_service.connection() as conn:
+            _, dimension = self._migrating_model(conn.cursor())
+        storage = replace(self.indexing_service.storage, dimension=dimension)
+        partitioned = self.indexing_service.partitioned
+
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        # and is not supported on partitioned tables
+        with psycopg.connect(self.indexing_service.conninfo(), autocommit=True) as conn:
+            for column, _, index_name in COLUMNS:
+                for statement in storage.index_statements("faqs", f"{column}_next", f"{index_name}_next_idx",
+                                                          incremental=partitioned):
+                    if not partitioned:
+                        statement = statement.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+                    conn.execute(statement)
+            # faq_chunks is not partitioned
+            column, index_name = CHUNK_COLUMN
+            for statement in storage.index_statements("faq_chunks", f"{column}_next", f"{index_name}_next_idx",
+                                                      incremental=True):
+                conn.execute(statement.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1))
+
+    def switch(self) -> Dict[str, any]:
+        """Atomically replace the current embeddings by the new ones and activate the new model."""
+        with self.indexing_service.connection() as conn:
+            cur = conn.cursor()
+            # waits for running inserts (they read the active model FOR SHARE) and
+            # blocks new ones until the switch is committed
+            cur.execute("SELECT name, dimension, status FROM embedding_models "
+                        "WHERE status IN ('active', 'migrating') FOR UPDATE")
+            models = {status: (name, dimension) for name, dimension, status in cur.fetchall()}
+            if "migrating" not in models:
+                return {"status": "error", "message": "No migration in progress"}
+            model_name, dimension = models["migrating"]
+
+            # rows inserted since the last batch (reads are still served meanwhile)
+            for fill in (self._fill_batch, self._fill_chunk_batch):
+                last_id = 0
+                while True:
+                    last_id = fill(cur, model_name, last_id)
+                    if not last_id:
+                        break
+
+            cur.execute("LOCK TABLE faqs, faq_chunks IN ACCESS EXCLUSIVE MODE")
+            # dropping the old columns drops their indexes as well
+            cur.execute("""
+                ALTER TABLE faqs
+                  DROP COLUMN question_embedding,
+                  DROP COLUMN answer_embedding,
+                  DROP COLUMN embedding_model
+            """)
+            for column, _, _ in COLUMNS:
+                cur.execute(f"ALTER TABLE faqs RENAME COLUMN {column}_next TO {column}")
+            cur.execute("ALTER TABLE faqs RENAME COLUMN embedding_model_next TO embedding_model")
+            cur.execute("ALTER TABLE faq_chunks DROP COLUMN embedding, DROP COLUMN embedding_model")
+            cur.execute("ALTER TABLE faq_chunks RENAME COLUMN embedding_next TO embedding")
+            cur.execute("ALTER TABLE faq_chunks RENAME COLUMN embedding_model_next TO embedding_model")
+            cur.execute(r"""
+                SELECT indexname FROM pg_indexes
+                WHERE (tablename = 'faqs' AND indexname LIKE 'faqs\_%emb\_next\_idx%')
+                   OR (tablename = 'faq_chunks' AND indexname LIKE 'faq\_chunks\_emb\_next\_idx%')
+            """)
+            for (index,) in cur.fetchall():
+                cur.execute(f"ALTER INDEX {index} RENAME TO {index.replace('_next_idx', '_idx')}")
+
+            cur.execute("UPDATE embedding_models SET status = 'retired' WHERE status = 'active'")
+            cur.execute("UPDATE embedding_models SET status = 'active', activated_at = now() WHERE name = %s",
+                        (model_name,))
+            conn.commit()
+
+        self.indexing_service.refresh_embedding_model(force=True)
+        return {"status": "success", "message": f"Switched to '{model_name}' ({dimension} dimensions)"}
+
+    def migrate(self, model_name: str, dimension: int, stop: Optional[threading.Event] = None) -> Dict[str, any]:
+        """Runs all steps of the migration."""
+        result = self.start(model_name, dimension)
+        if result["status"] != "success":
+            return result
+        logger.info(result["message"])
+        self.run(stop)
+        if stop is not None and stop.is_set():
+            return {"status": "success", "message": "Migration paused, run it again to continue"}
+        self.build_indexes()
+        return self.switch()
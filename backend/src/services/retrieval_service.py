@@ -13,41 +13,325 @@ https://stackoverflow.com/a/43226395
 https://docs.cloud.google.com/alloydb/docs/ai/run-vector-similarity-search#run-pgvector-similarity-search
 """
 
-from typing import List
-from sentence_transformers import SentenceTransformer
+from dataclasses import dataclass, replace
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+import psycopg
+from config import config
+from utils.embedding.factory import get_embedding_provider
+from utils.metrics import metrics
+from utils.prefetch import PrefetchCache
+from utils.profiling import explain, stage
 from .indexing_service import IndexingService
 
+
+@dataclass(frozen=True)
+class RetrievalResult:
+    """
+    One retrieved FAQ with its cosine distance to the query. With answer chunking
+    the answer is the matching part of the FAQ's answer (expanded to its neighbors)
+    and chunk_index the index of the matching chunk.
+    """
+    faq_id: int
+    question: str
+    answer: str
+    distance: float
+    document_id: Optional[int] = None
+    chunk_index: Optional[int] = None
+
+    @property
+    def similarity(self) -> float:
+        return 1.0 - self.distance
+
+
+# a single document id, a list of document ids or None (all documents)
+DocumentScope = Union[int, str, Sequence[Union[int, str]], None]
+
+
+def scope_document_ids(document_id: DocumentScope) -> Optional[List[int]]:
+    """Normalizes a document scope to a sorted list of ids (None = all documents)."""
+    if document_id is None:
+        return None
+    if isinstance(document_id, (list, tuple, set)):
+        return sorted({int(d) for d in document_id})
+    return [int(document_id)]
+
+
 class RetrievalService:
-    def retrieve_documents(self, optimized_query: str, document_id: str, indexing_service: IndexingService) -> List[str]:
+    def __init__(self):
+        # query embeddings and search results computed by prefetch() while the user types
+        self.prefetched = PrefetchCache(config.PREFETCH_CACHE_SIZE, config.PREFETCH_TTL)
+
+    def retrieve_documents(
+        self,
+        optimized_query: str,
+        document_id: DocumentScope,
+        indexing_service: IndexingService,
+        k: Optional[int] = None,
+        min_similarity: Optional[float] = None,
+        query_embedding: Optional[np.ndarray] = None,
+    ) -> List[RetrievalResult]:
 
         """
         Retrieve relevant documents by comparing the embeddings of the user's query and the answers found in the knowledge base
+
+        Returns up to k (default RETRIEVAL_TOP_K) results ordered by similarity, results
+        below min_similarity (default RETRIEVAL_MIN_SIMILARITY) are dropped.
+        document_id is one document, a list of documents or None for all documents;
+        the top k over the whole scope are found with a single query.
+        query_embedding is the embedding of optimized_query if the caller already has it
+        (see embed_query).
         """
+        if k is None:
+            k = config.RETRIEVAL_TOP_K # the top k relevant/similar results will be retrieved from the knowledge base
+        if min_similarity is None:
+            min_similarity = config.RETRIEVAL_MIN_SIMILARITY
+
+        # with answer chunking the best chunks are searched instead of the whole answers
+        column = "answer_embedding" if indexing_service.chunker is None else "chunk"
+        results = self._nearest(optimized_query, document_id, indexing_service, column, k, query_embedding)
+        return [r for r in results if r.similarity >= min_similarity]
+
+    def embed_query(self, query: str, indexing_service: IndexingService) -> np.ndarray:
+        """Embedding of the query with the active embedding model."""
+        indexing_service.refresh_embedding_model()
+        prefetched = self.prefetched.get(self._embedding_key(query, indexing_service))
+        if prefetched is not None:
+            return prefetched
+        # the model is loaded once per process and shared (see utils/embedding/factory.py)
+        with stage("retrieval.embedding"):
+            return get_embedding_provider(indexing_service.model_name).encode_query(query)
 
-        indexing_service._ensure_connection()
+    def find_matching_faq(self, query: str, document_id: DocumentScope, indexing_service: IndexingService) -> Optional[RetrievalResult]:
+        """
+        Find the FAQ whose question is most similar to the query (None if the document has no FAQs).
+        """
+        results = self._nearest(query, document_id, indexing_service, "question_embedding", 1)
+        return results[0] if results else None
+
+    def prefetch(self, query: str, document_id: DocumentScope, indexing_service: IndexingService,
+                 k: Optional[int] = None, questions: int = 0) -> List[RetrievalResult]:
+        """
+        Embed a (partial) query and run its searches ahead of the request, so a request
+        with the same query (within PREFETCH_TTL seconds) skips both: the answer search
+        of retrieve_documents and, with questions > 0 or early exit enabled, the
+        question search of find_matching_faq.
+
+        Returns the `questions` FAQs with the most similar questions (suggestions).
+        """
+        if k is None:
+            k = config.RETRIEVAL_TOP_K
+        query_embedding = self.embed_query(query, indexing_service)
+        self.prefetched.put(self._embedding_key(query, indexing_service), query_embedding)
+
+        column = "answer_embedding" if indexing_service.chunker is None else "chunk"
+        answers = self._nearest(query, document_id, indexing_service, column, k, query_embedding)
+        self.prefetched.put(self._search_key(query, document_id, indexing_service, column, k), answers)
+
+        if questions <= 0 and not config.EARLY_EXIT_ENABLED:
+            return []
+        matches = self._nearest(query, document_id, indexing_service, "question_embedding", max(questions, 1),
+                                query_embedding)
+        self.prefetched.put(self._search_key(query, document_id, indexing_service, "question_embedding", 1),
+                            matches[:1])
+        return matches[:questions]
+
+    def prefetched_results(self, query: str, document_id: DocumentScope, indexing_service: IndexingService,
+                           k: Optional[int] = None,
+                           min_similarity: Optional[float] = None) -> Optional[List[RetrievalResult]]:
+        """
+        The results retrieve_documents would return for the query if prefetch() ran its
+        search (within PREFETCH_TTL seconds), None otherwise.
+        """
+        if k is None:
+            k = config.RETRIEVAL_TOP_K
+        if min_similarity is None:
+            min_similarity = config.RETRIEVAL_MIN_SIMILARITY
+        indexing_service.refresh_embedding_model()
+        column = "answer_embedding" if indexing_service.chunker is None else "chunk"
+        results = self.prefetched.get(self._search_key(query, document_id, indexing_service, column, k))
+        if results is None:
+            return None
+        metrics.increment("retrieval.prefetch_hit")
+        return [r for r in results if r.similarity >= min_similarity]
+
+    @staticmethod
+    def _embedding_key(query: str, indexing_service: IndexingService) -> tuple:
+        # whitespace does not change the query, case can (for cased models)
+        return "embedding", " ".join(query.split()), indexing_service.model_name
+
+    @staticmethod
+    def _search_key(query: str, document_id: DocumentScope, indexing_service: IndexingService,
+                    column: str, k: int) -> tuple:
+        document_ids = scope_document_ids(document_id)
+        return ("search", " ".join(query.split()), document_ids and tuple(document_ids), column, k,
+                indexing_service.model_name)
+
+    def _nearest(self, query: str, document_id: DocumentScope, indexing_service: IndexingService,
+                 column: str, k: int, query_embedding: Optional[np.ndarray] = None) -> List[RetrievalResult]:
+        indexing_service.refresh_embedding_model()
+        prefetched = self.prefetched.get(self._search_key(query, document_id, indexing_service, column, k))
+        if prefetched is not None:
+            metrics.increment("retrieval.prefetch_hit")
+            return prefetched
+        if query_embedding is None:
+            query_embedding = self.prefetched.get(self._embedding_key(query, indexing_service))
+        model_name = indexing_service.model_name
+        try:
+            results = self._query_nearest(query, document_id, indexing_service, column, k, query_embedding)
+        except psycopg.errors.DataException:
+            # "different vector dimensions": a re-embedding switched to a model with
+            # another dimension since the last check, encode again with the new one
+            indexing_service.refresh_embedding_model(force=True)
+            return self._query_nearest(query, document_id, indexing_service, column, k)
+        if not results:
+            # only rows of the model the query was encoded with are searched; none are
+            # left if a re-embedding switched to another model (of the same dimension)
+            indexing_service.refresh_embedding_model(force=True)
+            if indexing_service.model_name != model_name:
+                return self._query_nearest(query, document_id, indexing_service, column, k)
+        return results
+
+    def _query_nearest(self, query: str, document_id: DocumentScope, indexing_service: IndexingService,
+                       column: str, k: int, query_embedding: Optional[np.ndarray] = None) -> List[RetrievalResult]:
         embedding_model_name = indexing_service.model_name
-        conn = indexing_service.conn
 
-        k = 5 # the top k relevant/similar results will be retrieved from the knowledge base
+        if query_embedding is None:
+            # TAKEN FROM START 1
+            # the model is loaded once per process and shared (see utils/embedding/factory.py)
+            with stage("retrieval.embedding"):
+                model = get_embedding_provider(embedding_model_name)
+                query_embedding = model.encode_query(query)
+            # TAKEN FROM END 1
+        query_embedding = query_embedding.tolist()
 
-        # TAKEN FROM START 1
-        model = SentenceTransformer(embedding_model_name)
-        query_embedding = model.encode(
-            optimized_query,
-            show_progress_bar=False
-        ).tolist()
-        # TAKEN FROM END 1
+        if column == "chunk":
+            return self._query_chunks(query_embedding, document_id, indexing_service, k, embedding_model_name)
 
         # TAKEN FROM START 2
-        cur = conn.cursor()
-        # TAKEN FROM START 3
-        # the cosine distance, namely <=>, is used
-        retrieve_query = f"SELECT answer_text \n FROM faqs WHERE document_id={document_id} \n ORDER BY answer_embedding::vector <=> '{query_embedding}' LIMIT {k};"
-        # TAKEN FROM END 3
-        cur.execute(retrieve_query)
-        raw_results = cur.fetchall()
-        # Unpack the results to extract the string from the tuples
-        relevant_results = [row[0] for row in raw_results]
-        indexing_service.close()
+        document_ids = scope_document_ids(document_id)
+        with indexing_service.read_connection() as conn:
+            cur = conn.cursor()
+            self._set_iterative_scan(cur, indexing_service)
+            # TAKEN FROM START 3
+            # the cosine distance, namely <=>, is used
+            # (in the compact storage modes the search runs on the halfvec/bit index
+            # and the candidates are rescored with the exact float distance)
+            retrieve_query = indexing_service.storage.nearest_sql(
+                table="faqs",
+                column=column,
+                select="id, question_text, answer_text, document_id",
+                # one filtered query over all documents of the scope (partitions
+                # outside the list are pruned when the table is partitioned)
+                where=self._scope_filter(document_ids)
+            )
+            # TAKEN FROM END 3
+            params = {
+                "query": str(query_embedding),
+                "document_ids": document_ids,
+                "model": embedding_model_name,
+                "k": k
+            }
+            with stage("retrieval.sql"):
+                cur.execute(retrieve_query, params)
+                raw_results = cur.fetchall()
+            explain(cur, retrieve_query, params)
         # TAKEN FROM END 2
-        return relevant_results
\ No newline at end of file
+        results = [
+            RetrievalResult(faq_id=faq_id, question=question, answer=answer,
+                            distance=float(distance), document_id=doc_id)
+            for faq_id, question, answer, doc_id, distance in raw_results
+        ]
+        # relaxed_order iterative scans may return the rows slightly out of order
+        return sorted(results, key=lambda r: r.distance)
+
+    @staticmethod
+    def _scope_filter(document_ids: Optional[List[int]]) -> str:
+        # rows of another model than the query's are never compared with it (after a
+        # re-embedding other processes may still encode with the old model for a moment)
+        where = "embedding_model = %(model)s"
+        if document_ids is not None:
+            where += " AND document_id = ANY(%(document_ids)s)"
+        return where
+
+    @staticmethod
+    def _set_iterative_scan(cur: psycopg.Cursor, indexing_service: IndexingService):
+        if indexing_service.iterative_scan:
+            # without it the ANN index returns its nearest candidates first and the
+            # document filter is applied afterwards, leaving fewer than k rows when
+            # the scope is a small part of the table (the extra scanning is capped
+            # by hnsw.max_scan_tuples / ivfflat.max_probes)
+            cur.execute("SET LOCAL hnsw.iterative_scan = relaxed_order")
+            cur.execute("SET LOCAL ivfflat.iterative_scan = relaxed_order")
+
+    def _query_chunks(self, query_embedding: List[float], document_id: DocumentScope,
+                      indexing_service: IndexingService, k: int, model_name: str) -> List[RetrievalResult]:
+        """
+        Top k answer chunks, each expanded to CHUNK_NEIGHBORS chunks before and after
+        it. Expanded chunks of the same answer that overlap are merged into one result.
+        """
+        document_ids = scope_document_ids(document_id)
+        nearest = indexing_service.storage.nearest_sql(
+            table="faq_chunks",
+            column="embedding",
+            select="id, faq_id, document_id, chunk_index",
+            where=self._scope_filter(document_ids)
+        )
+        with indexing_service.read_connection() as conn:
+            cur = conn.cursor()
+            self._set_iterative_scan(cur, indexing_service)
+            # the span from the first to the last neighbor, cut out of the parent answer
+            chunks_query = f"""
+                WITH hits AS ({nearest})
+                SELECT h.faq_id, h.document_id, h.chunk_index, h.distance, f.question_text, f.answer_text,
+                       MIN(n.start_char), MAX(n.end_char)
+                FROM hits h
+                JOIN faq_chunks n ON n.faq_id = h.faq_id
+                 AND n.chunk_index BETWEEN h.chunk_index - %(neighbors)s AND h.chunk_index + %(neighbors)s
+                JOIN faqs f ON f.document_id = h.document_id AND f.id = h.faq_id
+                GROUP BY h.id, h.faq_id, h.document_id, h.chunk_index, h.distance, f.question_text, f.answer_text
+                ORDER BY h.distance
+            """
+            params = {
+                "query": str(query_embedding),
+                "document_ids": document_ids,
+                "model": model_name,
+                "k": k,
+                "neighbors": config.CHUNK_NEIGHBORS,
+            }
+            with stage("retrieval.sql"):
+                cur.execute(chunks_query, params)
+                rows = cur.fetchall()
+            explain(cur, chunks_query, params)
+
+        # merge overlapping spans of the same answer (keeping the best distance)
+        merged = []
+        for faq_id, doc_id, chunk_index, distance, question, answer, start, end in rows:
+            for i, (other, span) in enumerate(merged):
+                if other.faq_id == faq_id and start <= span[1] and span[0] <= end:
+                    span = (min(span[0], start), max(span[1], end))
+                    merged[i] = (replace(other, answer=answer[span[0]:span[1]]), span)
+                    break
+            else:
+                result = RetrievalResult(faq_id=faq_id, question=question, answer=answer[start:end],
+                                         distance=float(distance), document_id=doc_id, chunk_index=chunk_index)
+                merged.append((result, (start, end)))
+        return [result for result, _ in merged]
+
+    def warm_up(self, query: str, indexing_service: IndexingService) -> None:
+        """
+        Run a synthetic query so the first real request does not pay for
+        loading the model, opening connections or reading cold index pages.
+        """
+        model = get_embedding_provider(indexing_service.model_name)
+        query_embedding = model.encode_query(query).tolist()
+        with indexing_service.read_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                indexing_service.storage.nearest_sql(table="faq_chunks", column="embedding", select="id")
+                if indexing_service.chunker is not None else
+                indexing_service.storage.nearest_sql(table="faqs", column="answer_embedding", select="id"),
+                {"query": str(query_embedding), "k": 1}
+            )
+            cur.fetchall()
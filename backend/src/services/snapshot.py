@@ -0,0 +1,100 @@
+"""
+Portable snapshots of indexed documents.
+
+A snapshot of one document is a pair of files:
+  <name>.f32   all embeddings as one raw little-endian float32 matrix (dimension
+               columns): the question embeddings, then the answer embeddings, then
+               the chunk embeddings
+  <name>.json  the metadata sidecar: format version, embedding model and dimension,
+               the document, the FAQ texts, the chunk spans and which rows of the
+               matrix belong to what (plus the SHA-256 of the matrix file)
+
+Importing memory-maps the matrix, so the embeddings are handed to the bulk insert
+without being parsed or recomputed.
+"""
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+SNAPSHOT_FORMAT = "gen_ai-faq-snapshot"
+SNAPSHOT_VERSION = 1
+
+
+@dataclass
+class Snapshot:
+    metadata: Dict
+    matrix: np.ndarray
+
+    def rows(self, part: str) -> Optional[np.ndarray]:
+        """The embeddings of one part ('questions', 'answers' or 'chunks'), None if absent."""
+        span = self.metadata["rows"].get(part)
+        return None if span is None else self.matrix[span[0]:span[1]]
+
+
+def snapshot_paths(path: str) -> Tuple[str, str]:
+    """The (matrix, sidecar) file names of a snapshot, given either file or the common stem."""
+    stem, extension = os.path.splitext(path)
+    if extension not in (".json", ".f32"):
+        stem = path
+    return f"{stem}.f32", f"{stem}.json"
+
+
+def write_snapshot(path: str, metadata: Dict, parts: Dict[str, np.ndarray]) -> str:
+    """Write the embedding parts (in order) and the metadata, returns the sidecar path."""
+    matrix_path, sidecar_path = snapshot_paths(path)
+    os.makedirs(os.path.dirname(os.path.abspath(matrix_path)), exist_ok=True)
+
+    rows, offset, digest = {}, 0, hashlib.sha256()
+    with open(matrix_path, "wb") as f:
+        for name, embs in parts.items():
+            data = np.ascontiguousarray(embs, dtype="<f4").tobytes()
+            f.write(data)
+            digest.update(data)
+            rows[name] = [offset, offset + len(embs)]
+            offset += len(embs)
+
+    sidecar = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        **metadata,
+        "rows": rows,
+        "matrix": {"file": os.path.basename(matrix_path), "shape": [offset, metadata["dimension"]],
+                   "dtype": "float32", "sha256": digest.hexdigest()},
+    }
+    # the sidecar is written last, a snapshot without it is incomplete
+    tmp_path = f"{sidecar_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(sidecar, f, ensure_ascii=False)
+    os.replace(tmp_path, sidecar_path)
+    return sidecar_path
+
+
+def read_snapshot(path: str, verify: bool = False) -> Snapshot:
+    """Read the sidecar and memory-map the matrix (verify: check its SHA-256 first)."""
+    matrix_path, sidecar_path = snapshot_paths(path)
+    with open(sidecar_path, encoding="utf-8") as f:
+        metadata = json.load(f)
+    if metadata.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{sidecar_path} is not a FAQ snapshot")
+    if metadata.get("version", 0) > SNAPSHOT_VERSION:
+        raise ValueError(f"Snapshot version {metadata['version']} is newer than the supported "
+                         f"version {SNAPSHOT_VERSION}")
+
+    rows, dimension = metadata["matrix"]["shape"]
+    if os.path.getsize(matrix_path) != rows * dimension * 4:
+        raise ValueError(f"{matrix_path} does not match the shape in the sidecar, the snapshot is incomplete")
+    if verify:
+        digest = hashlib.sha256()
+        with open(matrix_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        if digest.hexdigest() != metadata["matrix"]["sha256"]:
+            raise ValueError(f"Checksum mismatch of {matrix_path}")
+
+    matrix = np.memmap(matrix_path, dtype="<f4", mode="r", shape=(rows, dimension)) if rows \
+        else np.zeros((0, dimension), dtype=np.float32)
+    return Snapshot(metadata, matrix)
@@ -0,0 +1,41 @@
+from abc import ABC, abstractmethod
+from typing import List
+
+import numpy as np
+
+
+class EmbeddingProvider(ABC):
+    """
+    abstract interface for embedding models.
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    @abstractmethod
+    def load(self) -> None:
+        """
+        Loads the model weights (and tokenizer) into memory.
+        Calling it more than once must be a no-op.
+        """
+        pass
+
+    @abstractmethod
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Encodes the texts into embeddings.
+
+        Returns:
+            A float32 array of shape (len(texts), dimension).
+        """
+        pass
+
+    def encode_one(self, text: str) -> np.ndarray:
+        return self.encode([text])[0]
+
+    def encode_query(self, text: str) -> np.ndarray:
+        """
+        Encodes a search query. Unlike corpus texts (FAQs, chunks), queries are not
+        kept in a persistent cache (see CachedEmbeddingProvider).
+        """
+        return self.encode_one(text)
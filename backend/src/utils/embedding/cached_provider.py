@@ -0,0 +1,48 @@
+from typing import List
+
+import numpy as np
+
+from .base import EmbeddingProvider
+from .store import EmbeddingStore
+
+
+class CachedEmbeddingProvider(EmbeddingProvider):
+    """
+    Reads embeddings from the persistent EmbeddingStore and writes the ones it has
+    to compute through to it, so texts that were embedded before (by any process,
+    e.g. during indexing) are not encoded again.
+
+    Only encode() writes through, it is used for the corpus (indexing, re-embedding).
+    Search queries (encode_query) are looked up but never stored, so user input does
+    not end up on disk and the store only grows with the corpus.
+    """
+
+    def __init__(self, provider: EmbeddingProvider, store: EmbeddingStore):
+        super().__init__(provider.model_name)
+        self.provider = provider
+        self.store = store
+
+    def load(self) -> None:
+        self.provider.load()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            # nothing to look up, the wrapped provider returns the (0, dimension) array
+            return self.provider.encode(texts)
+        cached = self.store.get_many(texts)
+        missing = [i for i, array in enumerate(cached) if array is None]
+        if missing:
+            # duplicates within the batch are encoded once
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            encoded = self.provider.encode(unique)
+            self.store.put_many(unique, encoded)
+            by_text = dict(zip(unique, encoded))
+            for i in missing:
+                cached[i] = by_text[texts[i]]
+        return np.vstack([np.asarray(array, dtype=np.float32).reshape(1, -1) for array in cached])
+
+    def encode_query(self, text: str) -> np.ndarray:
+        cached = self.store.get(text)
+        if cached is not None:
+            return np.asarray(cached[0], dtype=np.float32)
+        return self.provider.encode_query(text)
@@ -0,0 +1,65 @@
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from config import config
+from .base import EmbeddingProvider
+from .cached_provider import CachedEmbeddingProvider
+from .onnx_provider import OnnxEmbeddingProvider
+from .sentence_transformer_provider import SentenceTransformerProvider
+from .store import EmbeddingStore
+
+_providers: Dict[str, EmbeddingProvider] = {}
+_lock = threading.Lock()
+
+
+def get_embedding_provider(model_name: Optional[str] = None) -> EmbeddingProvider:
+    """
+    Returns the process-wide embedding provider for the given model.
+
+    Providers are cached per model name, so every service in a process shares the
+    same loaded weights. When the model is loaded before forking (gunicorn
+    preload_app) the workers share that memory through copy-on-write.
+    With EMBEDDING_CACHE_DIR set, embeddings are cached on disk (see store.py).
+    EMBEDDING_BACKEND selects the PyTorch or the ONNX implementation.
+    """
+    model_name = model_name or config.EMBEDDING_MODEL_NAME
+    provider = _providers.get(model_name)
+    if provider is None:
+        with _lock:
+            provider = _providers.get(model_name)
+            if provider is None:
+                provider, namespace = _create_provider(model_name)
+                if config.EMBEDDING_CACHE_DIR:
+                    provider = CachedEmbeddingProvider(provider, EmbeddingStore(config.EMBEDDING_CACHE_DIR, namespace))
+                _providers[model_name] = provider
+    return provider
+
+
+def _create_provider(model_name: str) -> Tuple[EmbeddingProvider, str]:
+    """The provider of the configured backend and its namespace in the embedding cache."""
+    if config.EMBEDDING_BACKEND == "onnx":
+        provider = OnnxEmbeddingProvider(
+            model_name,
+            model_file=config.EMBEDDING_ONNX_FILE,
+            model_dir=config.EMBEDDING_ONNX_PATH,
+            num_threads=config.EMBEDDING_ONNX_THREADS,
+        )
+        # quantized exports give (slightly) different vectors, keep them apart
+        return provider, f"{model_name}-{os.path.basename(config.EMBEDDING_ONNX_FILE)}"
+    if config.EMBEDDING_BACKEND != "sentence-transformers":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{config.EMBEDDING_BACKEND}'")
+    return SentenceTransformerProvider(model_name), model_name
+
+
+def register_embedding_provider(model_name: str, provider: EmbeddingProvider) -> None:
+    """Use the given provider for the model in this process (e.g. a stand-in in benchmarks)."""
+    with _lock:
+        _providers[model_name] = provider
+
+
+def preload_embedding_provider(model_name: Optional[str] = None) -> EmbeddingProvider:
+    """Loads the embedding model (and its tokenizer) eagerly."""
+    provider = get_embedding_provider(model_name)
+    provider.load()
+    return provider
@@ -0,0 +1,110 @@
+import logging
+import os
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from .base import EmbeddingProvider
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class OnnxEmbeddingProvider(EmbeddingProvider):
+    """
+    Embedding provider running an ONNX export of a sentence-transformers model with
+    onnxruntime and the (Rust) tokenizers library, without loading PyTorch.
+
+    Produces the same embeddings as SentenceTransformerProvider for models with
+    mean pooling and normalization (e.g. all-MiniLM-L6-v2). With an int8 quantized
+    export (e.g. onnx/model_quint8_avx2.onnx) the cosine agreement stays > 0.98.
+
+    The model files are read from `model_dir` (the model file and tokenizer.json)
+    or downloaded from the Hugging Face hub repository of the model.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        model_file: str = "onnx/model.onnx",
+        model_dir: Optional[str] = None,
+        max_seq_length: int = 256,
+        num_threads: int = 0,
+        normalize: bool = True,
+    ):
+        super().__init__(model_name)
+        self.model_file = model_file
+        self.model_dir = model_dir
+        self.max_seq_length = max_seq_length
+        self.num_threads = num_threads
+        self.normalize = normalize
+        self._session = None
+        self._tokenizer = None
+        self._input_names: List[str] = []
+        self._dimension: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _resolve(self, filename: str) -> str:
+        if self.model_dir:
+            return os.path.join(self.model_dir, filename)
+        from huggingface_hub import hf_hub_download
+        repo_id = self.model_name if "/" in self.model_name else f"sentence-transformers/{self.model_name}"
+        return hf_hub_download(repo_id, filename)
+
+    def load(self) -> None:
+        if self._session is not None:
+            return
+        with self._lock:
+            if self._session is not None:
+                return
+            import onnxruntime
+            from tokenizers import Tokenizer
+
+            logger.info(f"Loading ONNX embedding model '{self.model_name}' ({self.model_file})")
+            tokenizer = Tokenizer.from_file(self._resolve("tokenizer.json"))
+            tokenizer.enable_truncation(max_length=self.max_seq_length)
+            tokenizer.enable_padding()
+
+            options = onnxruntime.SessionOptions()
+            if self.num_threads:
+                options.intra_op_num_threads = self.num_threads
+            session = onnxruntime.InferenceSession(
+                self._resolve(self.model_file), options, providers=["CPUExecutionProvider"]
+            )
+            self._input_names = [i.name for i in session.get_inputs()]
+            # the hidden size of the token embeddings, unless the export left it symbolic
+            hidden_size = session.get_outputs()[0].shape[-1]
+            self._dimension = hidden_size if isinstance(hidden_size, int) else None
+            self._tokenizer = tokenizer
+            self._session = session
+
+    def get_dimension(self) -> int:
+        """The dimension of the embeddings, encoding an empty text if the model does not declare it."""
+        self.load()
+        if self._dimension is None:
+            self._dimension = int(self._embed([""]).shape[1])
+        return self._dimension
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.get_dimension()), dtype=np.float32)
+        self.load()
+        return self._embed(texts)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        encodings = self._tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        token_embeddings = self._session.run(None, {name: inputs[name] for name in self._input_names})[0]
+
+        # mean pooling over the non-padding tokens (as the sentence-transformers Pooling module)
+        mask = inputs["attention_mask"][:, :, None].astype(np.float32)
+        embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+        return embeddings.astype(np.float32)
@@ -0,0 +1,41 @@
+import logging
+import threading
+from typing import List
+
+import numpy as np
+
+from .base import EmbeddingProvider
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class SentenceTransformerProvider(EmbeddingProvider):
+    """
+    Embedding provider backed by a (PyTorch) SentenceTransformer model.
+    The model is loaded once on first use (or explicitly via load()).
+    """
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        super().__init__(model_name)
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        if self._model is not None:
+            return
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                logger.info(f"Loading embedding model '{self.model_name}'")
+                self._model = SentenceTransformer(self.model_name)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        self.load()
+        if not texts:
+            return np.zeros((0, self._model.get_sentence_embedding_dimension()), dtype=np.float32)
+        return self._model.encode(
+            texts,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).astype(np.float32)
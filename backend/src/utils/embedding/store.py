@@ -0,0 +1,160 @@
+import hashlib
+import mmap
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DTYPE = np.float32
+_ITEMSIZE = np.dtype(DTYPE).itemsize
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _safe_name(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+
+
+class EmbeddingStore:
+    """
+    Persistent, content-addressed store of float32 arrays (sentence embeddings,
+    token features, ...), keyed by the SHA-256 of the text.
+
+    Every namespace (e.g. the model name) is a directory with two append-only files:
+      data.f32    the raw arrays, read through a memory map (no copies, pages are
+                  shared between processes)
+      index.txt   one line "<digest> <byte offset> <rows> <cols>" per array
+
+    Several processes (gunicorn workers, the evaluation) can use the same store,
+    writers serialize on an exclusive lock of a lock file (flock, msvcrt on Windows).
+    The data is appended before its index line, so readers never see an entry
+    without its data.
+
+    Nothing is ever removed: the store grows with the embedded corpus (search
+    queries are not written, see CachedEmbeddingProvider). To reclaim the space of
+    deleted FAQs or of a model that is no longer used, delete the namespace
+    directory while no process uses it; it is rebuilt as texts are embedded again.
+    """
+
+    def __init__(self, root: str, namespace: str):
+        self.path = Path(root) / _safe_name(namespace)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._data_path = self.path / "data.f32"
+        self._index_path = self.path / "index.txt"
+        self._data_path.touch(exist_ok=True)
+        self._index_path.touch(exist_ok=True)
+
+        self._entries: Dict[str, Tuple[int, int, int]] = {}
+        self._index_pos = 0
+        self._map: Optional[mmap.mmap] = None
+        self._map_size = 0
+        self._lock = threading.Lock()
+        with self._lock:
+            self._refresh_index()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _refresh_index(self) -> None:
+        """Read the index lines appended (by any process) since the last refresh."""
+        with open(self._index_path, "r", encoding="ascii") as f:
+            f.seek(self._index_pos)
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # line is still being written
+                digest, offset, rows, cols = line.split()
+                self._entries[digest] = (int(offset), int(rows), int(cols))
+                self._index_pos += len(line)
+
+    def _view(self, offset: int, rows: int, cols: int) -> Optional[np.ndarray]:
+        end = offset + rows * cols * _ITEMSIZE
+        if end > self._map_size:
+            # remap the grown file; views of the old map keep it alive
+            with open(self._data_path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size:
+                    self._map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            self._map_size = size
+            if end > size:
+                return None  # data lost in a crash, the entry is recomputed
+        array = np.frombuffer(self._map, dtype=DTYPE, count=rows * cols, offset=offset)
+        return array.reshape(rows, cols)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        The stored arrays of the texts (read-only 2D views, vectors have one row),
+        None for the texts not in the store.
+        """
+        digests = [text_digest(t) for t in texts]
+        with self._lock:
+            if any(d not in self._entries for d in digests):
+                self._refresh_index()
+            return [self._view(*self._entries[d]) if d in self._entries else None for d in digests]
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        return self.get_many([text])[0]
+
+    def put_many(self, texts: Sequence[str], arrays: Sequence[np.ndarray]) -> None:
+        """Store 1D (single vector) or 2D (one row per token, ...) arrays; known texts are skipped."""
+        with self._lock, self._write_lock():
+            self._refresh_index()
+            lines = []
+            with open(self._data_path, "ab") as data:
+                offset = data.seek(0, os.SEEK_END)
+                # keep every array aligned to the item size (after a torn write)
+                padding = -offset % _ITEMSIZE
+                if padding:
+                    data.write(b"\0" * padding)
+                    offset += padding
+                for text, array in zip(texts, arrays):
+                    digest = text_digest(text)
+                    if digest in self._entries:
+                        continue
+                    array = np.ascontiguousarray(array, dtype=DTYPE)
+                    rows, cols = (1, array.shape[0]) if array.ndim == 1 else array.shape
+                    data.write(array.tobytes())
+                    self._entries[digest] = (offset, rows, cols)
+                    lines.append(f"{digest} {offset} {rows} {cols}\n")
+                    offset += array.nbytes
+                data.flush()
+            if lines:
+                with open(self._index_path, "a", encoding="ascii") as index:
+                    index.write("".join(lines))
+                self._index_pos = self._index_path.stat().st_size
+
+    def put(self, text: str, array: np.ndarray) -> None:
+        self.put_many([text], [array])
+
+    @contextmanager
+    def _write_lock(self):
+        with open(self.path / "lock", "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                return
+            # msvcrt locks a byte range; LK_LOCK gives up after 10 attempts, so retry
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, Dict, Generator, Iterator, Optional
+
+from utils.metrics import metrics
+from .base import LLMProvider
+
+# Lanes in priority order: answers of already running requests first, then
+# query rewrites (new requests), evaluation traffic last.
+LANES = ("answer", "rewrite", "evaluation")
+
+# Request-scoped lane override (e.g. all LLM calls of an evaluation request
+# use the "evaluation" lane), set by the API handler.
+request_lane: ContextVar[Optional[str]] = ContextVar("request_lane", default=None)
+
+
+class AdmissionRejected(Exception):
+    """Raised when an LLM call is not admitted (queue full or waited too long)."""
+
+    def __init__(self, lane: str, reason: str, retry_after: int):
+        super().__init__(f"LLM capacity exhausted ({reason}) for '{lane}' traffic, retry in {retry_after}s")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+        # queue full -> client should back off, timeout -> server is overloaded
+        self.status_code = 429 if reason == "queue_full" else 503
+
+
+class _Ticket:
+    __slots__ = ("granted",)
+
+    def __init__(self):
+        self.granted = False
+
+
+class AdmissionController:
+    """
+    Limits the number of concurrent LLM calls of a process.
+
+    Calls beyond max_concurrent wait in a bounded queue per lane. A free slot is
+    always handed to the oldest waiter of the highest priority lane. Calls are
+    rejected right away when their lane's queue is full, or after waiting
+    queue_timeout seconds, so that under overload some requests are served
+    quickly instead of all of them timing out.
+    """
+
+    # weight of the newest sample in the moving average of the slot hold time
+    SMOOTHING = 0.2
+
+    def __init__(self, max_concurrent: int, max_queue: Dict[str, int], queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._queues: Dict[str, Deque[_Ticket]] = {lane: deque() for lane in LANES}
+        self._cond = threading.Condition()
+        self._avg_hold = 1.0
+
+    def _has_waiters(self) -> bool:
+        return any(self._queues[lane] for lane in LANES)
+
+    def _grant_next(self) -> None:
+        # called with the lock held
+        while self.active < self.max_concurrent:
+            for lane in LANES:
+                if self._queues[lane]:
+                    ticket = self._queues[lane].popleft()
+                    ticket.granted = True
+                    self.active += 1
+                    break
+            else:
+                return
+        self._cond.notify_all()
+
+    def _retry_after(self) -> int:
+        waiting = sum(len(q) for q in self._queues.values())
+        return max(1, int(round(self._avg_hold * (waiting + 1) / max(self.max_concurrent, 1))))
+
+    def acquire(self, lane: str) -> None:
+        start = time.perf_counter()
+        with self._cond:
+            if self.active < self.max_concurrent and not self._has_waiters():
+                self.active += 1
+                metrics.observe(f"llm.queue_seconds.{lane}", 0.0)
+                return
+
+            queue = self._queues[lane]
+            if len(queue) >= self.max_queue.get(lane, 0):
+                metrics.increment(f"llm.rejected.{lane}.queue_full")
+                raise AdmissionRejected(lane, "queue_full", self._retry_after())
+
+            ticket = _Ticket()
+            queue.append(ticket)
+            deadline = start + self.queue_timeout
+            while not ticket.granted:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    queue.remove(ticket)
+                    metrics.increment(f"llm.rejected.{lane}.timeout")
+                    raise AdmissionRejected(lane, "timeout", self._retry_after())
+                self._cond.wait(remaining)
+
+        metrics.observe(f"llm.queue_seconds.{lane}", time.perf_counter() - start)
+
+    def release(self, held_seconds: Optional[float] = None) -> None:
+        with self._cond:
+            self.active -= 1
+            if held_seconds is not None:
+                self._avg_hold = self.SMOOTHING * held_seconds + (1 - self.SMOOTHING) * self._avg_hold
+            self._grant_next()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "active": self.active,
+                "queued": {lane: len(self._queues[lane]) for lane in LANES},
+                "avg_hold_seconds": self._avg_hold,
+            }
+
+
+class _PermitStream:
+    """
+    Iterator over the wrapped token stream that releases the admission slot
+    once the stream is exhausted, fails or is closed (e.g. client disconnect).
+    """
+
+    def __init__(self, controller: AdmissionController, stream: Iterator[str]):
+        self._controller = controller
+        self._stream = stream
+        self._start = time.perf_counter()
+        self._released = False
+
+    def _release(self):
+        if not self._released:
+            self._released = True
+            self._controller.release(time.perf_counter() - self._start)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        try:
+            return next(self._stream)
+        except BaseException:
+            self._release()
+            raise
+
+    def close(self):
+        try:
+            close = getattr(self._stream, "close", None)
+            if close:
+                close()
+        finally:
+            self._release()
+
+    def __del__(self):
+        self._release()
+
+
+class AdmissionControlledProvider(LLMProvider):
+    """
+    Wraps an LLMProvider so that every call needs a slot of the controller.
+    The slot is acquired when generate_stream is called (not lazily on the first
+    token), so a rejection surfaces before the HTTP response is started.
+    """
+
+    def __init__(self, provider: LLMProvider, controller: AdmissionController, lane: str):
+        self.provider = provider
+        self.controller = controller
+        self.lane = lane
+
+    def generate_stream(self, system_prompt: str, user_prompt: str,
+                        options: Optional[Dict] = None) -> Generator[str, None, None]:
+        lane = request_lane.get() or self.lane
+        self.controller.acquire(lane)
+        return _PermitStream(self.controller, self.provider.generate_stream(system_prompt, user_prompt, options))
+
+    def __getattr__(self, name):
+        # metrics, preload(), model_name, ... of the wrapped provider
+        return getattr(self.provider, name)
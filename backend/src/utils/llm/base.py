@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Generator
+from typing import Dict, Generator, Optional
 
 
 class LLMProvider(ABC):
@@ -8,18 +8,23 @@ class LLMProvider(ABC):
     """
 
     @abstractmethod
-    def generate_stream(self, system_prompt: str, user_prompt: str) -> Generator[str, None, None]:
+    def generate_stream(self, system_prompt: str, user_prompt: str,
+                        options: Optional[Dict] = None) -> Generator[str, None, None]:
         """
         Generates a response token by token (streams the response)
 
+        Args:
+            options: per-call model options that override the provider defaults
+                     (e.g. num_predict, num_ctx, temperature)
+
         Returns:
             A Generator that yields tokens piece by piece.
         """
         pass
 
     # Optional method for non-streaming generation
-    def generate(self, system_prompt: str, user_prompt: str) -> str:
+    def generate(self, system_prompt: str, user_prompt: str, options: Optional[Dict] = None) -> str:
         full_response = ""
-        for chunk in self.generate_stream(system_prompt, user_prompt):
+        for chunk in self.generate_stream(system_prompt, user_prompt, options):
             full_response += chunk
-        return full_response
\ No newline at end of file
+        return full_response
@@ -0,0 +1,78 @@
+import threading
+from typing import Dict, List, Optional
+
+from config import config
+from .admission import AdmissionController, AdmissionControlledProvider
+from .base import LLMProvider
+from .ollama_provider import OllamaProvider
+from .router import LLMRouter, OllamaEndpoint
+
+_endpoints: Optional[List[OllamaEndpoint]] = None
+_admission: Optional[AdmissionController] = None
+_lock = threading.Lock()
+
+
+def get_endpoints() -> List[OllamaEndpoint]:
+    """The configured ollama hosts (LLM_ENDPOINTS), shared by all providers of the process."""
+    global _endpoints
+    if _endpoints is None:
+        with _lock:
+            if _endpoints is None:
+                _endpoints = [OllamaEndpoint(url) for url in config.LLM_ENDPOINTS]
+    return _endpoints
+
+
+def get_admission_controller() -> Optional[AdmissionController]:
+    """The admission controller shared by all providers of the process (None if disabled)."""
+    global _admission
+    if config.LLM_MAX_CONCURRENT <= 0:
+        return None
+    if _admission is None:
+        with _lock:
+            if _admission is None:
+                _admission = AdmissionController(
+                    max_concurrent=config.LLM_MAX_CONCURRENT,
+                    max_queue={
+                        "answer": config.LLM_MAX_QUEUE,
+                        "rewrite": config.LLM_MAX_QUEUE,
+                        "evaluation": config.LLM_MAX_QUEUE_EVALUATION,
+                    },
+                    queue_timeout=config.LLM_QUEUE_TIMEOUT,
+                )
+    return _admission
+
+
+def create_llm_provider(model_name: str, options: Optional[Dict] = None, lane: Optional[str] = None) -> LLMProvider:
+    """
+    Creates the provider for one call type (e.g. rewrite or answer generation).
+    A single configured host gets a plain OllamaProvider, several hosts get a
+    load-balancing LLMRouter. With a lane, calls go through the admission controller.
+    """
+    provider = _create_provider(model_name, options)
+    controller = get_admission_controller()
+    if lane and controller:
+        return AdmissionControlledProvider(provider, controller, lane)
+    return provider
+
+
+def _create_provider(model_name: str, options: Optional[Dict] = None) -> LLMProvider:
+    options = {k: v for k, v in (options or {}).items() if v is not None}
+    endpoints = get_endpoints()
+    if len(endpoints) == 1:
+        return OllamaProvider(
+            model_name=model_name,
+            base_url=endpoints[0].base_url,
+            keep_alive=config.LLM_KEEP_ALIVE,
+            options=options,
+        )
+    return LLMRouter(
+        endpoints,
+        model_name=model_name,
+        keep_alive=config.LLM_KEEP_ALIVE,
+        options=options,
+        health_check_interval=config.LLM_HEALTH_CHECK_INTERVAL,
+    )
+
+
+def get_endpoint_stats() -> List[Dict]:
+    return [endpoint.stats() for endpoint in get_endpoints()]
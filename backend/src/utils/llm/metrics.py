@@ -0,0 +1,44 @@
+import threading
+from typing import Dict
+
+
+class ProviderMetrics:
+    """
+    Aggregated Ollama timing metrics of one provider (thread-safe).
+
+    prompt_eval_count only counts the prompt tokens that actually had to be
+    evaluated, so a prompt prefix that was reused from the server's cache
+    shows up as a lower prompt_eval_count / prompt_eval_seconds per call.
+    A non-zero load_seconds means the model had to be (re)loaded.
+    """
+
+    FIELDS = ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration",
+              "load_duration", "total_duration")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.model_loads = 0
+        self.totals: Dict[str, int] = {field: 0 for field in self.FIELDS}
+
+    def record(self, data: dict) -> None:
+        with self._lock:
+            self.calls += 1
+            for field in self.FIELDS:
+                self.totals[field] += int(data.get(field, 0) or 0)
+            # loading an already resident model takes a few milliseconds only
+            if data.get("load_duration", 0) > 500_000_000:
+                self.model_loads += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            calls = max(self.calls, 1)
+            return {
+                "calls": self.calls,
+                "model_loads": self.model_loads,
+                "avg_prompt_eval_tokens": self.totals["prompt_eval_count"] / calls,
+                "avg_prompt_eval_seconds": self.totals["prompt_eval_duration"] / calls / 1e9,
+                "avg_load_seconds": self.totals["load_duration"] / calls / 1e9,
+                "avg_eval_tokens": self.totals["eval_count"] / calls,
+                "avg_total_seconds": self.totals["total_duration"] / calls / 1e9,
+            }
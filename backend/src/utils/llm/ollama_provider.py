@@ -1,8 +1,9 @@
 # src/utils/llm/ollama_provider.py
 import requests
 import json
-from typing import Generator
+from typing import Dict, Generator, Optional, Union
 from .base import LLMProvider
+from .metrics import ProviderMetrics
 import logging
 
 # Configure logging
@@ -10,20 +11,29 @@ logger = logging.getLogger(__name__)
 
 
 class OllamaProvider(LLMProvider):
-    def __init__(self, model_name: str = "llama3", base_url: str = "http://localhost:11434"):
+    def __init__(self, model_name: str = "llama3", base_url: str = "http://localhost:11434",
+                 keep_alive: Optional[Union[str, int]] = None, options: Optional[Dict] = None,
+                 metrics: Optional[ProviderMetrics] = None):
         """
         Args:
             model_name: name of the model
             base_url: url to the ollama service
                       ollama in docker: usually 'http://ollama:11434'
                       locally: probably 'http://localhost:11434'.
+            keep_alive: how long ollama keeps the model loaded after a request
+                        (e.g. '30m', -1 = forever, None = server default of 5 minutes)
+            options: default model options for every call (e.g. num_ctx, num_predict)
+            metrics: metrics object to record into (e.g. shared by the providers of a router)
         """
         self.model_name = model_name
         self.base_url = base_url
+        self.keep_alive = keep_alive
+        self.options = {"temperature": 0.1, **(options or {})}
+        self.metrics = metrics or ProviderMetrics()
 
-    def generate_stream(self, system_prompt: str, user_prompt: str) -> Generator[str, None, None]:
-        url = f"{self.base_url}/api/chat"
-
+    def _build_payload(self, system_prompt: str, user_prompt: str, options: Optional[Dict]) -> Dict:
+        # The system prompt always comes first and is sent byte-identical on every call,
+        # so ollama can reuse the already evaluated prompt prefix from its cache.
         payload = {
             "model": self.model_name,
             "messages": [
@@ -31,40 +41,74 @@ class OllamaProvider(LLMProvider):
                 {"role": "user", "content": user_prompt}
             ],
             "stream": True,
-            "options": {
-                "temperature": 0.1
-            }
+            "options": {**self.options, **(options or {})}
         }
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
 
+    def preload(self) -> bool:
+        """
+        Loads the model into memory without generating anything
+        (ollama loads the model for a chat request with an empty message list).
+        """
+        payload = {"model": self.model_name, "messages": [], "options": {
+            k: v for k, v in self.options.items() if k == "num_ctx"
+        }}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        try:
+            response = requests.post(f"{self.base_url}/api/chat", json=payload, timeout=120)
+            response.raise_for_status()
+            return True
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Could not preload model '{self.model_name}': {e}")
+            return False
+
+    def generate_stream(self, system_prompt: str, user_prompt: str,
+                        options: Optional[Dict] = None) -> Generator[str, None, None]:
         try:
-            # stream=True keeps connection open for streaming
-            with requests.post(url, json=payload, stream=True) as response:
-                response.raise_for_status()
+            yield from self.stream_chat(system_prompt, user_prompt, options)
+        except requests.exceptions.ConnectionError:
+            yield "Error: No connection to Ollama server. Please ensure the Ollama service is running and accessible."
+        except Exception as e:
+            yield f"Unexpected error occurred: {str(e)}"
 
-                # iterate the lines as they arrive
-                for line in response.iter_lines():
-                    if line:
-                        # lines from ollama
-                        decoded_line = line.decode('utf-8')
-                        data = json.loads(decoded_line)
+    def stream_chat(self, system_prompt: str, user_prompt: str,
+                    options: Optional[Dict] = None) -> Generator[str, None, None]:
+        """
+        Same as generate_stream, but connection and HTTP errors are raised
+        instead of being turned into an error message (used for failover).
+        """
+        url = f"{self.base_url}/api/chat"
 
-                        # extract the token from the response
-                        token = data.get("message", {}).get("content", "")
+        payload = self._build_payload(system_prompt, user_prompt, options)
 
-                        # stop if done
-                        if data.get("done", False):
-                            self._log_metrics(data)
-                            break
+        # stream=True keeps connection open for streaming
+        # (connect timeout only, the first token may take a while if the model has to be loaded)
+        with requests.post(url, json=payload, stream=True, timeout=(5, None)) as response:
+            response.raise_for_status()
 
-                        yield token
+            # iterate the lines as they arrive
+            for line in response.iter_lines():
+                if line:
+                    # lines from ollama
+                    decoded_line = line.decode('utf-8')
+                    data = json.loads(decoded_line)
 
-        except requests.exceptions.ConnectionError:
-            yield "Error: No connection to Ollama server. Please ensure the Ollama service is running and accessible."
-        except Exception as e:
-            yield f"Unexpected error occurred: {str(e)}"
+                    # extract the token from the response
+                    token = data.get("message", {}).get("content", "")
+
+                    # stop if done
+                    if data.get("done", False):
+                        self._log_metrics(data)
+                        break
 
+                    yield token
 
     def _log_metrics(self, data: dict) -> None:
+        self.metrics.record(data)
+
         # Prompt evaluation metrics
         prompt_eval_count = data.get("prompt_eval_count", 0)
         prompt_eval_duration_ns = data.get("prompt_eval_duration", 0)
@@ -91,7 +135,11 @@ class OllamaProvider(LLMProvider):
         total_duration_ns = data.get("total_duration", 0)
         total_sec = total_duration_ns / 1_000_000_000
 
-        logger.info(f"Ollama Metrics - Total response time: {total_sec:.2f}s")
+        # model load time (should be ~0 when the model is kept resident)
+        load_sec = data.get("load_duration", 0) / 1_000_000_000
+
+        logger.info(f"Ollama Metrics - Total response time: {total_sec:.2f}s "
+                    f"(load {load_sec:.2f}s, prompt eval {prompt_eval_count} tokens in {prompt_eval_sec:.2f}s)")
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug(f"Prompt Reading: {prompt_eval_count} tokens in {prompt_eval_sec:.2f}s ({rtps:.2f} tokens/s)")
             logger.debug(f"Generation: {eval_count} tokens in {eval_sec:.2f}s ({tps:.2f} tokens/s)")
@@ -0,0 +1,190 @@
+import logging
+import threading
+import time
+from typing import Dict, Generator, List, Optional, Set, Union
+
+import requests
+
+from .base import LLMProvider
+from .metrics import ProviderMetrics
+from .ollama_provider import OllamaProvider
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class OllamaEndpoint:
+    """
+    One ollama host with its load and health state.
+    The same endpoint objects are shared by all routers of a process, so the
+    outstanding request count covers rewrite and answer traffic together.
+    """
+
+    # weight of the newest sample in the moving latency average
+    LATENCY_SMOOTHING = 0.2
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.outstanding = 0
+        self.healthy = True
+        self.last_failure = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.avg_latency: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def begin(self):
+        with self._lock:
+            self.outstanding += 1
+            self.requests += 1
+
+    def end(self, latency: Optional[float] = None, failed: bool = False):
+        with self._lock:
+            self.outstanding -= 1
+            if failed:
+                self.errors += 1
+                self.healthy = False
+                self.last_failure = time.monotonic()
+            elif latency is not None:
+                self.healthy = True
+                if self.avg_latency is None:
+                    self.avg_latency = latency
+                else:
+                    a = self.LATENCY_SMOOTHING
+                    self.avg_latency = a * latency + (1 - a) * self.avg_latency
+
+    def check_health(self, timeout: float = 1.0) -> bool:
+        try:
+            healthy = requests.get(f"{self.base_url}/api/version", timeout=timeout).ok
+        except requests.exceptions.RequestException:
+            healthy = False
+        with self._lock:
+            self.healthy = healthy
+            if not healthy:
+                self.last_failure = time.monotonic()
+        return healthy
+
+    def probe(self, timeout: float = 1.0) -> None:
+        """Runs check_health in a background thread (at most one probe at a time)."""
+        with self._lock:
+            if self._probing:
+                return
+            self._probing = True
+
+        def run():
+            try:
+                self.check_health(timeout)
+            finally:
+                with self._lock:
+                    self._probing = False
+
+        threading.Thread(target=run, daemon=True, name="ollama-health-probe").start()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "base_url": self.base_url,
+                "healthy": self.healthy,
+                "outstanding": self.outstanding,
+                "requests": self.requests,
+                "errors": self.errors,
+                "avg_latency_seconds": self.avg_latency,
+            }
+
+
+class LLMRouter(LLMProvider):
+    """
+    LLMProvider that spreads the calls for one model over several ollama hosts.
+
+    - picks the healthy endpoint with the fewest outstanding requests
+      (ties are broken by the lower average latency)
+    - an endpoint that fails is marked unhealthy and the call fails over to
+      the next endpoint, as long as no token was streamed yet
+    - unhealthy endpoints are re-checked after health_check_interval seconds by a
+      background probe; requests pick from the last known state and never wait for it
+    """
+
+    def __init__(self, endpoints: List[OllamaEndpoint], model_name: str = "llama3",
+                 keep_alive: Optional[Union[str, int]] = None, options: Optional[Dict] = None,
+                 health_check_interval: float = 10.0):
+        if not endpoints:
+            raise ValueError("LLMRouter needs at least one endpoint")
+        self.endpoints = endpoints
+        self.model_name = model_name
+        self.health_check_interval = health_check_interval
+        self.metrics = ProviderMetrics()
+        self._providers = {
+            endpoint.base_url: OllamaProvider(
+                model_name=model_name,
+                base_url=endpoint.base_url,
+                keep_alive=keep_alive,
+                options=options,
+                metrics=self.metrics,
+            )
+            for endpoint in endpoints
+        }
+
+    def _pick(self, exclude: Set[str]) -> Optional[OllamaEndpoint]:
+        now = time.monotonic()
+        candidates = []
+        for endpoint in self.endpoints:
+            if endpoint.base_url in exclude:
+                continue
+            if not endpoint.healthy:
+                if now - endpoint.last_failure >= self.health_check_interval:
+                    endpoint.probe()
+                continue
+            candidates.append(endpoint)
+        if not candidates:
+            return None
+        return min(
+            candidates,
+            key=lambda e: (e.outstanding, e.avg_latency if e.avg_latency is not None else 0.0)
+        )
+
+    def generate_stream(self, system_prompt: str, user_prompt: str,
+                        options: Optional[Dict] = None) -> Generator[str, None, None]:
+        tried: Set[str] = set()
+        while True:
+            endpoint = self._pick(tried)
+            if endpoint is None:
+                yield "Error: No connection to Ollama server. Please ensure the Ollama service is running and accessible."
+                return
+            tried.add(endpoint.base_url)
+
+            provider = self._providers[endpoint.base_url]
+            streamed = False
+            done = False
+            start = time.perf_counter()
+            endpoint.begin()
+            try:
+                for token in provider.stream_chat(system_prompt, user_prompt, options):
+                    streamed = True
+                    yield token
+                done = True
+                endpoint.end(latency=time.perf_counter() - start)
+                return
+            except requests.exceptions.RequestException as e:
+                done = True
+                endpoint.end(failed=True)
+                logger.warning(f"Ollama endpoint {endpoint.base_url} failed: {e}")
+                if streamed:
+                    yield f"Unexpected error occurred: {str(e)}"
+                    return
+            except Exception as e:
+                done = True
+                endpoint.end()
+                yield f"Unexpected error occurred: {str(e)}"
+                return
+            finally:
+                # client disconnected / generator closed before the stream finished
+                if not done:
+                    endpoint.end()
+
+    def preload(self) -> bool:
+        results = [provider.preload() for provider in self._providers.values()]
+        return any(results)
+
+    def endpoint_stats(self) -> List[Dict]:
+        return [endpoint.stats() for endpoint in self.endpoints]
@@ -0,0 +1,38 @@
+import threading
+from typing import Dict
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process metrics (counters and timings), served by GET /api/metrics.
+    Values are per worker process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            timing = self._timings.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+            timing["count"] += 1
+            timing["sum"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "timings": {
+                    name: {**t, "avg": t["sum"] / t["count"] if t["count"] else 0.0}
+                    for name, t in self._timings.items()
+                },
+            }
+
+
+metrics = MetricsRegistry()
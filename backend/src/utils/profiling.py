@@ -0,0 +1,188 @@
+import itertools
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Iterable, Iterator, List, Optional
+
+import psycopg
+
+# Profile of the current request, set by the API handler for profiled requests
+# (see RequestProfile). Stages and EXPLAIN output are only recorded while it is set.
+current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+
+class SamplingProfiler:
+    """
+    Samples the call stack of one thread every interval seconds from a background
+    thread and counts the stacks (folded: "module:function;...;module:function",
+    outermost frame first, as used by flame graph tools).
+    """
+
+    # deeper frames are cut off, the interesting ones are near the leaf anyway
+    MAX_DEPTH = 64
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True, name="sampling-profiler")
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.MAX_DEPTH:
+                code = frame.f_code
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+
+class RequestProfile:
+    """Stage timings, EXPLAIN (ANALYZE, BUFFERS) plans and stack samples of one request."""
+
+    def __init__(self, endpoint: str, query: str, reason: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.endpoint = endpoint
+        self.query = query
+        # "header" (X-Profile) or "sampled" (PROFILE_SAMPLE_RATE)
+        self.reason = reason
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.total_seconds: Optional[float] = None
+        self.stages: List[Dict] = []
+        self.queries: List[Dict] = []
+        self.samples: Counter = Counter()
+        self.error: Optional[str] = None
+        self._profiler: Optional[SamplingProfiler] = None
+
+    def start_sampling(self, interval: float) -> None:
+        self._profiler = SamplingProfiler(threading.get_ident(), interval)
+        self._profiler.start()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        if self._profiler is not None:
+            self.samples = self._profiler.stop()
+            self._profiler = None
+        self.total_seconds = time.perf_counter() - self._started
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        self.stages.append({"name": name, "seconds": round(seconds, 6)})
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.id,
+            "endpoint": self.endpoint,
+            "query": self.query,
+            "reason": self.reason,
+            "startedAt": self.started_at,
+            "totalSeconds": self.total_seconds,
+            "error": self.error,
+        }
+
+    def to_dict(self, top_stacks: int = 50) -> Dict:
+        return {
+            **self.summary(),
+            "stages": self.stages,
+            "queries": self.queries,
+            "samples": sum(self.samples.values()),
+            "stacks": [{"stack": stack, "count": count} for stack, count in self.samples.most_common(top_stacks)],
+        }
+
+
+class ProfileStore:
+    """The last `size` captured profiles of this worker (oldest are dropped first)."""
+
+    def __init__(self, size: int):
+        self._profiles: Deque[RequestProfile] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+
+    def list(self) -> List[RequestProfile]:
+        """Newest first."""
+        with self._lock:
+            return list(reversed(self._profiles))
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        with self._lock:
+            return next((p for p in self._profiles if p.id == profile_id), None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Times a stage of the current request if it is profiled (no-op otherwise)."""
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    with profile.stage(name):
+        yield
+
+
+def explain(cur: psycopg.Cursor, sql: str, params) -> None:
+    """
+    Record the EXPLAIN (ANALYZE, BUFFERS) plan of a query that has just run on cur,
+    if the current request is profiled. The query is executed a second time for
+    it, so the plan shows the buffers of a warm cache.
+    """
+    profile = current_profile.get()
+    if profile is None:
+        return
+    try:
+        cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params)
+        plan = "\n".join(row[0] for row in cur.fetchall())
+    except psycopg.Error as e:
+        plan = f"EXPLAIN failed: {e}"
+    profile.queries.append({"sql": " ".join(sql.split()), "plan": plan})
+
+
+def profile_stream(profile: RequestProfile, stream: Iterable, on_finish) -> Iterator:
+    """
+    Pass the streamed answer through, timing it as the "generation" stage (and the
+    time to its first item), then finish the profile and hand it to on_finish.
+    """
+    error = None
+    start = time.perf_counter()
+    try:
+        iterator = iter(stream)
+        for item in itertools.islice(iterator, 1):
+            profile.add_stage("generation.first_token", time.perf_counter() - start)
+            yield item
+        yield from iterator
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        profile.add_stage("generation", time.perf_counter() - start)
+        profile.finish(error)
+        on_finish(profile)
@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, List, Optional
+
+import numpy as np
+
+
+@dataclass
+class ConversationState:
+    """
+    What a conversation's previous turns computed and a follow-up can reuse:
+    the rewritten queries (by query and history) and the last retrieval with the
+    embedding of its query.
+    """
+    rewrites: "OrderedDict[Hashable, str]" = field(default_factory=OrderedDict)
+    query_embedding: Optional[np.ndarray] = None
+    model_name: Optional[str] = None
+    retrieval_key: Optional[Hashable] = None
+    results: List = field(default_factory=list)
+
+    # a conversation rarely has more than a few rewrites that are asked again
+    max_rewrites = 16
+
+    def remember_rewrite(self, key: Hashable, rewritten: str) -> None:
+        self.rewrites[key] = rewritten
+        self.rewrites.move_to_end(key)
+        while len(self.rewrites) > self.max_rewrites:
+            self.rewrites.popitem(last=False)
+
+    @property
+    def faq_ids(self) -> List[int]:
+        return [r.faq_id for r in self.results]
+
+
+class SessionStore:
+    """
+    In-process store of conversation states, keyed by conversation id.
+
+    Least recently used conversations are evicted beyond max_sessions and states
+    expire ttl seconds after their last use. Every worker process has its own
+    store, a follow-up that lands on another worker simply starts a new state.
+    """
+
+    def __init__(self, max_sessions: int, ttl: float):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, tuple[float, ConversationState]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, conversation_id: str) -> ConversationState:
+        """The state of the conversation (a new one if it is unknown or expired)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(conversation_id)
+            if entry is None or now - entry[0] > self.ttl:
+                state = ConversationState()
+            else:
+                state = entry[1]
+            self._sessions[conversation_id] = (now, state)
+            self._sessions.move_to_end(conversation_id)
+            self._evict(now)
+            return state
+
+    def _evict(self, now: float) -> None:
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        # the oldest entries come first, stop at the first one that is still valid
+        while self._sessions:
+            used_at, _ = next(iter(self._sessions.values()))
+            if now - used_at <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"sessions": len(self._sessions)}
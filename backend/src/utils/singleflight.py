@@ -0,0 +1,113 @@
+import threading
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+
+class BroadcastBuffer:
+    """
+    Buffer that one producer appends items to and any number of consumers
+    read from. Every consumer starts at the first item, so consumers that
+    subscribe late still receive the complete stream.
+    """
+
+    def __init__(self):
+        self._items: List = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+
+    def append(self, item) -> None:
+        with self._cond:
+            self._items.append(item)
+            self._cond.notify_all()
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            self._done = True
+            self._error = error
+            self._cond.notify_all()
+
+    def subscribe(self) -> Iterator:
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self._items) and not self._done:
+                    self._cond.wait()
+                if i < len(self._items):
+                    # hand out everything that is available without holding the lock while yielding
+                    items = self._items[i:]
+                elif self._error is not None:
+                    raise self._error
+                else:
+                    return
+            i += len(items)
+            yield from items
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent executions with the same key.
+
+    The first caller (leader) starts the execution, callers with the same key
+    that arrive while it is still running join it and receive the same
+    items. The leader's iterable is consumed by a background thread, so a
+    disconnecting client does not cut off the others.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, BroadcastBuffer] = {}
+
+    def run(self, key: Hashable, start: Callable[[], Iterable]) -> Tuple[Iterator, bool]:
+        """
+        Runs start() for the key or joins the execution already in flight.
+
+        Args:
+            key: identifies identical requests
+            start: called by the leader only. Runs synchronously (so its errors reach
+                   the leader directly) and returns the iterable that is broadcast.
+
+        Returns:
+            A tuple (iterator, joined): the iterator yields the broadcast items,
+            joined is True if an in-flight execution was reused.
+        """
+        with self._lock:
+            buffer = self._inflight.get(key)
+            joined = buffer is not None
+            if not joined:
+                buffer = BroadcastBuffer()
+                self._inflight[key] = buffer
+
+        if joined:
+            return buffer.subscribe(), True
+
+        try:
+            iterable = start()
+        except BaseException as e:
+            self._finish(key, buffer)
+            buffer.close(e)
+            raise
+
+        thread = threading.Thread(target=self._drive, args=(key, buffer, iterable), daemon=True)
+        thread.start()
+        return buffer.subscribe(), False
+
+    def _drive(self, key: Hashable, buffer: BroadcastBuffer, iterable: Iterable) -> None:
+        error = None
+        try:
+            for item in iterable:
+                buffer.append(item)
+        except BaseException as e:
+            error = e
+        # unregister before closing, so a caller that saw the end of the stream
+        # never joins the finished execution
+        self._finish(key, buffer)
+        buffer.close(error)
+
+    def _finish(self, key: Hashable, buffer: BroadcastBuffer) -> None:
+        with self._lock:
+            if self._inflight.get(key) is buffer:
+                del self._inflight[key]
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._inflight)
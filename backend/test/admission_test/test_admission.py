@@ -0,0 +1,92 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
+
+from utils.llm.admission import AdmissionController, AdmissionControlledProvider, AdmissionRejected, request_lane
+from utils.llm.base import LLMProvider
+
+
+class FakeProvider(LLMProvider):
+    def generate_stream(self, system_prompt, user_prompt, options=None):
+        yield "a"
+        yield "b"
+
+
+class TestAdmissionController(unittest.TestCase):
+
+    def make(self, max_concurrent=1, queue=1, timeout=1.0):
+        return AdmissionController(
+            max_concurrent=max_concurrent,
+            max_queue={"answer": queue, "rewrite": queue, "evaluation": queue},
+            queue_timeout=timeout,
+        )
+
+    def test_rejects_when_queue_full(self):
+        controller = self.make(queue=0)
+        controller.acquire("answer")
+        with self.assertRaises(AdmissionRejected) as ctx:
+            controller.acquire("answer")
+        self.assertEqual(ctx.exception.status_code, 429)
+        self.assertGreaterEqual(ctx.exception.retry_after, 1)
+
+    def test_rejects_after_timeout(self):
+        controller = self.make(timeout=0.05)
+        controller.acquire("answer")
+        with self.assertRaises(AdmissionRejected) as ctx:
+            controller.acquire("rewrite")
+        self.assertEqual(ctx.exception.status_code, 503)
+        self.assertEqual(controller.stats()["queued"]["rewrite"], 0)
+
+    def test_higher_priority_lane_is_served_first(self):
+        controller = self.make(queue=2, timeout=2.0)
+        controller.acquire("answer")
+        order = []
+
+        def waiter(lane):
+            controller.acquire(lane)
+            order.append(lane)
+            controller.release()
+
+        threads = [threading.Thread(target=waiter, args=(lane,)) for lane in ("evaluation", "rewrite", "answer")]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        controller.release()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, ["answer", "rewrite", "evaluation"])
+
+    def test_provider_releases_slot_after_stream(self):
+        controller = self.make(queue=0)
+        provider = AdmissionControlledProvider(FakeProvider(), controller, "answer")
+
+        stream = provider.generate_stream("system", "user")
+        self.assertEqual(controller.stats()["active"], 1)
+        self.assertEqual(list(stream), ["a", "b"])
+        self.assertEqual(controller.stats()["active"], 0)
+
+        stream = provider.generate_stream("system", "user")
+        stream.close()
+        self.assertEqual(controller.stats()["active"], 0)
+
+    def test_request_lane_overrides_provider_lane(self):
+        controller = self.make()
+        controller.max_queue["evaluation"] = 0
+        provider = AdmissionControlledProvider(FakeProvider(), controller, "answer")
+        controller.acquire("answer")
+
+        token = request_lane.set("evaluation")
+        try:
+            with self.assertRaises(AdmissionRejected) as ctx:
+                provider.generate_stream("system", "user")
+        finally:
+            request_lane.reset(token)
+        self.assertEqual(ctx.exception.lane, "evaluation")
+
+
+if __name__ == '__main__':
+    unittest.main()
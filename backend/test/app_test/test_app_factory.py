@@ -0,0 +1,49 @@
+import unittest
+import sys
+import os
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
+
+from app import create_app, get_services
+from config import config
+
+
+class TestAppFactory(unittest.TestCase):
+    def test_create_app_does_not_touch_database(self):
+        app = create_app()
+        services = get_services(app)
+
+        # the connection pool is only opened on the first request that needs it
+        self.assertIsNone(services.indexing_service.pool)
+        self.assertIs(services.rag_pipeline.indexing_service, services.indexing_service)
+
+    def test_routes_are_registered(self):
+        app = create_app()
+        rules = {rule.rule for rule in app.url_map.iter_rules()}
+        for route in ("/api/upload", "/api/query", "/api/documents"):
+            self.assertIn(route, rules)
+
+    def test_query_requires_query(self):
+        client = create_app().test_client()
+        response = client.post("/api/query", json={"documentId": 1})
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_rejects_non_boolean_early_exit(self):
+        client = create_app().test_client()
+        response = client.post("/api/query", json={"query": "hi", "documentId": 1, "earlyExit": "false"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_profiles_need_a_configured_admin_token(self):
+        client = create_app().test_client()
+        with mock.patch.object(config, "PROFILING_ENABLED", True):
+            with mock.patch.object(config, "PROFILE_ADMIN_TOKEN", None):
+                self.assertEqual(client.get("/api/admin/profiles").status_code, 403)
+            with mock.patch.object(config, "PROFILE_ADMIN_TOKEN", "secret"):
+                self.assertEqual(client.get("/api/admin/profiles").status_code, 403)
+                response = client.get("/api/admin/profiles", headers={"X-Admin-Token": "secret"})
+                self.assertEqual(response.status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
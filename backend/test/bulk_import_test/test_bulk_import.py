@@ -0,0 +1,80 @@
+import importlib.util
+import io
+import json
+import os
+import struct
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
+
+from services.bulk_import import detect_format, read_faqs
+from services.pg_copy import _column_encoder
+
+
+class TestBulkImport(unittest.TestCase):
+
+    def test_detect_format(self):
+        self.assertEqual(detect_format("faqs.CSV", b""), "csv")
+        self.assertEqual(detect_format("faqs.jsonl", b""), "ndjson")
+        self.assertEqual(detect_format("export", b'  {"question": "q"}'), "ndjson")
+        self.assertEqual(detect_format("export", b"PAR1...."), "parquet")
+        self.assertEqual(detect_format("export", b"question,answer\n"), "csv")
+
+    def test_ndjson_with_embeddings(self):
+        rows = [
+            {"question": "q1", "answer": "a1", "question_embedding": [1, 0], "answer_embedding": [0, 1],
+             "embedding_model": "m"},
+            {"question": "", "answer": "skipped"},
+            {"question": "q2", "answer": "a2", "question_embedding": [0.5, 0.5], "answer_embedding": [1, 1]},
+        ]
+        content = "\n".join(json.dumps(r) for r in rows).encode()
+        batch = read_faqs(content, "ndjson")
+        self.assertEqual(batch.questions, ["q1", "q2"])
+        self.assertEqual(batch.embedding_model, "m")
+        self.assertEqual(batch.question_embeddings.dtype, np.float32)
+        np.testing.assert_array_equal(batch.answer_embeddings, [[0, 1], [1, 1]])
+
+    def test_ndjson_without_embeddings_for_every_row(self):
+        content = b'{"question": "q1", "answer": "a1", "question_embedding": [1], "answer_embedding": [1]}\n' \
+                  b'{"question": "q2", "answer": "a2"}\n'
+        batch = read_faqs(content, "ndjson")
+        self.assertEqual(len(batch), 2)
+        self.assertFalse(batch.has_embeddings)
+
+    def test_ndjson_line_must_be_an_object(self):
+        with self.assertRaisesRegex(ValueError, "Line 2 is not a JSON object"):
+            read_faqs(b'{"question": "q1", "answer": "a1"}\n[1, 2]\n', "ndjson")
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "needs pyarrow")
+    def test_parquet_embeddings_as_matrix(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        embs = np.arange(6, dtype=np.float32).reshape(3, 2)
+        table = pa.table({
+            "question": ["q1", None, "q3"],
+            "answer": ["a1", "a2", "a3"],
+            "question_embedding": pa.FixedSizeListArray.from_arrays(pa.array(embs.ravel()), 2),
+            "answer_embedding": pa.array(embs.tolist(), pa.list_(pa.float32())),
+        }).replace_schema_metadata({"embedding_model": "m"})
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer)
+
+        batch = read_faqs(buffer.getvalue(), "parquet")
+        self.assertEqual(batch.questions, ["q1", "q3"])
+        self.assertEqual(batch.embedding_model, "m")
+        np.testing.assert_array_equal(batch.question_embeddings, embs[[0, 2]])
+        np.testing.assert_array_equal(batch.answer_embeddings, embs[[0, 2]])
+
+    def test_binary_copy_encoding(self):
+        vector = _column_encoder("vector", np.array([[1.5, -2.0]], dtype=np.float32))(0)
+        # field length, dimension, unused, big-endian float32 values
+        self.assertEqual(vector, struct.pack(">ihhff", 12, 2, 0, 1.5, -2.0))
+        self.assertEqual(_column_encoder("text", ["ä"])(0), struct.pack(">i", 2) + "ä".encode())
+        self.assertEqual(_column_encoder("int4", [None])(0), struct.pack(">i", -1))
+
+
+if __name__ == '__main__':
+    unittest.main()
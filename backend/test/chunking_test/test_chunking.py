@@ -0,0 +1,46 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
+
+from services.chunking import FixedTokenChunker, SentenceWindowChunker, chunk_spans, create_chunker
+
+ANSWER = "Open the settings page. Click on security! Is it there? Choose reset password.\n\nThe link expires"
+
+
+class TestChunking(unittest.TestCase):
+
+    def test_sentence_window(self):
+        spans = SentenceWindowChunker(2).split(ANSWER)
+        self.assertEqual([ANSWER[s:e] for s, e in spans], [
+            "Open the settings page. Click on security!",
+            "Is it there? Choose reset password.",
+            "The link expires",
+        ])
+
+    def test_fixed_token_overlap(self):
+        spans = FixedTokenChunker(tokens_per_chunk=5, overlap=2).split(ANSWER)
+        chunks = [ANSWER[s:e].split() for s, e in spans]
+        self.assertTrue(all(len(c) <= 5 for c in chunks))
+        for previous, current in zip(chunks, chunks[1:]):
+            self.assertEqual(previous[-2:], current[:2])
+        # every token is covered, the last chunk ends with the text
+        self.assertEqual(spans[0][0], 0)
+        self.assertEqual(spans[-1][1], len(ANSWER))
+
+    def test_short_and_empty_answers_give_one_chunk(self):
+        self.assertEqual(chunk_spans(FixedTokenChunker(5, 2), "two words"), [(0, 9)])
+        self.assertEqual(chunk_spans(SentenceWindowChunker(2), ""), [(0, 0)])
+
+    def test_create_chunker(self):
+        self.assertIsNone(create_chunker("none"))
+        self.assertIsInstance(create_chunker("fixed-token"), FixedTokenChunker)
+        with self.assertRaises(ValueError):
+            create_chunker("paragraph")
+        with self.assertRaises(ValueError):
+            FixedTokenChunker(tokens_per_chunk=5, overlap=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
+
+from utils.embedding.base import EmbeddingProvider
+from utils.embedding.cached_provider import CachedEmbeddingProvider
+from utils.embedding.store import EmbeddingStore
+
+
+class CountingProvider(EmbeddingProvider):
+    def __init__(self):
+        super().__init__("counting")
+        self.encoded = []
+
+    def load(self):
+        pass
+
+    def encode(self, texts):
+        self.encoded.extend(texts)
+        return np.array([[len(t), 1.0, 2.0] for t in texts], dtype=np.float32).reshape(-1, 3)
+
+
+class TestEmbeddingStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_roundtrip_between_instances(self):
+        store = EmbeddingStore(self.tmp.name, "model/a")
+        store.put_many(["x", "y"], [np.arange(3), np.ones((2, 3))])
+
+        other = EmbeddingStore(self.tmp.name, "model/a")
+        x, y, z = other.get_many(["x", "y", "z"])
+        np.testing.assert_array_equal(x, [[0, 1, 2]])
+        self.assertEqual(y.shape, (2, 3))
+        self.assertIsNone(z)
+
+        # entries written later by another instance are picked up
+        store.put("z", np.full(3, 5.0))
+        np.testing.assert_array_equal(other.get("z"), [[5, 5, 5]])
+
+    def test_cached_provider_encodes_each_text_once(self):
+        inner = CountingProvider()
+        provider = CachedEmbeddingProvider(inner, EmbeddingStore(self.tmp.name, "counting"))
+
+        first = provider.encode(["a", "bb", "a"])
+        second = provider.encode(["bb", "ccc"])
+
+        self.assertEqual(inner.encoded, ["a", "bb", "ccc"])
+        self.assertEqual(first.shape, (3, 3))
+        np.testing.assert_array_equal(second[:, 0], [2, 3])
+        np.testing.assert_array_equal(provider.encode_one("a"), [1, 1, 2])
+
+    def test_queries_are_looked_up_but_not_stored(self):
+        inner = CountingProvider()
+        store = EmbeddingStore(self.tmp.name, "counting")
+        provider = CachedEmbeddingProvider(inner, store)
+        provider.encode(["indexed faq"])
+
+        np.testing.assert_array_equal(provider.encode_query("indexed faq"), [11, 1, 2])
+        np.testing.assert_array_equal(provider.encode_query("typed query"), [11, 1, 2])
+        self.assertEqual(inner.encoded, ["indexed faq", "typed query"])
+        self.assertEqual(len(store), 1)
+        self.assertIsNone(store.get("typed query"))
+
+    def test_cached_provider_empty_input(self):
+        provider = CachedEmbeddingProvider(CountingProvider(), EmbeddingStore(self.tmp.name, "counting"))
+        self.assertEqual(provider.encode([]).shape, (0, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,9 +2,10 @@ import unittest
 import sys
 import os
 
-from backend.src.services.generation_service import GenerationService
+# the backend modules import each other relative to backend/src
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+from services.generation_service import GenerationService
 
 
 class TestGenerationService(unittest.TestCase):
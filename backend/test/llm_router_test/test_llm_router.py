@@ -0,0 +1,94 @@
+import unittest
+import sys
+import os
+import time
+from unittest import mock
+
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
+
+from utils.llm.ollama_provider import OllamaProvider
+from utils.llm.router import LLMRouter, OllamaEndpoint
+
+
+def fake_stream_chat(self, system_prompt, user_prompt, options=None):
+    if "down" in self.base_url:
+        raise requests.exceptions.ConnectionError("connection refused")
+    yield f"answer from {self.base_url}"
+
+
+class TestLLMRouter(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(OllamaProvider, "stream_chat", fake_stream_chat)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_picks_endpoint_with_fewest_outstanding_requests(self):
+        busy = OllamaEndpoint("http://busy:11434")
+        idle = OllamaEndpoint("http://idle:11434")
+        busy.begin()
+        router = LLMRouter([busy, idle])
+
+        answer = router.generate("system", "user")
+
+        self.assertEqual(answer, "answer from http://idle:11434")
+        self.assertEqual(idle.outstanding, 0)
+        self.assertEqual(idle.requests, 1)
+        self.assertIsNotNone(idle.avg_latency)
+
+    def test_fails_over_to_next_endpoint(self):
+        down = OllamaEndpoint("http://down:11434")
+        up = OllamaEndpoint("http://up:11434")
+        router = LLMRouter([down, up])
+
+        answer = router.generate("system", "user")
+
+        self.assertEqual(answer, "answer from http://up:11434")
+        self.assertFalse(down.healthy)
+        self.assertEqual(down.errors, 1)
+        self.assertEqual(down.outstanding, 0)
+
+    def test_unhealthy_endpoint_is_skipped_until_recheck(self):
+        down = OllamaEndpoint("http://down:11434")
+        up = OllamaEndpoint("http://up:11434")
+        router = LLMRouter([down, up], health_check_interval=60)
+        router.generate("system", "user")
+
+        with mock.patch.object(OllamaEndpoint, "check_health") as check_health:
+            router.generate("system", "user")
+            check_health.assert_not_called()
+        self.assertEqual(down.requests, 1)
+
+    def test_recheck_runs_in_the_background(self):
+        down = OllamaEndpoint("http://down:11434")
+        up = OllamaEndpoint("http://up:11434")
+        router = LLMRouter([down, up], health_check_interval=0)
+        router.generate("system", "user")
+
+        with mock.patch.object(OllamaEndpoint, "probe") as probe, \
+                mock.patch.object(OllamaEndpoint, "check_health") as check_health:
+            self.assertEqual(router.generate("system", "user"), "answer from http://up:11434")
+            probe.assert_called_once()
+            check_health.assert_not_called()
+
+        # the probe marks the endpoint healthy again for the following requests
+        with mock.patch("utils.llm.router.requests.get") as get:
+            get.return_value.ok = True
+            down.probe()
+            for _ in range(100):
+                if down.healthy:
+                    break
+                time.sleep(0.01)
+        self.assertTrue(down.healthy)
+
+    def test_all_endpoints_down_yields_error_message(self):
+        router = LLMRouter([OllamaEndpoint("http://down-1:11434"), OllamaEndpoint("http://down-2:11434")])
+
+        answer = router.generate("system", "user")
+
+        self.assertTrue(answer.startswith("Error: No connection to Ollama server"))
+
+
+if __name__ == '__main__':
+    unittest.main()
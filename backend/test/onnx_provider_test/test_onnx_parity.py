@@ -0,0 +1,118 @@
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
+
+from utils.embedding.onnx_provider import OnnxEmbeddingProvider
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+# set to a directory with the exported model (onnx/*.onnx, tokenizer.json) to run offline
+ONNX_PATH = os.getenv("EMBEDDING_ONNX_PATH") or None
+
+SENTENCES = [
+    "How do I reset my password?",
+    "What is your refund policy for damaged products?",
+    "Can I change the delivery address after placing an order?",
+    "opening hours",
+    "My invoice shows a payment that I did not make, who can I contact about it and how long "
+    "does it usually take until the amount is returned to my credit card?",
+]
+
+
+def _available(*modules):
+    return all(importlib.util.find_spec(m) is not None for m in modules)
+
+
+@unittest.skipUnless(_available("sentence_transformers", "onnxruntime", "tokenizers"),
+                     "needs sentence_transformers, onnxruntime and tokenizers")
+class TestOnnxParity(unittest.TestCase):
+    """Cosine agreement of the ONNX backend with the sentence-transformers model."""
+
+    @classmethod
+    def setUpClass(cls):
+        from utils.embedding.sentence_transformer_provider import SentenceTransformerProvider
+        try:
+            cls.reference_provider = SentenceTransformerProvider(MODEL_NAME)
+            cls.reference = cls.reference_provider.encode(SENTENCES)
+        except Exception as e:
+            raise unittest.SkipTest(f"model not available: {e}")
+
+    def assert_parity(self, model_file, min_cosine):
+        provider = OnnxEmbeddingProvider(MODEL_NAME, model_file=model_file, model_dir=ONNX_PATH)
+        try:
+            provider.load()
+        except Exception as e:
+            self.skipTest(f"{model_file} not available: {e}")
+
+        embs = provider.encode(SENTENCES)
+        self.assertEqual(embs.shape, self.reference.shape)
+        self.assertEqual(embs.dtype, np.float32)
+        cosine = (embs * self.reference).sum(axis=1) / (
+            np.linalg.norm(embs, axis=1) * np.linalg.norm(self.reference, axis=1))
+        self.assertGreaterEqual(cosine.min(), min_cosine, cosine)
+
+        # the ranking of the sentences for a query must not change
+        query = provider.encode(["forgot my password"])[0]
+        reference_query = self.reference_provider.encode(["forgot my password"])[0]
+        self.assertEqual(int(np.argmax(embs @ query)), int(np.argmax(self.reference @ reference_query)))
+
+    def test_float32_export(self):
+        self.assert_parity("onnx/model.onnx", 0.999)
+
+    def test_int8_export(self):
+        self.assert_parity("onnx/model_quint8_avx2.onnx", 0.98)
+
+
+@unittest.skipUnless(_available("onnx", "onnxruntime", "tokenizers"), "needs onnx, onnxruntime and tokenizers")
+class TestOnnxProvider(unittest.TestCase):
+    """A tiny model (an embedding lookup of dimension 4) and a word level tokenizer."""
+
+    @classmethod
+    def setUpClass(cls):
+        import onnx
+        from onnx import TensorProto, helper, numpy_helper
+        from tokenizers import Tokenizer, models, pre_tokenizers
+
+        cls.model_dir = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(cls.model_dir.name, "onnx"))
+
+        tokenizer = Tokenizer(models.WordLevel({"[UNK]": 0, "hello": 1, "world": 2}, unk_token="[UNK]"))
+        tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+        tokenizer.save(os.path.join(cls.model_dir.name, "tokenizer.json"))
+
+        table = numpy_helper.from_array(np.arange(12, dtype=np.float32).reshape(3, 4), "table")
+        graph = helper.make_graph(
+            [helper.make_node("Gather", ["table", "input_ids"], ["last_hidden_state"])],
+            "embedding",
+            [helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "sequence"]),
+             helper.make_tensor_value_info("attention_mask", TensorProto.INT64, ["batch", "sequence"])],
+            [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "sequence", 4])],
+            [table],
+        )
+        model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+        model.ir_version = 8
+        onnx.save(model, os.path.join(cls.model_dir.name, "onnx", "model.onnx"))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.model_dir.cleanup()
+
+    def test_encodes_texts(self):
+        embs = OnnxEmbeddingProvider("tiny", model_dir=self.model_dir.name).encode(["hello", "hello world"])
+        self.assertEqual(embs.shape, (2, 4))
+        self.assertEqual(embs.dtype, np.float32)
+        np.testing.assert_allclose(np.linalg.norm(embs, axis=1), 1.0, rtol=1e-6)
+
+    def test_no_texts_keep_the_dimension(self):
+        embs = OnnxEmbeddingProvider("tiny", model_dir=self.model_dir.name).encode([])
+        self.assertEqual(embs.shape, (0, 4))
+        self.assertEqual(embs.dtype, np.float32)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
+
+from config import config
+from pipeline import RAGPipeline
+from services.prompt.prompts_library import RAGPrompts
+from services.retrieval_service import RetrievalResult
+
+
+class FakeRetrieval:
+    def __init__(self, similarity, results=None):
+        self.similarity = similarity
+        self.results = results if results is not None else [RetrievalResult(1, "question", "chunk", 0.2)]
+        self.retrieved = False
+
+    def find_matching_faq(self, query, document_id, indexing_service):
+        return RetrievalResult(faq_id=1, question=query, answer="Stored answer.", distance=1 - self.similarity)
+
+    def prefetched_results(self, query, document_id, indexing_service, k=None, min_similarity=None):
+        return None
+
+    def retrieve_documents(self, optimized_query, document_id, indexing_service, k=None, min_similarity=None):
+        self.retrieved = True
+        return self.results[:k]
+
+
+class FakeRewriting:
+    def rewrite_query(self, query, chat_history=None):
+        return {"original_query": query, "cleaned_query": query}
+
+
+class FakeGeneration:
+    def generate_response_stream(self, query, retrieved_chunks, k):
+        return iter(["Generated answer."])
+
+
+class TestEarlyExit(unittest.TestCase):
+
+    def make_pipeline(self, similarity, results=None):
+        retrieval = FakeRetrieval(similarity, results)
+        pipeline = RAGPipeline(
+            indexing_service=object(),
+            query_rewriting_service=FakeRewriting(),
+            retrieval_service=retrieval,
+            generation_service=FakeGeneration(),
+        )
+        return pipeline, retrieval
+
+    def test_returns_stored_answer_above_threshold(self):
+        pipeline, retrieval = self.make_pipeline(config.EARLY_EXIT_THRESHOLD + 0.01)
+        answer = list(pipeline.run_rag_pipeline("question", 1, [], early_exit=True))
+        self.assertEqual(answer, ["Stored answer."])
+        self.assertFalse(retrieval.retrieved)
+
+    def test_generates_below_threshold(self):
+        pipeline, retrieval = self.make_pipeline(config.EARLY_EXIT_THRESHOLD - 0.1)
+        answer = list(pipeline.run_rag_pipeline("question", 1, [], early_exit=True))
+        self.assertEqual(answer, ["Generated answer."])
+        self.assertTrue(retrieval.retrieved)
+
+    def test_disabled(self):
+        pipeline, _ = self.make_pipeline(1.0)
+        answer = list(pipeline.run_rag_pipeline("question", 1, [], early_exit=False))
+        self.assertEqual(answer, ["Generated answer."])
+
+    def test_empty_context_skips_generation(self):
+        pipeline, retrieval = self.make_pipeline(0.0, results=[])
+        answer = list(pipeline.run_rag_pipeline("question", 1, [], early_exit=True))
+        self.assertEqual(answer, [RAGPrompts.NO_CONTEXT_ANSWER])
+        self.assertTrue(retrieval.retrieved)
+
+
+if __name__ == '__main__':
+    unittest.main()
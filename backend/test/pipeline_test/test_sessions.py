@@ -0,0 +1,137 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
+
+from pipeline import RAGPipeline
+from services.retrieval_service import RetrievalResult
+from utils.session_store import SessionStore
+
+
+class FakeIndexing:
+    model_name = "fake-model"
+
+
+class FakeRetrieval:
+    # the "embedding" of a query is the vector stored for it here
+    embeddings = {
+        "reset password": np.array([1.0, 0.0, 0.0]),
+        "reset password steps": np.array([0.99, 0.1, 0.0]),
+        "refund policy": np.array([0.0, 1.0, 0.0]),
+    }
+
+    def __init__(self):
+        self.searches = 0
+
+    def embed_query(self, query, indexing_service):
+        return self.embeddings[query]
+
+    def prefetched_results(self, query, document_id, indexing_service, k=None, min_similarity=None):
+        return None
+
+    def retrieve_documents(self, optimized_query, document_id, indexing_service, k=None, min_similarity=None,
+                           query_embedding=None):
+        self.searches += 1
+        return [RetrievalResult(self.searches, optimized_query, "answer", 0.1)]
+
+
+class FakeRewriting:
+    def __init__(self):
+        self.calls = 0
+
+    def rewrite_query(self, query, chat_history=None):
+        self.calls += 1
+        return {"original_query": query, "cleaned_query": query}
+
+
+class FakeGeneration:
+    def __init__(self):
+        self.contexts = []
+
+    def generate_response_stream(self, query, retrieved_chunks, k):
+        self.contexts.append([c.faq_id for c in retrieved_chunks])
+        return iter(["answer"])
+
+
+class TestSessions(unittest.TestCase):
+
+    def setUp(self):
+        self.retrieval = FakeRetrieval()
+        self.rewriting = FakeRewriting()
+        self.generation = FakeGeneration()
+        self.pipeline = RAGPipeline(
+            indexing_service=FakeIndexing(),
+            query_rewriting_service=self.rewriting,
+            retrieval_service=self.retrieval,
+            generation_service=self.generation,
+        )
+
+    def ask(self, query, history=(), conversation_id="c1", document_id=1):
+        return list(self.pipeline.run_rag_pipeline(query, document_id, list(history), early_exit=False,
+                                                   conversation_id=conversation_id))
+
+    def test_follow_up_on_the_same_topic_reuses_the_retrieval(self):
+        self.ask("reset password")
+        self.ask("reset password steps", history=[{"role": "user", "content": "reset password"}])
+        self.assertEqual(self.retrieval.searches, 1)
+        self.assertEqual(self.generation.contexts, [[1], [1]])
+
+        # another topic, another scope or another conversation searches again
+        self.ask("refund policy", history=[{"role": "user", "content": "reset password steps"}])
+        self.ask("refund policy", document_id=2)
+        self.ask("refund policy", conversation_id="c2")
+        self.assertEqual(self.retrieval.searches, 4)
+
+    def test_same_question_with_same_history_is_not_rewritten_again(self):
+        history = [{"role": "user", "content": "hello"}]
+        self.ask("reset password", history)
+        self.ask("Reset  password", history)
+        self.assertEqual(self.rewriting.calls, 1)
+        self.ask("reset password", history + [{"role": "assistant", "content": "hi"}])
+        self.assertEqual(self.rewriting.calls, 2)
+
+    def test_conversations_are_not_coalesced_with_each_other(self):
+        keys = []
+
+        def run(key, start):
+            keys.append(key)
+            return start(), False
+
+        with mock.patch.object(self.pipeline.single_flight, "run", side_effect=run):
+            self.ask("reset password", conversation_id="c1")
+            self.ask("reset password", conversation_id="c2")
+            self.ask("reset password", conversation_id=None)
+            self.ask("reset password", conversation_id=None)
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEqual(keys[2], keys[3])
+
+    def test_without_conversation_id_nothing_is_kept(self):
+        self.ask("reset password", conversation_id=None)
+        self.ask("reset password", conversation_id=None)
+        self.assertEqual(self.retrieval.searches, 2)
+        self.assertEqual(len(self.pipeline.sessions), 0)
+
+
+class TestSessionStore(unittest.TestCase):
+
+    def test_lru_eviction_and_ttl(self):
+        store = SessionStore(max_sessions=2, ttl=60)
+        with mock.patch("utils.session_store.time.monotonic", return_value=0):
+            store.get("a").results = ["a"]
+            store.get("b")
+            store.get("a")
+            store.get("c")  # evicts b, the least recently used
+        self.assertEqual(len(store), 2)
+        with mock.patch("utils.session_store.time.monotonic", return_value=30):
+            self.assertEqual(store.get("a").results, ["a"])
+        with mock.patch("utils.session_store.time.monotonic", return_value=100):
+            self.assertEqual(store.get("a").results, [])
+            self.assertEqual(len(store), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,213 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
+
+from config import config
+from pipeline import RAGPipeline
+from services.retrieval_service import RetrievalResult, RetrievalService
+from utils.embedding.base import EmbeddingProvider
+from utils.embedding.cached_provider import CachedEmbeddingProvider
+from utils.embedding.store import EmbeddingStore
+from utils.prefetch import PrefetchCache, TokenBucketLimiter
+
+
+class FakeIndexing:
+    model_name = "fake-model"
+    chunker = None
+
+    def refresh_embedding_model(self, force=False):
+        pass
+
+
+class FakeProvider:
+    def __init__(self):
+        self.encoded = []
+
+    def encode_query(self, text):
+        self.encoded.append(text)
+        return np.array([1.0, 0.0])
+
+
+class FixedProvider(EmbeddingProvider):
+    def __init__(self):
+        super().__init__("fake-model")
+
+    def load(self):
+        pass
+
+    def encode(self, texts):
+        return np.ones((len(texts), 2), dtype=np.float32)
+
+
+class CountingRetrieval(RetrievalService):
+    """Searches return one result per call and are counted per column."""
+
+    def __init__(self):
+        super().__init__()
+        self.searches = []
+
+    def _query_nearest(self, query, document_id, indexing_service, column, k, query_embedding=None):
+        self.searches.append(column)
+        return [RetrievalResult(len(self.searches), query, "answer", 0.1)]
+
+
+class CountingRewriting:
+    def __init__(self):
+        self.calls = 0
+
+    def rewrite_query(self, query, chat_history=None):
+        self.calls += 1
+        return {"original_query": query, "cleaned_query": f"{query} (rewritten)"}
+
+
+class FakeGeneration:
+    def generate_response_stream(self, query, retrieved_chunks, k):
+        return iter([c.answer for c in retrieved_chunks])
+
+
+class TestTokenBucketLimiter(unittest.TestCase):
+    def test_burst_then_refill(self):
+        with mock.patch("utils.prefetch.time.monotonic", return_value=100.0) as clock:
+            limiter = TokenBucketLimiter(rate=2, burst=3)
+            self.assertEqual([limiter.acquire("a") for _ in range(3)], [0.0, 0.0, 0.0])
+            self.assertAlmostEqual(limiter.acquire("a"), 0.5)
+            # other clients have their own bucket
+            self.assertEqual(limiter.acquire("b"), 0.0)
+
+            clock.return_value = 100.5
+            self.assertEqual(limiter.acquire("a"), 0.0)
+            self.assertGreater(limiter.acquire("a"), 0.0)
+
+    def test_tracked_clients_are_bounded(self):
+        limiter = TokenBucketLimiter(rate=1, burst=1, max_clients=2)
+        for client in ("a", "b", "c"):
+            limiter.acquire(client)
+        self.assertEqual(list(limiter._buckets), ["b", "c"])
+
+
+class TestPrefetchCache(unittest.TestCase):
+    def test_entries_expire(self):
+        with mock.patch("utils.prefetch.time.monotonic", return_value=0.0) as clock:
+            cache = PrefetchCache(max_entries=10, ttl=60)
+            cache.put("q", [1])
+            clock.return_value = 59.0
+            self.assertEqual(cache.get("q"), [1])
+            clock.return_value = 61.0
+            self.assertIsNone(cache.get("q"))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = PrefetchCache(max_entries=2, ttl=60)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+
+
+class TestRetrievalPrefetch(unittest.TestCase):
+    def setUp(self):
+        self.provider = FakeProvider()
+        patcher = mock.patch("services.retrieval_service.get_embedding_provider", return_value=self.provider)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.indexing = FakeIndexing()
+        self.retrieval = CountingRetrieval()
+
+    def test_query_after_prefetch_skips_embedding_and_search(self):
+        suggestions = self.retrieval.prefetch("reset my password", "1", self.indexing, k=3, questions=2)
+        self.assertEqual(len(suggestions), 1)
+        self.assertEqual(self.provider.encoded, ["reset my password"])
+        self.assertEqual(self.retrieval.searches, ["answer_embedding", "question_embedding"])
+
+        # same text (up to whitespace) and scope: nothing is computed again
+        self.retrieval.embed_query("reset  my password", self.indexing)
+        self.retrieval.retrieve_documents("reset my password ", "1", self.indexing, k=3)
+        self.retrieval.find_matching_faq("reset my password", "1", self.indexing)
+        self.assertEqual(len(self.provider.encoded), 1)
+        self.assertEqual(len(self.retrieval.searches), 2)
+
+    def test_other_scope_or_k_searches_again_with_prefetched_embedding(self):
+        self.retrieval.prefetch("reset my password", "1", self.indexing, k=3)
+        self.retrieval.retrieve_documents("reset my password", "2", self.indexing, k=3)
+        self.retrieval.retrieve_documents("reset my password", "1", self.indexing, k=5)
+        self.assertEqual(len(self.provider.encoded), 1)
+        self.assertEqual(len(self.retrieval.searches), 3)
+
+    def test_without_prefetch_nothing_is_cached(self):
+        self.retrieval.retrieve_documents("refund policy", "1", self.indexing, k=3)
+        self.retrieval.retrieve_documents("refund policy", "1", self.indexing, k=3)
+        self.assertEqual(len(self.retrieval.searches), 2)
+
+    def test_partial_queries_are_not_written_to_the_embedding_store(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = EmbeddingStore(tmp, "fake-model")
+            provider = CachedEmbeddingProvider(FixedProvider(), store)
+            with mock.patch("services.retrieval_service.get_embedding_provider", return_value=provider):
+                self.retrieval.prefetch("reset my pa", "1", self.indexing, k=3, questions=2)
+                self.retrieval.embed_query("reset my pass", self.indexing)
+            self.assertEqual(len(store), 0)
+
+    def test_cleared_cache_searches_again(self):
+        self.retrieval.prefetch("reset my password", "1", self.indexing, k=3)
+        self.retrieval.prefetched.clear()
+        self.assertIsNone(self.retrieval.prefetched_results("reset my password", "1", self.indexing, k=3))
+
+
+class TestPipelinePrefetch(unittest.TestCase):
+    def setUp(self):
+        self.provider = FakeProvider()
+        patcher = mock.patch("services.retrieval_service.get_embedding_provider", return_value=self.provider)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.retrieval = CountingRetrieval()
+        self.rewriting = CountingRewriting()
+        self.pipeline = RAGPipeline(
+            indexing_service=FakeIndexing(),
+            query_rewriting_service=self.rewriting,
+            retrieval_service=self.retrieval,
+            generation_service=FakeGeneration(),
+        )
+
+    def ask(self, query, history=()):
+        return list(self.pipeline.run_rag_pipeline(query, "1", list(history), early_exit=False,
+                                                   conversation_id="c1"))
+
+    def test_prefetched_query_is_still_rewritten(self):
+        self.pipeline.prefetch("reset my password", "1")
+        self.ask("reset my password")
+        self.assertEqual(self.rewriting.calls, 1)
+        # the rewritten query has another text, so it is embedded and searched
+        self.assertEqual(self.provider.encoded, ["reset my password", "reset my password (rewritten)"])
+        self.assertEqual(self.retrieval.searches, ["answer_embedding", "answer_embedding"])
+
+    def test_rewritten_query_with_the_prefetched_text_skips_embedding_and_search(self):
+        self.rewriting.rewrite_query = lambda query, chat_history=None: {"cleaned_query": query}
+        self.pipeline.prefetch("reset my password", "1")
+        self.ask("reset my password")
+        self.assertEqual(self.provider.encoded, ["reset my password"])
+        self.assertEqual(self.retrieval.searches, ["answer_embedding"])
+
+    def test_skipping_the_rewrite_is_opt_in(self):
+        self.pipeline.prefetch("reset my password", "1")
+        with mock.patch.object(config, "PREFETCH_SKIP_REWRITE", True):
+            self.ask("reset my password")
+        self.assertEqual(self.rewriting.calls, 0)
+        self.assertEqual(self.provider.encoded, ["reset my password"])
+        self.assertEqual(self.retrieval.searches, ["answer_embedding"])
+
+    def test_follow_up_is_rewritten_and_searched(self):
+        self.pipeline.prefetch("reset my password", "1")
+        self.ask("reset my password", history=[{"role": "user", "content": "hello"}])
+        self.assertEqual(self.rewriting.calls, 1)
+        self.assertEqual(self.retrieval.searches, ["answer_embedding", "answer_embedding"])
+
+
+if __name__ == "__main__":
+    unittest.main()
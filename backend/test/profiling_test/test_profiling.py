@@ -0,0 +1,71 @@
+import unittest
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
+
+from utils.profiling import ProfileStore, RequestProfile, current_profile, profile_stream, stage
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestProfiling(unittest.TestCase):
+    def test_stages_are_recorded_only_for_profiled_requests(self):
+        with stage("retrieval"):
+            pass  # no profile: nothing to record, no error
+
+        profile = RequestProfile("/api/query", "q", "header")
+        token = current_profile.set(profile)
+        try:
+            with stage("retrieval"):
+                pass
+        finally:
+            current_profile.reset(token)
+        self.assertEqual([s["name"] for s in profile.stages], ["retrieval"])
+
+    def test_stream_finishes_profile(self):
+        profile = RequestProfile("/api/query", "q", "header")
+        profile.start_sampling(0.001)
+        finished = []
+
+        def tokens():
+            for t in ["a", "b"]:
+                busy_wait(0.02)
+                yield t
+
+        self.assertEqual(list(profile_stream(profile, tokens(), finished.append)), ["a", "b"])
+        self.assertEqual(finished, [profile])
+        self.assertEqual([s["name"] for s in profile.stages], ["generation.first_token", "generation"])
+        self.assertGreaterEqual(profile.total_seconds, 0.04)
+        # the samples show where the time went
+        self.assertTrue(any("busy_wait" in stack for stack in profile.samples))
+
+    def test_stream_error_is_recorded(self):
+        profile = RequestProfile("/api/query", "q", "sampled")
+
+        def failing():
+            yield "a"
+            raise RuntimeError("LLM down")
+
+        with self.assertRaises(RuntimeError):
+            list(profile_stream(profile, failing(), lambda p: None))
+        self.assertEqual(profile.error, "RuntimeError: LLM down")
+
+    def test_store_keeps_newest_profiles(self):
+        store = ProfileStore(size=2)
+        profiles = [RequestProfile("/api/query", f"q{i}", "header") for i in range(3)]
+        for p in profiles:
+            store.add(p)
+
+        self.assertEqual(store.list(), [profiles[2], profiles[1]])
+        self.assertIsNone(store.get(profiles[0].id))
+        self.assertIs(store.get(profiles[1].id), profiles[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
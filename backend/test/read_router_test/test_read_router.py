@@ -0,0 +1,66 @@
+import unittest
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
+
+from services.read_router import ReadReplica, ReadRouter
+
+
+class FakeReplica(ReadReplica):
+    """A replica whose lag check returns a preset lag (None = not reachable)."""
+
+    def __init__(self, name, lag):
+        super().__init__(name, "", {})
+        self.next_lag = lag
+        self.checks = 0
+
+    def check(self, max_lag):
+        self.checks += 1
+        self.lag = self.next_lag
+        self.available = self.lag is not None and self.lag <= max_lag
+        self.checked_at = time.monotonic()
+
+
+class TestReadRouter(unittest.TestCase):
+    def test_round_robin_over_replicas_within_lag(self):
+        a, b = FakeReplica("a", 0.0), FakeReplica("b", 1.0)
+        router = ReadRouter([a, b], max_lag=5, check_interval=60)
+
+        chosen = [router.choose().name for _ in range(4)]
+        self.assertEqual(sorted(chosen), ["a", "a", "b", "b"])
+
+    def test_lagging_replica_is_skipped(self):
+        a, b = FakeReplica("a", 30.0), FakeReplica("b", 0.5)
+        router = ReadRouter([a, b], max_lag=5, check_interval=60)
+
+        self.assertEqual({router.choose().name for _ in range(3)}, {"b"})
+
+    def test_falls_back_to_primary_without_usable_replica(self):
+        router = ReadRouter([FakeReplica("a", 30.0), FakeReplica("b", None)], max_lag=5, check_interval=60)
+        self.assertIsNone(router.choose())
+
+    def test_failed_replica_is_skipped_until_next_check(self):
+        a = FakeReplica("a", 0.0)
+        router = ReadRouter([a], max_lag=5, check_interval=0)
+        self.assertIs(router.choose(), a)
+
+        a.mark_unavailable(RuntimeError("connection lost"))
+        router.check_interval = 60
+        self.assertIsNone(router.choose())
+
+        # the next check finds it caught up again
+        router.check_interval = 0
+        self.assertIs(router.choose(), a)
+
+    def test_lag_is_checked_once_per_interval(self):
+        a = FakeReplica("a", 0.0)
+        router = ReadRouter([a], max_lag=5, check_interval=60)
+        for _ in range(5):
+            router.choose()
+        self.assertEqual(a.checks, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,235 @@
+import os
+import sys
+import unittest
+from contextlib import contextmanager
+from unittest import mock
+
+import numpy as np
+import psycopg
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
+
+from config import config
+from services import indexing_service as indexing_module
+from services.indexing_service import IndexingService
+from services.reembedding_service import ReembeddingService
+from services.retrieval_service import RetrievalResult, RetrievalService
+
+
+class FakeCursor:
+    """Answers the statements of the code under test from a script of results."""
+
+    def __init__(self, db):
+        self.db = db
+        self.last = None
+
+    def execute(self, sql, params=None):
+        self.db.executed.append(" ".join(sql.split()))
+        self.last = sql
+
+    def fetchone(self):
+        if "status = 'active'" in self.last:
+            return self.db.active.pop(0) if len(self.db.active) > 1 else self.db.active[0]
+        if "status = 'migrating'" in self.last:
+            return self.db.migrating
+        return None
+
+    def fetchall(self):
+        if "nextval" in self.last:
+            return [(i,) for i in range(1, 3)]
+        return []
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        self.db.commits += 1
+
+    def rollback(self):
+        self.db.rollbacks += 1
+
+
+class FakeDatabase:
+    def __init__(self, active, migrating=None):
+        # the active (name, dimension) returned by consecutive reads, the last one stays
+        self.active = list(active)
+        self.migrating = migrating
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.connections = 0
+
+    @contextmanager
+    def connection(self):
+        self.connections += 1
+        yield FakeConnection(self)
+
+
+def make_indexing_service(db):
+    service = IndexingService()
+    service.connection = db.connection
+    service.chunker = None
+    service._create_document = lambda cur, filename, file_size, faq_count: 7
+    return service
+
+
+class TestInsertFaqs(unittest.TestCase):
+
+    def test_embeds_again_when_the_model_changed(self):
+        db = FakeDatabase(active=[("new-model", 3)])
+        service = make_indexing_service(db)
+        service.model_name = "old-model"
+        embedded_with = []
+
+        def embed(texts, model_name=None):
+            embedded_with.append(model_name)
+            return np.ones((len(texts), 3), dtype=np.float32)
+
+        def refresh(force=False):
+            service.model_name = "new-model"
+
+        copied = []
+        with mock.patch.object(service, "_texts_to_embeddings", side_effect=embed), \
+                mock.patch.object(service, "refresh_embedding_model", side_effect=refresh), \
+                mock.patch.object(indexing_module, "copy_rows", side_effect=lambda *args: copied.append(args)):
+            document_id = service._insert_faqs("faqs.csv", 10, ["q1", "q2"], ["a1", "a2"])
+
+        self.assertEqual(document_id, 7)
+        # questions and answers, first with the old and then with the new model
+        self.assertEqual(embedded_with, ["old-model", "old-model", "new-model", "new-model"])
+        self.assertEqual(db.rollbacks, 1)
+        self.assertEqual(db.commits, 1)
+        self.assertEqual(len(copied), 1)
+        self.assertEqual(copied[0][4][-1], ["new-model", "new-model"])
+
+    def test_gives_up_if_the_model_keeps_changing(self):
+        db = FakeDatabase(active=[("other-model", 3)])
+        service = make_indexing_service(db)
+        embeddings = np.ones((1, 3), dtype=np.float32)
+        with mock.patch.object(service, "_texts_to_embeddings", return_value=embeddings), \
+                mock.patch.object(service, "refresh_embedding_model"):
+            with self.assertRaises(RuntimeError):
+                service._insert_faqs("faqs.csv", 10, ["q"], ["a"])
+        self.assertEqual(db.commits, 0)
+
+
+class TestRefreshEmbeddingModel(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeDatabase(active=[("model-a", 384)])
+        self.service = make_indexing_service(self.db)
+
+    def test_reads_the_model_at_most_every_interval(self):
+        with mock.patch.object(config, "EMBEDDING_MODEL_CHECK_INTERVAL", 60):
+            self.service.refresh_embedding_model()
+            self.service.refresh_embedding_model()
+            self.assertEqual(self.db.connections, 1)
+            self.assertEqual(self.service.model_name, "model-a")
+
+            # once the interval has passed the model is read again
+            self.service._model_checked_at -= 61
+            self.service.refresh_embedding_model()
+            self.assertEqual(self.db.connections, 2)
+
+    def test_force_ignores_the_interval(self):
+        with mock.patch.object(config, "EMBEDDING_MODEL_CHECK_INTERVAL", 60):
+            self.service.refresh_embedding_model()
+            self.db.active = [("model-b", 768)]
+            self.service.refresh_embedding_model(force=True)
+        self.assertEqual(self.db.connections, 2)
+        self.assertEqual(self.service.model_name, "model-b")
+        self.assertEqual(self.service.storage.dimension, 768)
+
+
+class FakeIndexingService:
+    model_name = "model-a"
+    chunker = None
+
+    def __init__(self):
+        self.refreshes = []
+
+    def refresh_embedding_model(self, force=False):
+        self.refreshes.append(force)
+
+
+class TestNearestRetry(unittest.TestCase):
+
+    def test_encodes_again_after_a_dimension_mismatch(self):
+        retrieval = RetrievalService()
+        indexing_service = FakeIndexingService()
+        result = [RetrievalResult(1, "question", "answer", 0.1)]
+        calls = []
+
+        def query_nearest(query, document_id, indexing_service, column, k, query_embedding=None):
+            calls.append(query_embedding)
+            if len(calls) == 1:
+                raise psycopg.errors.DataException("different vector dimensions 384 and 768")
+            return result
+
+        stale = np.ones(384, dtype=np.float32)
+        with mock.patch.object(retrieval, "_query_nearest", side_effect=query_nearest):
+            found = retrieval._nearest("query", 1, indexing_service, "answer_embedding", 3, stale)
+
+        self.assertEqual(found, result)
+        self.assertIs(calls[0], stale)
+        # the embedding of the old model is not reused
+        self.assertIsNone(calls[1])
+        self.assertEqual(indexing_service.refreshes, [False, True])
+
+    def test_encodes_again_when_no_rows_of_the_model_are_left(self):
+        retrieval = RetrievalService()
+        indexing_service = FakeIndexingService()
+        result = [RetrievalResult(1, "question", "answer", 0.1)]
+        calls = []
+
+        def refresh(force=False):
+            # another process switched to a model with the same dimension
+            if force:
+                indexing_service.model_name = "model-b"
+
+        def query_nearest(query, document_id, indexing_service, column, k, query_embedding=None):
+            calls.append((indexing_service.model_name, query_embedding))
+            return result if indexing_service.model_name == "model-b" else []
+
+        stale = np.ones(384, dtype=np.float32)
+        indexing_service.refresh_embedding_model = refresh
+        with mock.patch.object(retrieval, "_query_nearest", side_effect=query_nearest):
+            found = retrieval._nearest("query", 1, indexing_service, "answer_embedding", 3, stale)
+
+        self.assertEqual(found, result)
+        self.assertEqual(calls, [("model-a", stale), ("model-b", None)])
+
+
+class TestStartMigration(unittest.TestCase):
+
+    def test_refuses_a_different_migration(self):
+        db = FakeDatabase(active=[("model-a", 384)], migrating=("model-b", 768))
+        result = ReembeddingService(make_indexing_service(db)).start("model-c", 384)
+
+        self.assertEqual(result["status"], "error")
+        self.assertIn("model-b", result["message"])
+        self.assertFalse(any(sql.startswith("ALTER TABLE") for sql in db.executed))
+
+    def test_continues_the_same_migration(self):
+        db = FakeDatabase(active=[("model-a", 384)], migrating=("model-b", 768))
+        result = ReembeddingService(make_indexing_service(db)).start("model-b", 768)
+
+        self.assertEqual(result["status"], "success")
+        self.assertFalse(any(sql.startswith("ALTER TABLE") for sql in db.executed))
+
+    def test_adds_the_new_columns(self):
+        db = FakeDatabase(active=[("model-a", 384)])
+        result = ReembeddingService(make_indexing_service(db)).start("model-b", 768)
+
+        self.assertEqual(result["status"], "success")
+        self.assertIn("ALTER TABLE faqs ADD COLUMN IF NOT EXISTS question_embedding_next vector(768)", db.executed)
+        self.assertEqual(db.commits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import sys
+import os
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
+
+from utils.singleflight import BroadcastBuffer, SingleFlight
+
+
+class TestBroadcastBuffer(unittest.TestCase):
+    def test_late_subscriber_receives_all_items(self):
+        buffer = BroadcastBuffer()
+        buffer.append("a")
+        buffer.append("b")
+        buffer.close()
+
+        self.assertEqual(list(buffer.subscribe()), ["a", "b"])
+        self.assertEqual(list(buffer.subscribe()), ["a", "b"])
+
+    def test_error_is_raised_after_items(self):
+        buffer = BroadcastBuffer()
+        buffer.append("a")
+        buffer.close(RuntimeError("boom"))
+
+        stream = buffer.subscribe()
+        self.assertEqual(next(stream), "a")
+        with self.assertRaises(RuntimeError):
+            next(stream)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def tokens():
+            yield "Hello "
+            release.wait(timeout=5)
+            yield "world"
+
+        def start():
+            calls.append(1)
+            return tokens()
+
+        leader, leader_joined = flight.run("key", start)
+        follower, follower_joined = flight.run("key", start)
+        release.set()
+
+        self.assertFalse(leader_joined)
+        self.assertTrue(follower_joined)
+        self.assertEqual("".join(leader), "Hello world")
+        self.assertEqual("".join(follower), "Hello world")
+        self.assertEqual(len(calls), 1)
+
+    def test_new_execution_after_completion(self):
+        flight = SingleFlight()
+        first, _ = flight.run("key", lambda: iter(["a"]))
+        self.assertEqual(list(first), ["a"])
+
+        second, joined = flight.run("key", lambda: iter(["b"]))
+        self.assertFalse(joined)
+        self.assertEqual(list(second), ["b"])
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_start_error_reaches_leader(self):
+        flight = SingleFlight()
+
+        def start():
+            raise ValueError("rewrite failed")
+
+        with self.assertRaises(ValueError):
+            flight.run("key", start)
+        self.assertEqual(flight.in_flight(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
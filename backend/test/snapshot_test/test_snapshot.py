@@ -0,0 +1,60 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
+
+from services.snapshot import read_snapshot, snapshot_paths, write_snapshot
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "snapshots", "document_1")
+        self.questions = np.arange(6, dtype=np.float32).reshape(2, 3)
+        self.answers = -self.questions
+        write_snapshot(self.path, {"embedding_model": "m", "dimension": 3, "faqs": {"question": ["a", "b"]}},
+                       {"questions": self.questions, "answers": self.answers})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_roundtrip_is_memory_mapped(self):
+        snapshot = read_snapshot(self.path + ".json", verify=True)
+        self.assertEqual(snapshot.metadata["faqs"]["question"], ["a", "b"])
+        self.assertIsInstance(snapshot.matrix, np.memmap)
+        np.testing.assert_array_equal(snapshot.rows("questions"), self.questions)
+        np.testing.assert_array_equal(snapshot.rows("answers"), self.answers)
+        self.assertIsNone(snapshot.rows("chunks"))
+
+    def test_rejects_incomplete_and_corrupt_snapshots(self):
+        matrix_path, sidecar_path = snapshot_paths(self.path)
+        with open(matrix_path, "r+b") as f:
+            f.write(b"\1\1\1\1")
+        read_snapshot(matrix_path)  # the size still matches
+        with self.assertRaises(ValueError):
+            read_snapshot(matrix_path, verify=True)
+
+        with open(matrix_path, "ab") as f:
+            f.write(b"\0")
+        with self.assertRaises(ValueError):
+            read_snapshot(self.path)
+
+    def test_rejects_newer_versions(self):
+        _, sidecar_path = snapshot_paths(self.path)
+        with open(sidecar_path, encoding="utf-8") as f:
+            metadata = json.load(f)
+        metadata["version"] += 1
+        with open(sidecar_path, "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+        with self.assertRaises(ValueError):
+            read_snapshot(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+BERTScore with the token features of every sentence cached in the persistent
+embedding store of the backend (backend/src/utils/embedding/store.py).
+
+Reference answers are the same on every evaluation run (and so are early exit
+candidates), so their features are computed by the BERT model only once. The
+scores are the same as the ones of bert_score.BERTScorer.score.
+"""
+import os
+import sys
+from collections import defaultdict
+
+import numpy as np
+from bert_score.utils import get_bert_embedding
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend", "src")))
+from utils.embedding.store import EmbeddingStore  # noqa: E402
+
+
+class CachedBERTScorer:
+    """
+    Wraps a bert_score.BERTScorer (without all_layers). The stored array of a
+    sentence has one row per token: the token features followed by its idf weight.
+    """
+
+    def __init__(self, scorer, cache_dir: str, batch_size: int = 64):
+        self.scorer = scorer
+        self.batch_size = batch_size
+        namespace = f"bertscore-{scorer.model_type}-L{scorer.num_layers}-idf{int(scorer.idf)}"
+        self.store = EmbeddingStore(cache_dir, namespace)
+
+        if scorer.idf:
+            self.idf_dict = scorer._idf_dict
+        else:
+            # same weights as BERTScorer.score: 1 per token, 0 for [CLS] and [SEP]
+            self.idf_dict = defaultdict(lambda: 1.0)
+            self.idf_dict[scorer._tokenizer.sep_token_id] = 0
+            self.idf_dict[scorer._tokenizer.cls_token_id] = 0
+
+    def _features(self, sentences: list[str]) -> dict[str, np.ndarray]:
+        unique = list(dict.fromkeys(sentences))
+        features = dict(zip(unique, self.store.get_many(unique)))
+        missing = [s for s in unique if features[s] is None]
+
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i:i + self.batch_size]
+            embedding, mask, idf = get_bert_embedding(
+                batch, self.scorer._model, self.scorer._tokenizer, self.idf_dict, device=self.scorer.device
+            )
+            embedding, mask, idf = embedding.cpu().numpy(), mask.cpu().numpy(), idf.cpu().numpy()
+            arrays = []
+            for j in range(len(batch)):
+                n = int(mask[j].sum())
+                arrays.append(np.hstack([embedding[j, :n], idf[j, :n, None]]).astype(np.float32))
+            self.store.put_many(batch, arrays)
+            features.update(zip(batch, arrays))
+        return features
+
+    @staticmethod
+    def _greedy_match(cand: np.ndarray, ref: np.ndarray) -> tuple[float, float, float]:
+        # greedy cosine matching weighted by idf, as bert_score.utils.greedy_cos_idf
+        cand_emb, cand_idf = cand[:, :-1], cand[:, -1]
+        ref_emb, ref_idf = ref[:, :-1], ref[:, -1]
+        cand_emb = cand_emb / np.linalg.norm(cand_emb, axis=1, keepdims=True)
+        ref_emb = ref_emb / np.linalg.norm(ref_emb, axis=1, keepdims=True)
+        sim = cand_emb @ ref_emb.T
+
+        # empty sentences (only [CLS]/[SEP]) score 0 like in bert_score
+        precision = float((sim.max(axis=1) * cand_idf).sum() / cand_idf.sum()) if cand_idf.sum() else 0.0
+        recall = float((sim.max(axis=0) * ref_idf).sum() / ref_idf.sum()) if ref_idf.sum() else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        return precision, recall, f1
+
+    def score(self, cands: list[str], refs: list[str]):
+        """Returns (P, R, F) arrays like BERTScorer.score."""
+        features = self._features(list(cands) + list(refs))
+        scores = np.array([self._greedy_match(features[c], features[r]) for c, r in zip(cands, refs)],
+                          dtype=np.float32).reshape(-1, 3)
+
+        if self.scorer.rescale_with_baseline:
+            baseline = self.scorer.baseline_vals.cpu().numpy()
+            scores = (scores - baseline) / (1 - baseline)
+        return scores[:, 0], scores[:, 1], scores[:, 2]
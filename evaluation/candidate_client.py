@@ -4,7 +4,7 @@ Returns an answer generated by our model for a given question
 import requests
 
 
-def get_candidate_answer(base_url: str, question: str, document_id: int) -> str:
+def get_candidate_answer(base_url: str, question: str, document_id: int, early_exit: bool = None) -> str:
     """
     Gets an answer (candidate) from our own model for a given question
 
@@ -12,14 +12,22 @@ def get_candidate_answer(base_url: str, question: str, document_id: int) -> str:
     :type base_url: str
     :param question: The question that the model will be asked
     :type question: str
-    :param document_id: The ID of the document that the question is from
+    :param document_id: The ID of the document that the question is from (None = search all documents)
     :type document_id: int
+    :param early_exit: Enables/disables the early exit for stored answers (None = backend default)
+    :type early_exit: bool
     :return: The answer outputted by our model
     :rtype: str
     """
     url = f"{base_url.rstrip('/')}/api/query"
     payload = {"query": question, "documentId": document_id, "chatHistory": []}
-    resp = requests.post(url, json=payload, timeout=60)
+    if document_id is None:
+        payload["scope"] = "all"
+    if early_exit is not None:
+        payload["earlyExit"] = early_exit
+    # evaluation traffic is served with the lowest priority (see admission control)
+    headers = {"X-Request-Priority": "evaluation"}
+    resp = requests.post(url, json=payload, headers=headers, timeout=60)
     if resp.status_code != 200:
         print(f"The following error occurred: {resp.text}")
         resp.raise_for_status()
@@ -4,10 +4,19 @@ Fetch and return FAQs for a given document from the database
 import os
 from dotenv import load_dotenv
 import psycopg
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional
 
 load_dotenv()
 
+# seconds the replica lags behind the primary (0 on the primary itself)
+LAG_SQL = """
+    SELECT CASE
+      WHEN NOT pg_is_in_recovery() THEN 0
+      WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+      ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
 
 def _get_db_config() -> Dict[str, str]:
     return {
@@ -19,13 +28,45 @@ def _get_db_config() -> Dict[str, str]:
     }
 
 
-def _connect() -> psycopg.Connection:
-    d = _get_db_config()
-    conn_str = (
+def _conninfo(d: Dict[str, str]) -> str:
+    return (
         f"host={d['host']} port={d['port']} dbname={d['database']} "
         f"user={d['user']} password={d['password']}"
     )
-    return psycopg.connect(conn_str, connect_timeout=5)
+
+
+def _replica_configs() -> List[Dict[str, str]]:
+    """The read replicas of POSTGRES_REPLICA_HOSTS (host or host:port, comma-separated)."""
+    primary = _get_db_config()
+    replicas = []
+    for entry in os.getenv("POSTGRES_REPLICA_HOSTS", "").split(","):
+        host, _, port = entry.strip().partition(":")
+        if host:
+            replicas.append({**primary, "host": host, "port": port or primary["port"]})
+    return replicas
+
+
+def _connect() -> psycopg.Connection:
+    """
+    Connect to the first read replica that is reachable and not lagging more than
+    POSTGRES_REPLICA_MAX_LAG seconds behind, otherwise to the primary.
+    """
+    max_lag = float(os.getenv("POSTGRES_REPLICA_MAX_LAG", "5"))
+    for d in _replica_configs():
+        try:
+            conn = psycopg.connect(_conninfo(d), connect_timeout=5)
+        except psycopg.OperationalError:
+            continue
+        try:
+            # same lag measure as the backend (backend/src/services/read_router.py)
+            lag = conn.execute(LAG_SQL).fetchone()[0]
+            conn.rollback()
+        except psycopg.Error:
+            lag = None
+        if lag is not None and lag <= max_lag:
+            return conn
+        conn.close()
+    return psycopg.connect(_conninfo(_get_db_config()), connect_timeout=5)
 
 
 def fetch_faqs(
@@ -68,8 +109,68 @@ def fetch_faqs(
             cur.execute(sql_select, params)
             rows = cur.fetchall()
 
-    return [
-        {"faq_id": str(r[0]), "document_id": r[1],
-         "question": r[2], "reference_answer": r[3]}
-        for r in rows
-    ]
+    return [_row_to_faq(r) for r in rows]
+
+
+def iter_faq_batches(
+    document_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    batch_size: int = 100,
+) -> Iterator[List[Dict[str, str]]]:
+    """
+    Stream FAQs in batches using keyset pagination on the primary key.
+
+    Every batch is fetched with ``WHERE id > <last id> ORDER BY id LIMIT n``,
+    so the cost per batch stays constant no matter how far into the table
+    we are (unlike OFFSET paging) and only one batch is held in memory.
+
+    :param document_id: The ID of the document that the FAQs should be taken from
+    :type document_id: int
+    :param limit: The total number of FAQs that should be yielded (None = all)
+    :type limit: int
+    :param batch_size: The number of FAQs per batch
+    :type batch_size: int
+    :return: Iterator over lists of FAQ dicts
+    """
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+
+    sql_select = """
+        SELECT id, document_id, question_text, answer_text
+        FROM faqs
+        WHERE id > %s
+    """
+    if document_id is not None:
+        sql_select += " AND document_id = %s"
+    sql_select += " ORDER BY id LIMIT %s"
+
+    remaining = int(limit) if limit is not None else None
+    last_id = 0
+
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            while remaining is None or remaining > 0:
+                n = batch_size if remaining is None else min(batch_size, remaining)
+                params = [last_id]
+                if document_id is not None:
+                    params.append(int(document_id))
+                params.append(n)
+
+                cur.execute(sql_select, params)
+                rows = cur.fetchall()
+                if not rows:
+                    break
+
+                last_id = rows[-1][0]
+                if remaining is not None:
+                    remaining -= len(rows)
+
+                yield [_row_to_faq(r) for r in rows]
+
+                if len(rows) < n:
+                    break
+
+
+def _row_to_faq(row) -> Dict[str, str]:
+    return {"faq_id": str(row[0]), "document_id": row[1],
+            "question": row[2], "reference_answer": row[3]}
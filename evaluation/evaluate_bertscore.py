@@ -3,13 +3,16 @@ Get the FAQs and run the semantic evaluation for all questions up to the specifi
 """
 import bert_score
 import json
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from zoneinfo import ZoneInfo
 import os
 from dotenv import load_dotenv
 
-from evaluation.db_faqs import fetch_faqs
+from evaluation.db_faqs import iter_faq_batches
 from evaluation.candidate_client import get_candidate_answer
 
 load_dotenv()
@@ -17,6 +20,15 @@ load_dotenv()
 MODEL_TYPE = os.getenv("MODEL_TYPE", "bert-base-uncased")
 MODEL_LANG = os.getenv("MODEL_LANG", "en")
 RESCALE_WITH_BASELINE = os.getenv("RESCALE_WITH_BASELINE", False)
+FETCH_BATCH_SIZE = int(os.getenv("FETCH_BATCH_SIZE", 50))
+EVAL_WORKERS = int(os.getenv("EVAL_WORKERS", 4))
+# "" = backend default, "true"/"false" = force the early exit on/off,
+# "compare" = score the generated and the early exit answers side by side
+EARLY_EXIT = os.getenv("EARLY_EXIT", "").lower()
+# "document" = retrieve from the FAQ's own document, "all" = retrieve from all documents
+EVAL_SCOPE = os.getenv("EVAL_SCOPE", "document").lower()
+# token features of every scored sentence are cached here (shared with the backend's EMBEDDING_CACHE_DIR)
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
 
 
 def run_evaluation(document_id: int = None, base_url: str = "http://localhost:5001", limit: int = 20):
@@ -25,109 +37,196 @@ def run_evaluation(document_id: int = None, base_url: str = "http://localhost:50
     Prompt the model with the question to get an answer (candidate).
     Print BERTScore per question and overall
 
+    FAQs are streamed from the database in batches of FETCH_BATCH_SIZE and each
+    batch is handed to EVAL_WORKERS threads that request the candidates, so
+    memory usage stays constant regardless of the number of evaluated FAQs.
+
     :param document_id: The ID of the document that the FAQ should be taken from
     :type document_id: int
     :param base_url: The API that is used to prompt our model
     :type base_url: str
-    :param limit: The number of FAQs that should be retrieved and evaluated
+    :param limit: The number of FAQs that should be retrieved and evaluated (None = all)
     :type limit: int
     """
+    if limit is not None:
+        limit = int(limit)
+    limit_str = limit if limit is not None else "all"
     if document_id is not None:
-        print(f"Fetching {limit} rows from document {document_id}...")
+        print(f"Fetching {limit_str} rows from document {document_id}...")
     else:
-        print(f"Fetching {limit} rows for all available documents...")
-
-    rows = fetch_faqs(document_id=document_id, limit=limit)
+        print(f"Fetching {limit_str} rows for all available documents...")
 
-    candidates = []
-    references = []
-
-    print(f"Getting candidates for {len(rows)} rows...")
-    for r in rows:
-        q = r["question"]
-        ref = r["reference_answer"]
-        if document_id is not None:
-            print(f"Getting candidate for FAQ #{r['faq_id']}...")
-            cand = get_candidate_answer(
-                base_url=base_url, question=q, document_id=document_id)
-        else:
-            print(
-                f"Getting candidate for FAQ #{r['faq_id']} from document {r['document_id']}...")
-            cand = get_candidate_answer(
-                base_url=base_url, question=q, document_id=r["document_id"])
-
-        candidates.append(cand)
-        references.append(ref)
-
-    print(f"Calculating BERTScores...")
     if MODEL_TYPE == "roberta-large":
         print(f"The following message can be ignored. This is expected:")
         print(f"-------------------------------------------------------")
-    (P, R, F) = bert_score.score(
-        cands=candidates,
-        refs=references,
+    scorer = bert_score.BERTScorer(
         model_type=MODEL_TYPE,
         lang=MODEL_LANG,
         rescale_with_baseline=RESCALE_WITH_BASELINE,
     )
     if MODEL_TYPE == "roberta-large":
         print(f"-------------------------------------------------------")
+    if EMBEDDING_CACHE_DIR:
+        from evaluation.cached_bertscore import CachedBERTScorer
+        scorer = CachedBERTScorer(scorer, EMBEDDING_CACHE_DIR)
 
     now = datetime.now(ZoneInfo("Europe/Vienna"))
     results_dir = Path(__file__).resolve().parent / "results"
     out_path = results_dir / \
         f"bertscore_results_{now.strftime('%Y-%m-%d_%H%M%S')}.json"
 
-    meta = {
-        "base_url": base_url,
-        "model_type": MODEL_TYPE,
-        "lang": MODEL_LANG,
-        "rescale_with_baseline": RESCALE_WITH_BASELINE,
-        "n_samples": len(candidates),
-        "created_at": now.isoformat(),
-    }
+    compare = EARLY_EXIT == "compare"
+    early_exit = {"true": True, "false": False}.get(EARLY_EXIT)
+    if compare:
+        early_exit = False
 
-    write_results_json(out_path, meta, rows, candidates, P, R, F)
-
-
-def write_results_json(
-    out_path: Path,
-    meta: dict,
-    rows: list[dict],
-    candidates: list[str],
-    P,
-    R,
-    F,
-):
-    samples = []
-    for i, r in enumerate(rows):
-        samples.append({
-            "faq_id": r.get("faq_id"),
-            "document_id": r.get("document_id"),
-            "question": r["question"],
-            "reference_answer": r["reference_answer"],
-            "candidate_answer": candidates[i],
-            "bertscore": {
-                "precision": float(P[i].item()),
-                "recall": float(R[i].item()),
-                "f1": float(F[i].item()),
+    def get_candidate(r: dict, early_exit: bool = early_exit) -> str:
+        doc_id = document_id if document_id is not None else r["document_id"]
+        if EVAL_SCOPE == "all":
+            doc_id = None
+        if document_id is not None:
+            print(f"Getting candidate for FAQ #{r['faq_id']}...")
+        else:
+            print(
+                f"Getting candidate for FAQ #{r['faq_id']} from document {r['document_id']}...")
+        return get_candidate_answer(
+            base_url=base_url, question=r["question"], document_id=doc_id, early_exit=early_exit)
+
+    with ResultsWriter(out_path) as writer, \
+            ThreadPoolExecutor(max_workers=EVAL_WORKERS) as workers:
+        for rows in iter_faq_batches(document_id=document_id, limit=limit, batch_size=FETCH_BATCH_SIZE):
+            print(f"Getting candidates for {len(rows)} rows...")
+            candidates = list(workers.map(get_candidate, rows))
+            references = [r["reference_answer"] for r in rows]
+
+            print(f"Calculating BERTScores...")
+            (P, R, F) = scorer.score(cands=candidates, refs=references)
+
+            early_exit_scores = None
+            if compare:
+                print(f"Getting early exit candidates for {len(rows)} rows...")
+                early_candidates = list(workers.map(lambda r: get_candidate(r, early_exit=True), rows))
+                early_exit_scores = (early_candidates, *scorer.score(cands=early_candidates, refs=references))
+            writer.add_batch(rows, candidates, P, R, F, early_exit=early_exit_scores)
+
+        meta = {
+            "base_url": base_url,
+            "model_type": MODEL_TYPE,
+            "lang": MODEL_LANG,
+            "rescale_with_baseline": RESCALE_WITH_BASELINE,
+            "early_exit": EARLY_EXIT or "default",
+            "scope": EVAL_SCOPE,
+            "embedding_cache": bool(EMBEDDING_CACHE_DIR),
+            "n_samples": writer.n_samples,
+            "created_at": now.isoformat(),
+        }
+        writer.meta = meta
+
+
+class ResultsWriter:
+    """
+    Writes the evaluation results JSON incrementally.
+
+    Samples are spooled to a temporary file as they are scored, only the running
+    sums for the summary are kept in memory. On close the final file is assembled
+    in the usual {"meta", "samples", "summary"} layout.
+    """
+
+    def __init__(self, out_path: Path):
+        self.out_path = out_path
+        self.meta: dict = {}
+        self.n_samples = 0
+        self._sums = {"precision": 0.0, "recall": 0.0, "f1": 0.0}
+        # only filled in the early exit compare mode
+        self._early_exit_sums = {"precision": 0.0, "recall": 0.0, "f1": 0.0, "hits": 0}
+        self._compared = False
+        self._spool = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+
+    def add_batch(self, rows: list[dict], candidates: list[str], P, R, F, early_exit=None):
+        """
+        early_exit: optional (candidates, P, R, F) of the same rows answered with
+        the early exit enabled, stored next to the generated answers.
+        """
+        for i, r in enumerate(rows):
+            scores = _scores(P, R, F, i)
+            sample = {
+                "faq_id": r.get("faq_id"),
+                "document_id": r.get("document_id"),
+                "question": r["question"],
+                "reference_answer": r["reference_answer"],
+                "candidate_answer": candidates[i],
+                "bertscore": scores,
             }
-        })
-
-    result = {
-        "meta": meta,
-        "samples": samples,
-        "summary": {
-            "avg_precision": float(P.mean().item()),
-            "avg_recall": float(R.mean().item()),
-            "avg_f1": float(F.mean().item()),
+            if early_exit is not None:
+                early_candidates, eP, eR, eF = early_exit
+                early_scores = _scores(eP, eR, eF, i)
+                sample["early_exit_candidate_answer"] = early_candidates[i]
+                sample["early_exit_bertscore"] = early_scores
+                self._compared = True
+                for key, value in early_scores.items():
+                    self._early_exit_sums[key] += value
+                # the stored answer was returned verbatim
+                if early_candidates[i].strip() == r["reference_answer"].strip():
+                    self._early_exit_sums["hits"] += 1
+            if self.n_samples:
+                self._spool.write(",\n")
+            self._spool.write(_indent(json.dumps(sample, ensure_ascii=False, indent=2), 4))
+
+            for key, value in scores.items():
+                self._sums[key] += value
+            self.n_samples += 1
+
+    def summary(self) -> dict:
+        n = max(self.n_samples, 1)
+        summary = {
+            "avg_precision": self._sums["precision"] / n,
+            "avg_recall": self._sums["recall"] / n,
+            "avg_f1": self._sums["f1"] / n,
         }
+        if self._compared:
+            summary["early_exit"] = {
+                "avg_precision": self._early_exit_sums["precision"] / n,
+                "avg_recall": self._early_exit_sums["recall"] / n,
+                "avg_f1": self._early_exit_sums["f1"] / n,
+                "verbatim_answers": self._early_exit_sums["hits"],
+            }
+        return summary
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                self._write()
+        finally:
+            self._spool.close()
+
+    def _write(self):
+        self.out_path.parent.mkdir(parents=True, exist_ok=True)
+        self._spool.seek(0)
+        with self.out_path.open("w", encoding="utf-8") as f:
+            f.write("{\n")
+            f.write(f'  "meta": {_indent(json.dumps(self.meta, ensure_ascii=False, indent=2), 2).lstrip()},\n')
+            f.write('  "samples": [\n')
+            shutil.copyfileobj(self._spool, f)
+            f.write("\n  ],\n")
+            f.write(f'  "summary": {_indent(json.dumps(self.summary(), ensure_ascii=False, indent=2), 2).lstrip()}\n')
+            f.write("}")
+        print(f"[EVALUATION] Wrote results:\n{self.out_path}")
+
+
+def _scores(P, R, F, i: int) -> dict:
+    return {
+        "precision": float(P[i].item()),
+        "recall": float(R[i].item()),
+        "f1": float(F[i].item()),
     }
 
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text(json.dumps(
-        result, ensure_ascii=False, indent=2), encoding="utf-8")
-    print(f"[EVALUATION] Wrote results:\n{out_path}")
+
+def _indent(text: str, spaces: int) -> str:
+    pad = " " * spaces
+    return "\n".join(pad + line for line in text.splitlines())
 
 
 if __name__ == "__main__":
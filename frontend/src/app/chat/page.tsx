@@ -23,15 +23,33 @@ interface Document {
   name: string
 }
 
+interface Suggestion {
+  faqId: number
+  question: string
+}
+
+// wait until the user pauses typing before prefetching
+const PREFETCH_DEBOUNCE_MS = 300
+
+// crypto.randomUUID only exists in secure contexts (HTTPS or localhost)
+const newConversationId = () =>
+  typeof crypto !== "undefined" && typeof crypto.randomUUID === "function"
+    ? crypto.randomUUID()
+    : Date.now().toString(36) + Math.random().toString(36).slice(2)
+
 export default function Chat() {
   const [documents, setDocuments] = useState<Document[]>([])
   const [selectedDocumentId, setSelectedDocumentId] = useState<string>("")
   const [isInitialLoading, setIsInitialLoading] = useState(true)
 
   const [messages, setMessages] = useState<Message[]>([])
+  // identifies the conversation, so the backend can reuse the work of previous turns
+  const [conversationId, setConversationId] = useState<string>("")
 
   const [input, setInput] = useState("")
   const [isLoading, setIsLoading] = useState(false)
+  // FAQ questions matching what is being typed (from /api/prefetch)
+  const [suggestions, setSuggestions] = useState<Suggestion[]>([])
   const messagesEndRef = useRef<HTMLDivElement>(null)
 
   const scrollToBottom = () => {
@@ -45,15 +63,28 @@ export default function Chat() {
   useEffect(() => {
     const fetchDocs = async () => {
       try {
-        const response = await fetch("http://localhost:5001/api/documents")
-        if (!response.ok) throw new Error("Failed to fetch documents")
-        const data = await response.json()
-
-        setDocuments(data.documents)
-
-        if (data.documents.length > 0) {
-          setSelectedDocumentId(data.documents[0].id)
-        }
+        // /api/documents is paginated, follow nextCursor so every document can be selected
+        let cursor: string | null = null
+        let first = true
+        do {
+          const url: string = cursor
+            ? `http://localhost:5001/api/documents?cursor=${encodeURIComponent(cursor)}`
+            : "http://localhost:5001/api/documents"
+          const response = await fetch(url)
+          if (!response.ok) throw new Error("Failed to fetch documents")
+          const data = await response.json()
+
+          if (first) {
+            setDocuments(data.documents)
+            if (data.documents.length > 0) {
+              setSelectedDocumentId(data.documents[0].id)
+            }
+            first = false
+          } else {
+            setDocuments((prev) => [...prev, ...data.documents])
+          }
+          cursor = data.nextCursor ?? null
+        } while (cursor)
       } catch (error) {
         toast.error("Error", { description: "Could not load documents." })
       } finally {
@@ -69,6 +100,9 @@ export default function Chat() {
       return
     }
 
+    // a new document starts a new conversation
+    setConversationId(newConversationId())
+
     const selectedDoc = documents.find((doc) => doc.id === selectedDocumentId)
     const docName = selectedDoc?.name || "this document"
 
@@ -109,6 +143,40 @@ export default function Chat() {
     return () => clearInterval(interval)
   }, [selectedDocumentId, documents])
 
+  // while the user types, let the backend embed the query and search ahead,
+  // so sending the same text does not wait for that
+  useEffect(() => {
+    const query = input.trim()
+    if (!selectedDocumentId || query.length < 3 || isLoading) {
+      setSuggestions([])
+      return
+    }
+
+    const controller = new AbortController()
+    const timeout = setTimeout(async () => {
+      try {
+        const prefetchUrl = process.env.NEXT_PUBLIC_BACKEND_PREFETCH_URL || "http://localhost:5001/api/prefetch"
+        const response = await fetch(prefetchUrl, {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({ query, documentId: selectedDocumentId, suggestions: 3 }),
+          signal: controller.signal,
+        })
+        // rate limited or disabled: prefetching is only an optimization
+        if (!response.ok) return
+        const data = await response.json()
+        setSuggestions(data.suggestions || [])
+      } catch {
+        // aborted by the next keystroke or backend not reachable
+      }
+    }, PREFETCH_DEBOUNCE_MS)
+
+    return () => {
+      clearTimeout(timeout)
+      controller.abort()
+    }
+  }, [input, selectedDocumentId, isLoading])
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault()
 
@@ -151,6 +219,7 @@ export default function Chat() {
           query: userMessage.content,
           documentId: selectedDocumentId,
           chatHistory: chatHistory,
+          conversationId: conversationId,
         }),
       })
 
@@ -277,6 +346,21 @@ export default function Chat() {
           </div>
 
           <div className="border-t border-border py-4 shrink-0 bg-background">
+            {suggestions.length > 0 && (
+              <div className="flex flex-wrap gap-2 mb-2">
+                {suggestions.map((suggestion) => (
+                  <Button
+                    key={suggestion.faqId}
+                    type="button"
+                    variant="outline"
+                    size="sm"
+                    onClick={() => setInput(suggestion.question)}
+                  >
+                    {suggestion.question}
+                  </Button>
+                ))}
+              </div>
+            )}
             <form onSubmit={handleSubmit} className="flex gap-2">
               <Textarea
                 value={input}
@@ -20,14 +20,20 @@ export default function Home() {
 	const [loading, setLoading] = useState(true);
 	const [uploading, setUploading] = useState(false);
 	const [deletingId, setDeletingId] = useState<string | null>(null);
+	const [nextCursor, setNextCursor] = useState<string | null>(null);
+	const [loadingMore, setLoadingMore] = useState(false);
 
 
-	const fetchDocuments = async () => {
+	const fetchDocuments = async (cursor?: string) => {
         try {
-            const response = await fetch('http://localhost:5001/api/documents');
+            const url = cursor
+                ? `http://localhost:5001/api/documents?cursor=${encodeURIComponent(cursor)}`
+                : 'http://localhost:5001/api/documents';
+            const response = await fetch(url);
             if (!response.ok) throw new Error('Failed to fetch documents');
             const data = await response.json();
-            setDocuments(data.documents);
+            setDocuments((previous) => (cursor ? [...previous, ...data.documents] : data.documents));
+            setNextCursor(data.nextCursor ?? null);
         } catch (error) {
             console.error(error);
             toast.error('Error', { description: 'Could not load documents from server.' });
@@ -36,6 +42,13 @@ export default function Home() {
         }
     };
 
+	const loadMoreDocuments = async () => {
+		if (!nextCursor) return;
+		setLoadingMore(true);
+		await fetchDocuments(nextCursor);
+		setLoadingMore(false);
+	};
+
 	useEffect(() => {
         fetchDocuments();
     }, []);
@@ -184,7 +197,7 @@ export default function Home() {
 						<CardHeader>
 							<CardTitle>Your Documents</CardTitle>
 							<CardDescription>
-								{documents.length} document{documents.length !== 1 ? 's' : ''} in your knowledge base
+								{documents.length}{nextCursor ? '+' : ''} document{documents.length !== 1 ? 's' : ''} in your knowledge base
 							</CardDescription>
 						</CardHeader>
 						<CardContent>
@@ -224,6 +237,16 @@ export default function Home() {
 											</Button>
 										</div>
 									))}
+									{nextCursor && (
+										<Button
+											variant='outline'
+											className='w-full'
+											onClick={loadMoreDocuments}
+											disabled={loadingMore}
+										>
+											{loadingMore ? <Loader2 className='h-4 w-4 animate-spin' /> : 'Load more'}
+										</Button>
+									)}
 								</div>
 							)}
 						</CardContent>